@@ -8,6 +8,7 @@ const { isAuthenticatedUser } = require('../middlewares/auth');
 const LeafAnalysis = require('../models/LeafAnalysis');
 const BungaAnalysis = require('../models/BungaAnalysis');
 const { uploadToCloudinary } = require('../utils/Cloudinary');
+const { parsePythonPayloads } = require('../utils/pythonResponse');
 
 // Configure multer for file uploads
 const storage = multer.memoryStorage();
@@ -174,10 +175,13 @@ router.post('/disease', upload.single('image'), async (req, res) => {
             windowsHide: true
         });
 
+        const resultChunks = [];
         let resultData = '';
         let errorData = '';
 
         pythonProcess.stdout.on('data', (data) => {
+            // Raw bytes too: length-framed payloads count bytes, not characters
+            resultChunks.push(data);
             resultData += data.toString();
         });
 
@@ -215,21 +219,9 @@ router.post('/disease', upload.single('image'), async (req, res) => {
 
             try {
                 // Parse result - find JSON in output
-                const lines = resultData.trim().split('\n');
-                let result = null;
-                
-                for (let i = lines.length - 1; i >= 0; i--) {
-                    const line = lines[i].trim();
-                    if (line.startsWith('{') && line.endsWith('}')) {
-                        try {
-                            const parsed = JSON.parse(line);
-                            if (parsed.disease) {
-                                result = parsed;
-                                break;
-                            }
-                        } catch (e) {}
-                    }
-                }
+                // The last payload that has a result (newline or length framed, compact or not)
+                let result = parsePythonPayloads(Buffer.concat(resultChunks))
+                    .reverse().find((parsed) => parsed.disease) || null;
 
                 if (!result) {
                     result = { disease: 'Unknown', confidence: 0 };
@@ -339,10 +331,13 @@ router.post('/ripeness', isAuthenticatedUser, upload.single('image'), async (req
             windowsHide: true 
         });
         
+        const resultChunks = [];
         let resultData = '';
         let errorData = '';
 
         pythonProcess.stdout.on('data', (data) => {
+            // Raw bytes too: length-framed payloads count bytes, not characters
+            resultChunks.push(data);
             resultData += data.toString();
         });
         
@@ -379,22 +374,9 @@ router.post('/ripeness', isAuthenticatedUser, upload.single('image'), async (req
             
             try {
                 // Parse JSON from stdout
-                const lines = resultData.trim().split('\n');
-                let result = null;
-                
-                // Find JSON in output
-                for (let i = lines.length - 1; i >= 0; i--) {
-                    const line = lines[i].trim();
-                    if (line.startsWith('{') && line.endsWith('}')) {
-                        try {
-                            const parsed = JSON.parse(line);
-                            if (parsed.ripeness || parsed.class) {
-                                result = parsed;
-                                break;
-                            }
-                        } catch (e) {}
-                    }
-                }
+                // The last payload that has a result (newline or length framed, compact or not)
+                let result = parsePythonPayloads(Buffer.concat(resultChunks))
+                    .reverse().find((parsed) => parsed.ripeness || parsed.class) || null;
 
                 if (!result) {
                     result = { ripeness: 'Unknown', confidence: 0, class: 'Unknown' };
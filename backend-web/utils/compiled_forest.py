@@ -0,0 +1,112 @@
+"""
+Pure-NumPy runtime for the exported sklearn pepper disease model.
+
+export_disease_model.py flattens the fitted scaler and tree ensemble
+(RandomForest / ExtraTrees / DecisionTree classifier) into one .npz file.
+This module loads it without importing scikit-learn or joblib and evaluates
+every tree for every sample at once: all trees share one node table, and
+each step moves the whole (trees x samples) index matrix one level down.
+Leaves point to themselves, so no masking is needed and the loop runs
+max_depth times.
+
+predict_proba follows sklearn's arithmetic (float32 inputs against float64
+thresholds, per-tree normalization, sequential averaging), so outputs match
+the pickled model.
+"""
+import numpy as np
+
+FORMAT_VERSION = 1
+
+
+class CompiledScaler:
+    """
+    StandardScaler / MinMaxScaler transform from exported arrays.
+    cast: newer sklearn casts mean_/scale_ to the input dtype before a
+    StandardScaler transform, older versions subtract the float64 statistics
+    from float32 input. The export records which one the fitted scaler does.
+    """
+
+    def __init__(self, kind, offset, scale, clip=None, cast=False):
+        self.kind = kind
+        self.offset = offset
+        self.scale = scale
+        self.clip = clip
+        self.cast = cast
+
+    def transform(self, X):
+        # Same in-place dtype behaviour as sklearn: float32 input stays float32
+        X = np.array(X, dtype=np.float32 if np.asarray(X).dtype == np.float32 else np.float64)
+        if self.kind == 'standard':
+            if self.offset is not None:
+                X -= self.offset.astype(X.dtype) if self.cast else self.offset
+            if self.scale is not None:
+                X /= self.scale.astype(X.dtype) if self.cast else self.scale
+        elif self.kind == 'minmax':
+            X *= self.scale
+            X += self.offset
+            if self.clip is not None:
+                np.clip(X, self.clip[0], self.clip[1], out=X)
+        return X
+
+
+class CompiledForest:
+    """predict_proba for a flattened tree ensemble."""
+
+    def __init__(self, roots, left, right, feature, threshold, value, max_depth, classes, average):
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+        self.average = bool(average)
+
+    def apply(self, X):
+        """Leaf node index for every (tree, sample) pair: shape (n_trees, n_samples)."""
+        # sklearn validates tree inputs as float32 and compares them to float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_samples = X.shape[0]
+        nodes = np.repeat(self.roots[:, None], n_samples, axis=1)
+        sample_idx = np.broadcast_to(np.arange(n_samples), nodes.shape)
+        for _ in range(self.max_depth):
+            go_left = X[sample_idx, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        # value rows are already normalized per tree, as in DecisionTreeClassifier.predict_proba
+        proba = self.value[leaves[0]].copy()
+        for tree_leaves in leaves[1:]:
+            proba += self.value[tree_leaves]
+        if self.average:
+            proba /= len(leaves)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def load_compiled(npz_path):
+    """Load (model, scaler) from an exported .npz. Raises ValueError on a format mismatch."""
+    with np.load(npz_path, allow_pickle=False) as data:
+        if int(data['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format {int(data['format_version'])} in {npz_path}")
+
+        scaler_kind = str(data['scaler_kind'])
+        scaler = CompiledScaler(
+            scaler_kind,
+            data['scaler_offset'] if bool(data['scaler_has_offset']) else None,
+            data['scaler_scale'] if bool(data['scaler_has_scale']) else None,
+            tuple(data['scaler_clip'].tolist()) if data['scaler_clip'].size else None,
+            # Exports written before the flag existed used the uncast arithmetic
+            bool(data['scaler_cast']) if 'scaler_cast' in data.files else False
+        )
+        model = CompiledForest(
+            data['roots'], data['left'], data['right'], data['feature'],
+            data['threshold'], data['value'], data['max_depth'],
+            data['classes'], data['average']
+        )
+    return model, scaler
@@ -0,0 +1,197 @@
+"""
+Color/texture features for the sklearn pepper disease model (pepper_detector_final.pkl).
+
+Each image gives 36 features, matching what the model was trained on:
+- a 10-bin histogram per RGB channel of a 100x100 thumbnail (30 values);
+- mean and std of the Canny edge map, the Laplacian and the grayscale image (6 values).
+
+The histograms come from one bincount over a precomputed bin lookup table
+rather than three cv2.calcHist calls. extract_features_batch() decodes and
+featurizes N images on a thread pool and stacks them into one matrix, so
+the caller can run a single scaler.transform / predict_proba. When a
+FeatureCache is given (or LEAF_FEATURE_CACHE_DIR is set), features are stored
+per image content hash and re-scoring a stored image skips decoding.
+"""
+import os
+import sys
+import hashlib
+import numpy as np
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+from image_io import read_image
+
+FEATURE_SIZE = 100
+HIST_BINS = 10
+NUM_FEATURES = 3 * HIST_BINS + 6
+# Bump when the feature definition changes so stale cache entries are ignored
+# (2: full decode again; v1 entries came from a reduced JPEG decode)
+FEATURE_VERSION = 2
+FEATURE_WORKERS = int(os.environ.get('LEAF_FEATURE_WORKERS', min(8, os.cpu_count() or 1)))
+CACHE_DIR_ENV = 'LEAF_FEATURE_CACHE_DIR'
+
+# Same binning as cv2.calcHist(..., [10], [0, 256]): bin = floor(value * 10 / 256)
+_BIN_LUT = (np.arange(256) * HIST_BINS // 256).astype(np.intp)
+# Offsets that put R, G and B into bins 0-9, 10-19 and 20-29
+_CHANNEL_OFFSETS = np.arange(3, dtype=np.intp) * HIST_BINS
+
+_executor = None
+
+
+def features_from_array(img, size=FEATURE_SIZE):
+    """Compute the 36-feature vector for a decoded BGR image."""
+    img_resized = cv2.resize(img, (size, size))
+
+    # Color histogram features (30 features) - BGR reversed to the RGB order used in training
+    bins = _BIN_LUT[img_resized.reshape(-1, 3)[:, ::-1]] + _CHANNEL_OFFSETS
+    hist = np.bincount(bins.ravel(), minlength=3 * HIST_BINS)
+
+    # Grayscale features
+    img_gray = cv2.cvtColor(img_resized, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(img_gray, 100, 200)
+    lap = cv2.Laplacian(img_gray, cv2.CV_64F)
+
+    features = np.empty(NUM_FEATURES, dtype=np.float32)
+    features[:3 * HIST_BINS] = hist
+    features[3 * HIST_BINS:] = (
+        edges.mean(), edges.std(),
+        lap.mean(), lap.std(),
+        img_gray.mean(), img_gray.std()
+    )
+    return features
+
+
+class FeatureCache:
+    """
+    On-disk feature cache: one .npy file per image, keyed by a hash of the file
+    bytes, the thumbnail size and FEATURE_VERSION. Safe to share between processes.
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(image_path, size=FEATURE_SIZE):
+        digest = hashlib.sha1()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return f"{digest.hexdigest()}-{size}-v{FEATURE_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.npy')
+
+    def get(self, key):
+        try:
+            features = np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+        return features if features.shape == (NUM_FEATURES,) else None
+
+    def put(self, key, features):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, features)
+        os.replace(tmp_path, path)
+
+
+_default_cache = None
+
+
+def default_cache():
+    """FeatureCache for LEAF_FEATURE_CACHE_DIR, or None when caching is off."""
+    global _default_cache
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if not directory:
+        return None
+    if _default_cache is None or _default_cache.directory != directory:
+        _default_cache = FeatureCache(directory)
+    return _default_cache
+
+
+def extract_features(image_path, size=FEATURE_SIZE, cache=None):
+    """Features for one image file, or None if it cannot be read."""
+    try:
+        key = None
+        if cache is not None:
+            key = cache.key(image_path, size)
+            features = cache.get(key)
+            if features is not None:
+                return features
+
+        # Full decode, as in training: a reduced (DCT-scaled) decode gives a
+        # different thumbnail after cv2.resize, and the features drift
+        img = read_image(image_path)
+        if img is None:
+            return None
+        features = features_from_array(img, size)
+
+        if cache is not None:
+            cache.put(key, features)
+        return features
+    except Exception as e:
+        print(f"❌ Error extracting features: {str(e)}", file=sys.stderr)
+        return None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=FEATURE_WORKERS, thread_name_prefix='leaf-features')
+    return _executor
+
+
+def extract_features_batch(image_paths, size=FEATURE_SIZE, cache=None):
+    """
+    Features for many images, extracted in parallel (OpenCV releases the GIL).
+    Returns (X, ok): an (N, 36) float32 matrix and a boolean mask of the rows
+    that could be read. Unreadable rows are left as zeros.
+    """
+    X = np.zeros((len(image_paths), NUM_FEATURES), dtype=np.float32)
+    ok = np.zeros(len(image_paths), dtype=bool)
+    if not image_paths:
+        return X, ok
+
+    if len(image_paths) == 1:
+        rows = [extract_features(image_paths[0], size, cache)]
+    else:
+        rows = _get_executor().map(lambda path: extract_features(path, size, cache), image_paths)
+
+    for i, features in enumerate(rows):
+        if features is not None:
+            X[i] = features
+            ok[i] = True
+    return X, ok
+
+
+def format_prediction(probabilities, classes):
+    """Result dict for one row of predict_proba output."""
+    class_idx = int(np.argmax(probabilities))
+    return {
+        'disease': classes[class_idx],
+        'confidence': round(float(probabilities[class_idx]) * 100, 2),
+        'all_predictions': {
+            classes[i]: round(float(probabilities[i]) * 100, 2)
+            for i in range(len(classes))
+        },
+        'success': True
+    }
+
+
+def predict_images(model, scaler, classes, image_paths, cache=None):
+    """
+    Classify many images with one scaler.transform and one predict_proba call.
+    Returns one result dict per path, in order; unreadable images get an error dict.
+    """
+    X, ok = extract_features_batch(image_paths, cache=cache)
+    results = [{'error': 'Could not process image. Ensure it is a valid image file.'} for _ in image_paths]
+    if not ok.any():
+        return results
+
+    probabilities = model.predict_proba(scaler.transform(X[ok]))
+    for i, row in zip(np.flatnonzero(ok), probabilities):
+        results[i] = format_prediction(row, classes)
+    return results
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Central inference precision policy for the YOLO models.
+
+Scripts used to hardcode half=True / half=False. On a CPU ultralytics
+silently ignores half=True, and on a GPU half=False leaves speed unused.
+Instead, policy_for() decides per model:
+
+  1. PRECISION_MODE=fp32|fp16|bf16|int8 forces a mode for every model.
+  2. A benchmarked choice from the cache file is used when one exists for
+     this model file, input size, hardware and torch version.
+  3. With benchmark_missing=True (the long-lived servers), the candidates for
+     this hardware are timed on the raw network. The fastest one whose
+     output stays within PRECISION_TOLERANCE (relative to fp32) is chosen
+     and cached.
+  4. Otherwise a hardware default is used: fp16 on CUDA, fp32 on CPU.
+
+Candidates come from detect_hardware(): fp16/bf16 need a CUDA device with
+support, or a CPU with AVX512-BF16/AMX for bf16. int8 (dynamic quantization
+of Linear layers) needs VNNI/AMX-INT8 and a quantized engine. int8 only
+changes models with Linear layers (classifier heads), so detection models
+skip it.
+
+Populate the cache ahead of time (so spawned scripts get benchmarked choices):
+    python precision_policy.py path/to/best.pt [--imgsz 640]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import platform
+import threading
+from pathlib import Path
+from contextlib import nullcontext
+
+MODES = ('fp32', 'fp16', 'bf16', 'int8')
+FORCED_MODE = os.environ.get('PRECISION_MODE', 'auto').strip().lower()
+TOLERANCE = float(os.environ.get('PRECISION_TOLERANCE', '0.02'))
+CACHE_PATH = Path(os.environ.get('PRECISION_CACHE') or Path.home() / '.cache' / 'pipersmart' / 'precision.json')
+
+_hardware = None
+_policies = {}  # name -> Precision, for summary() / health endpoints
+_cache = (None, {})  # ((mtime_ns, size) of CACHE_PATH, parsed contents)
+_lock = threading.Lock()
+
+
+class Precision:
+    """The chosen mode for one model, and how to run ultralytics predict() with it."""
+
+    __slots__ = ('mode', 'device_type', 'source', 'benchmark')
+
+    def __init__(self, mode, device_type='cpu', source='default', benchmark=None):
+        self.mode = mode
+        self.device_type = device_type
+        self.source = source
+        self.benchmark = benchmark
+
+    @property
+    def half(self):
+        return self.mode == 'fp16'
+
+    def context(self):
+        """Autocast for bf16, nothing otherwise. Thread-local: enter it in the thread that predicts."""
+        if self.mode != 'bf16':
+            return nullcontext()
+        import torch
+        return torch.autocast(self.device_type, dtype=torch.bfloat16)
+
+    def prepare(self, model):
+        """Quantize the model's Linear layers once for int8; a no-op for other modes."""
+        net = getattr(model, 'model', model)
+        if self.mode == 'int8' and not getattr(net, '_int8_quantized', False):
+            _quantize_linear(net, inplace=True)
+            net._int8_quantized = True
+        return model
+
+    def predict(self, model, source, **kwargs):
+        """model.predict(source, **kwargs) in this precision."""
+        self.prepare(model)
+        kwargs['half'] = self.half
+        with self.context():
+            return model.predict(source, **kwargs)
+
+    def as_dict(self):
+        return {"mode": self.mode, "device": self.device_type, "source": self.source, "benchmark": self.benchmark}
+
+
+def cpu_flags():
+    """CPU feature flags from /proc/cpuinfo (empty outside Linux)."""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.split(':', 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def detect_hardware():
+    """CPU features and accelerators relevant to precision choices (computed once)."""
+    global _hardware
+    if _hardware is None:
+        import torch
+        flags = cpu_flags()
+        cuda = torch.cuda.is_available()
+        get_capability = getattr(torch.backends.cpu, 'get_cpu_capability', None)
+        _hardware = {
+            "cpu": platform.processor() or platform.machine(),
+            "avx2": 'avx2' in flags,
+            "avx512": 'avx512f' in flags,
+            "avx512_bf16": 'avx512_bf16' in flags,
+            "amx_bf16": 'amx_bf16' in flags,
+            "amx_int8": 'amx_int8' in flags,
+            "vnni": 'avx512_vnni' in flags or 'avx_vnni' in flags,
+            "torch_cpu_capability": get_capability() if get_capability else None,
+            "quantized_engines": [e for e in torch.backends.quantized.supported_engines if e != 'none'],
+            "cuda": cuda,
+            "cuda_device": torch.cuda.get_device_name(0) if cuda else None,
+            "cuda_bf16": bool(cuda and torch.cuda.is_bf16_supported()),
+            "mps": bool(getattr(torch.backends, 'mps', None) and torch.backends.mps.is_available()),
+            "torch": torch.__version__
+        }
+    return _hardware
+
+
+def candidate_modes(device_type, hardware=None):
+    hw = hardware or detect_hardware()
+    modes = ['fp32']
+    if device_type == 'cuda':
+        modes.append('fp16')
+        if hw["cuda_bf16"]:
+            modes.append('bf16')
+    elif device_type == 'cpu':
+        if hw["avx512_bf16"] or hw["amx_bf16"]:
+            modes.append('bf16')
+        if (hw["vnni"] or hw["amx_int8"]) and set(hw["quantized_engines"]) & {'x86', 'fbgemm', 'onednn'}:
+            modes.append('int8')
+    return modes
+
+
+def default_mode(device_type):
+    return 'fp16' if device_type == 'cuda' else 'fp32'
+
+
+def _quantize_linear(net, inplace=False):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(net, {torch.nn.Linear}, dtype=torch.qint8, inplace=inplace)
+
+
+def _first_tensor(output):
+    while isinstance(output, (list, tuple)):
+        output = output[0]
+    return output
+
+
+def _device_type(net, device=None):
+    """Device type predict() will run on: `device` if given, else CUDA when available."""
+    if device is not None:
+        return str(device).split(':')[0]
+    import torch
+    if torch.cuda.is_available():
+        return 'cuda'
+    try:
+        return next(net.parameters()).device.type
+    except StopIteration:
+        return 'cpu'
+
+
+def benchmark(net, imgsz=640, modes=None, repeats=10, device=None):
+    """
+    Time each mode on one random imgsz x imgsz batch of the raw network.
+    Returns {mode: {"ms", "rel_error"} or {"skipped"/"error"}}; rel_error is
+    the max absolute output difference from fp32 over the fp32 output range.
+    """
+    import copy
+    import torch
+
+    device_type = _device_type(net, device)
+    modes = modes or candidate_modes(device_type)
+    if next(net.parameters()).device.type != device_type:
+        net = copy.deepcopy(net).to(device_type)
+    example = torch.rand(1, 3, imgsz, imgsz, device=next(net.parameters()).device)
+
+    def timed(fn):
+        for _ in range(2):
+            fn()
+        samples = []
+        for _ in range(repeats):
+            if device_type == 'cuda':
+                torch.cuda.synchronize()
+            start = time.perf_counter()
+            output = fn()
+            if device_type == 'cuda':
+                torch.cuda.synchronize()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return output, samples[len(samples) // 2]
+
+    results = {}
+    with torch.inference_mode():
+        reference, fp32_ms = timed(lambda: _first_tensor(net(example)))
+        reference = reference.float()
+        scale = float(reference.abs().max().clamp_min(1e-6))
+        results['fp32'] = {"ms": round(fp32_ms, 2), "rel_error": 0.0}
+
+        for mode in modes:
+            if mode == 'fp32':
+                continue
+            try:
+                if mode == 'fp16':
+                    candidate, x, ctx = copy.deepcopy(net).half(), example.half(), nullcontext
+                elif mode == 'bf16':
+                    candidate, x = net, example
+                    ctx = lambda: torch.autocast(device_type, dtype=torch.bfloat16)
+                elif mode == 'int8':
+                    if not any(isinstance(m, torch.nn.Linear) for m in net.modules()):
+                        results[mode] = {"skipped": "no Linear layers to quantize"}
+                        continue
+                    candidate, x, ctx = _quantize_linear(copy.deepcopy(net)), example, nullcontext
+                else:
+                    continue
+
+                def run():
+                    with ctx():
+                        return _first_tensor(candidate(x))
+
+                output, ms = timed(run)
+                error = float((output.float() - reference).abs().max()) / scale
+                results[mode] = {"ms": round(ms, 2), "rel_error": round(error, 5)}
+            except Exception as e:
+                results[mode] = {"error": str(e)}
+    return results
+
+
+def pick_mode(results, tolerance=TOLERANCE):
+    """Fastest benchmarked mode whose error is within tolerance (fp32 always qualifies)."""
+    valid = {mode: r["ms"] for mode, r in results.items() if "ms" in r and r["rel_error"] <= tolerance}
+    return min(valid, key=valid.get) if valid else 'fp32'
+
+
+def _cache_key(model_path, imgsz, device_type):
+    stat = os.stat(model_path)
+    hw = detect_hardware()
+    parts = [os.path.abspath(str(model_path)), stat.st_size, int(stat.st_mtime), imgsz, device_type,
+             hw["cpu"], hw["cuda_device"], hw["torch"], sorted(k for k, v in hw.items() if v is True)]
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def _cache_stamp():
+    try:
+        stat = os.stat(CACHE_PATH)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_cache():
+    """Contents of CACHE_PATH, parsed again only when the file's mtime or size changes. Do not mutate."""
+    global _cache
+    stamp = _cache_stamp()
+    if stamp is None:
+        return {}
+    cached_stamp, data = _cache
+    if stamp != cached_stamp:
+        try:
+            with open(CACHE_PATH) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        _cache = (stamp, data)
+    return data
+
+
+def _write_cache_entry(key, entry):
+    global _cache
+    with _lock:
+        cache = dict(_read_cache())
+        cache[key] = entry
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{CACHE_PATH}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, CACHE_PATH)
+        _cache = (_cache_stamp(), cache)
+
+
+def policy_for(name, model, model_path=None, imgsz=640, benchmark_missing=False, device=None):
+    """
+    Precision for `model` (an ultralytics YOLO or nn.Module), registered under
+    `name` for summary(). Pass `device` when predict() is called with one.
+    Benchmarks only when benchmark_missing is True and there is no cached
+    choice; cached choices need `model_path`.
+    """
+    net = getattr(model, 'model', model)
+    device_type = _device_type(net, device)
+
+    if FORCED_MODE in MODES:
+        mode = FORCED_MODE
+        if mode == 'fp16' and device_type != 'cuda':
+            print(f"⚠️ PRECISION_MODE=fp16 has no effect on {device_type}; using fp32 for {name}", file=sys.stderr)
+            mode = 'fp32'
+        policy = Precision(mode, device_type, source='env')
+    else:
+        policy = None
+        key = _cache_key(model_path, imgsz, device_type) if model_path and os.path.exists(str(model_path)) else None
+        cached = _read_cache().get(key) if key else None
+        if cached and cached.get("mode") in MODES:
+            policy = Precision(cached["mode"], device_type, source='cache', benchmark=cached.get("benchmark"))
+        elif benchmark_missing:
+            try:
+                results = benchmark(net, imgsz, candidate_modes(device_type), device=device_type)
+                policy = Precision(pick_mode(results), device_type, source='benchmark', benchmark=results)
+                if key:
+                    _write_cache_entry(key, {"mode": policy.mode, "imgsz": imgsz, "benchmark": results,
+                                             "model": os.path.abspath(str(model_path))})
+                print(f"⚖️ Precision for {name}: {policy.mode} ({json.dumps(results)})", file=sys.stderr)
+            except Exception as e:
+                print(f"⚠️ Precision benchmark failed for {name}: {e}", file=sys.stderr)
+        if policy is None:
+            policy = Precision(default_mode(device_type), device_type)
+
+    _policies[name] = policy
+    return policy
+
+
+def summary():
+    """Hardware features and the chosen precision per model (for /health)."""
+    try:
+        hardware = detect_hardware()
+    except ImportError:
+        hardware = None
+    return {
+        "hardware": hardware,
+        "tolerance": TOLERANCE,
+        "forced_mode": FORCED_MODE if FORCED_MODE in MODES else None,
+        "models": {name: policy.as_dict() for name, policy in _policies.items()}
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from model_cache import load_yolo
+
+    parser = argparse.ArgumentParser(description='Benchmark precision modes for YOLO models and cache the choice')
+    parser.add_argument('models', nargs='+', help='YOLO .pt files')
+    parser.add_argument('--imgsz', type=int, default=640)
+    args = parser.parse_args()
+
+    for path in args.models:
+        # Always re-benchmark, replacing any cached choice
+        net = load_yolo(path).model
+        device_type = _device_type(net)
+        results = benchmark(net, args.imgsz)
+        mode = pick_mode(results)
+        _write_cache_entry(_cache_key(path, args.imgsz, device_type),
+                           {"mode": mode, "imgsz": args.imgsz, "benchmark": results, "model": os.path.abspath(path)})
+        _policies[path] = Precision(mode, device_type, 'benchmark', results)
+
+    print(json.dumps(summary(), indent=2))
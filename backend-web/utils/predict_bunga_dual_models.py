@@ -1,10 +1,21 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from model_cache import load_yolo
+import precision_policy
+from detection_postprocess import get_schema, extract_detections
+from image_io import read_image_reduced, letterbox
+import response_encoder
 
 # Suppress warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -34,7 +45,8 @@ def predict_bunga_unified(image_path, unified_model_path):
     
     try:
         # Read image
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 640px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=640)
         if img is None:
             return {
                 "success": False,
@@ -46,7 +58,7 @@ def predict_bunga_unified(image_path, unified_model_path):
                 "image_size": [0, 0]
             }
         
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         
         # Step 1: Unified Bunga Detection (Ripe/Unripe + Health A/B/C/D in single class)
         bunga_class = None
@@ -67,74 +79,40 @@ def predict_bunga_unified(image_path, unified_model_path):
                     print(f"❌ Image file not found: {image_path}", file=sys.stderr)
                     raise FileNotFoundError(f"Image not found at {image_path}")
                 
-                unified_model = YOLO(unified_model_path)
+                unified_model = load_yolo(unified_model_path)
                 print(f"📸 Running inference on image (size: {img_height}x{img_width})...", file=sys.stderr)
                 
                 # SPEED OPTIMIZED: Use 640 for accuracy (model trained on 640x640)
                 # Lower conf=0.15 for better detection sensitivity
-                # IMPORTANT: Use standard inference, NOT half precision if on CPU to avoid errors
-                unified_results = unified_model.predict(
-                    image_path, 
+                # Precision from precision_policy: fp32 on CPU unless a faster mode was benchmarked
+                frame = letterbox(img, 640, orig_size=orig_size)
+                precision = precision_policy.policy_for('bunga', unified_model, unified_model_path, imgsz=640, device='cpu')
+                unified_results = precision.predict(
+                    unified_model,
+                    frame.image, 
                     conf=0.15,
-                    imgsz=640,
+                    imgsz=frame.size,
                     verbose=False, 
                     device='cpu',  # Force CPU execution to be safe
                     max_det=1
                 )
                 unified_data = unified_results[0]
-                print(f"📊 Raw detections: {len(unified_data.boxes) if unified_data.boxes is not None else 0} boxes", file=sys.stderr)
+                detections = extract_detections(unified_data, get_schema(unified_model.names), letterbox=frame)
+                print(f"📊 Raw detections: {len(detections)} boxes", file=sys.stderr)
                 
-                if unified_data.boxes is not None and len(unified_data.boxes) > 0:
+                if detections:
                     # Get best detection
-                    best_box = unified_data.boxes[0]
-                    ripeness_confidence = float(best_box.conf[0])
-                    cls_idx = int(best_box.cls[0])
-                    bunga_class = unified_data.names[cls_idx]  # e.g., "Class A-a" or "Rotten"
-                    
-                    # Handle Rotten class (no ripeness/health breakdown)
-                    if bunga_class.lower() == "rotten":
-                        ripeness_result = "Rotten"
-                        health_class = None
-                    else:
-                        # Parse class name: "Class A-a", "Class B-c", etc.
-                        # Format: "Class [RIPENESS]-[HEALTH]"
-                        # RIPENESS: A/B (Ripe 51-100%), C/D (Unripe 0-50%)
-                        # HEALTH: a/b/c/d (76-100%, 51-75%, 26-50%, 0-25%)
-                        parts = bunga_class.split('-')
-                        if len(parts) >= 2:
-                            ripeness_letter = parts[0].strip().split()[-1] if ' ' in parts[0] else parts[0].strip()  # Extract "A", "B", etc.
-                            health_class = parts[1].strip()  # Extract "a", "b", etc.
-                            
-                            # Determine ripeness from letter (A/B = Ripe, C/D = Unripe)
-                            ripeness_result = "Ripe" if ripeness_letter in ['A', 'B'] else "Unripe"
-                        else:
-                            ripeness_result = None
-                            health_class = None
-                    
-                    # Extract bounding box
-                    try:
-                        bbox_tensor = best_box.xyxy[0]
-                        px1, py1, px2, py2 = int(bbox_tensor[0]), int(bbox_tensor[1]), int(bbox_tensor[2]), int(bbox_tensor[3])
-                    except:
-                        norm_coords = best_box.xyxyn[0]
-                        x1, y1, x2, y2 = float(norm_coords[0]), float(norm_coords[1]), float(norm_coords[2]), float(norm_coords[3])
-                        px1, py1, px2, py2 = int(x1 * img_width), int(y1 * img_height), int(x2 * img_width), int(y2 * img_height)
+                    best = detections[0]
+                    ripeness_confidence = best.confidence
+                    bunga_class = best.class_name  # e.g., "Class A-a" or "Rotten"
                     
-                    # Map health class to percentage range (using lowercase letters a/b/c/d)
-                    health_ranges = {
-                        'a': {'range': '76-100%', 'min': 76, 'max': 100},
-                        'b': {'range': '51-75%', 'min': 51, 'max': 75},
-                        'c': {'range': '26-50%', 'min': 26, 'max': 50},
-                        'd': {'range': '0-25%', 'min': 0, 'max': 25}
-                    }
-                    
-                    if health_class and health_class.lower() in health_ranges:
-                        h_range = health_ranges[health_class.lower()]
-                        health_range = h_range['range']
-                        # Use confidence to estimate position within range
-                        min_pct = h_range['min']
-                        max_pct = h_range['max']
-                        health_percentage = round(min_pct + (ripeness_confidence * (max_pct - min_pct)), 1)
+                    # Ripeness (A/B = Ripe, C/D = Unripe), health letter and its range
+                    # all come from the class schema compiled once for this model
+                    ripeness_result = best.ripeness
+                    health_class = best.health_class
+                    px1, py1, px2, py2 = best.bbox
+                    health_range = best.health_range
+                    health_percentage = best.health_percentage
                     
                     print(f"✅ Unified detection: {bunga_class} ({ripeness_confidence:.2f}) - Health {health_range}", file=sys.stderr)
                     
@@ -191,13 +169,15 @@ def predict_bunga_unified(image_path, unified_model_path):
 
 
 if __name__ == "__main__":
+    response_encoder.claim_stdout()
+    
     if len(sys.argv) < 2:
-        print(json.dumps({
+        response_encoder.emit({
             "error": "No image path provided",
             "success": False,
             "bunga_detections": [],
             "image_size": [0, 0]
-        }))
+        })
         sys.exit(1)
     
     image_path = sys.argv[1]
@@ -207,4 +187,5 @@ if __name__ == "__main__":
     print(f"🤖 Unified model: {unified_model_path}", file=sys.stderr)
     
     result = predict_bunga_unified(image_path, unified_model_path)
-    print(json.dumps(result))
+    startup_profiler.report(result)
+    response_encoder.emit(result)
@@ -1,9 +1,20 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
-from ultralytics import YOLO
+from model_cache import load_yolo
+import precision_policy
+from detection_postprocess import RIPENESS_RANGES, get_schema, extract_detections
+from image_io import read_image_reduced, letterbox
+import response_encoder
 
 # Suppress TensorFlow and other warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -44,98 +55,55 @@ def predict_bunga_unified_web(image_path, unified_model_path):
             return result
 
         # 2. Read Image
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 640px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=640)
         if img is None:
             result["error"] = "Failed to read image file (corrupt or invalid format)"
             return result
             
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         result["image_size"] = [img_width, img_height]
         
         print(f"📸 [WEB-CPU] Processing image: {img_width}x{img_height}", file=sys.stderr)
 
         # 3. Load Model (CPU Mode)
         print(f"🤖 [WEB-CPU] Loading YOLO model...", file=sys.stderr)
-        model = YOLO(unified_model_path)
+        model = load_yolo(unified_model_path)
         
         # 4. Run Inference
         # device='cpu': Forces CPU execution (avoids CUDA overhead/errors)
-        # half=False: Uses float32 (standard precision) - faster/safer on many CPUs
+        # Precision: fp32 unless a benchmarked choice (e.g. bf16 on AMX CPUs) is cached - see precision_policy
         # conf=0.10: Lower threshold further to catch ANY potential matches (Web images are often blurry)
         # imgsz=640: Standard training size
-        results = model.predict(
-            image_path,
+        frame = letterbox(img, 640, orig_size=orig_size)
+        precision = precision_policy.policy_for('bunga', model, unified_model_path, imgsz=640, device='cpu')
+        results = precision.predict(
+            model,
+            frame.image,
             conf=0.10,     # Lowered from 0.15 to 0.10 to be more sensitive
-            imgsz=640,
+            imgsz=frame.size,
             device='cpu',
-            half=False, 
             verbose=False,
             max_det=1
         )
         
         # 5. Process Results
-        detection = results[0]
-        if detection.boxes is not None and len(detection.boxes) > 0:
+        detections = extract_detections(results[0], get_schema(model.names), letterbox=frame)
+        if detections:
             # Take the highest confidence box
-            best_box = detection.boxes[0]
-            
-            # Extract raw data
-            confidence = float(best_box.conf[0])
-            cls_idx = int(best_box.cls[0])
-            class_name = detection.names[cls_idx] # e.g. "Class A-a"
-            
-            # Get BBox coordinates
-            try:
-                # XYXY format (pixels)
-                box = best_box.xyxy[0].cpu().numpy()
-                bbox = [int(x) for x in box]
-            except:
-                bbox = [0, 0, 0, 0]
+            best = detections[0]
+            confidence = best.confidence
+            class_name = best.class_name # e.g. "Class A-a"
+            bbox = best.bbox
 
-            # Parse Class Name -> Ripeness & Health
+            # Ripeness & Health come from the precompiled class schema
             # Format: "Class [RIPENESS]-[HEALTH]" or "Rotten"
-            ripeness_status = None
-            health_status = None
-            health_pct = 0
-            health_rng = None
-            
-            if class_name.lower() == "rotten":
-                ripeness_status = "Rotten"
-                health_status = None
-            else:
-                # Parse "Class A-a"
-                parts = class_name.split('-')
-                if len(parts) >= 2:
-                    # Get letters
-                    # part[0] might be "Class A" -> take last char "A"
-                    r_char = parts[0].strip().split()[-1] 
-                    h_char = parts[1].strip() # "a", "b", "c", "d"
-                    
-                    # Determine Ripeness
-                    if r_char in ['A', 'B']:
-                        ripeness_status = "Ripe"
-                    elif r_char in ['C', 'D']:
-                        ripeness_status = "Unripe"
-                    else:
-                        ripeness_status = "Unknown"
-                        
-                    health_status = h_char
-                    
-                    # Calculate Health Percentage
-                    # Map: a=76-100, b=51-75, c=26-50, d=0-25
-                    health_map = {
-                        'a': (76, 100),
-                        'b': (51, 75),
-                        'c': (26, 50),
-                        'd': (0, 25)
-                    }
-                    
-                    if h_char.lower() in health_map:
-                        min_v, max_v = health_map[h_char.lower()]
-                        health_rng = f"{min_v}-{max_v}%"
-                        # Interpolate percentage based on confidence
-                        # Higher confidence = higher within the range
-                        health_pct = round(min_v + (confidence * (max_v - min_v)), 1)
+            ripeness_status = best.ripeness
+            if best.ripeness_letter is not None and best.ripeness_letter not in RIPENESS_RANGES:
+                ripeness_status = "Unknown"
+            health_status = best.health_class
+            health_pct = best.health_percentage
+            health_rng = best.health_range
 
             # 6. Success - Populate Result
             result["success"] = True
@@ -194,9 +162,11 @@ def predict_bunga_unified_web(image_path, unified_model_path):
         return result
 
 if __name__ == "__main__":
+    response_encoder.claim_stdout()
+    
     # Standard CLI entry point
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "No image path provided", "success": False}))
+        response_encoder.emit({"error": "No image path provided", "success": False})
         sys.exit(1)
     
     img_path = sys.argv[1]
@@ -207,4 +177,5 @@ if __name__ == "__main__":
     final_result = predict_bunga_unified_web(img_path, model_path)
     
     # Output JSON to stdout for Node.js
-    print(json.dumps(final_result))
+    startup_profiler.report(final_result)
+    response_encoder.emit(final_result)
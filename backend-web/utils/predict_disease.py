@@ -1,109 +1,124 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
+import threading
 import numpy as np
 import cv2
-import joblib
 from pathlib import Path
+import leaf_features
+import compiled_forest
+import response_encoder
 
 def extract_features(image_path, size=100):
     """Extract color and texture features from image"""
+    return leaf_features.extract_features(image_path, size, cache=leaf_features.default_cache())
+
+def find_model_files():
+    """Return (model_path, scaler_path, labels_path) for the sklearn disease model"""
+    # Define model paths relative to backend-web directory
+    backend_web_dir = Path(__file__).parent.parent
+    model_path = backend_web_dir / 'ml_models' / 'pepper_disease_detector' / 'models' / 'pepper_detector_final.pkl'
+    scaler_path = backend_web_dir / 'ml_models' / 'pepper_disease_detector' / 'models' / 'scaler.pkl'
+    labels_path = backend_web_dir / 'ml_models' / 'pepper_disease_detector' / 'class_labels.json'
+    
+    # Fallback to parent directory structure
+    if not model_path.exists():
+        model_path = Path(__file__).parent.parent.parent / 'ml_models' / 'pepper_disease_detector' / 'models' / 'pepper_detector_final.pkl'
+        scaler_path = Path(__file__).parent.parent.parent / 'ml_models' / 'pepper_disease_detector' / 'models' / 'scaler.pkl'
+        labels_path = Path(__file__).parent.parent.parent / 'ml_models' / 'pepper_disease_detector' / 'class_labels.json'
+    
+    return model_path, scaler_path, labels_path
+
+# 'auto' uses the NumPy export (export_disease_model.py) when it is up to date, else the pickles
+MODEL_BACKEND = os.environ.get('PEPPER_DISEASE_BACKEND', 'auto').strip().lower()
+
+# Loaded on first use and kept for the life of the process (see get_predictor)
+_PREDICTOR = None
+_predictor_lock = threading.Lock()
+
+def load_model():
+    """
+    Load the model, scaler and class labels. Returns (model, scaler, classes) or raises.
+    Every process holds its own copy of the trees: sklearn's Tree.__setstate__
+    copies the node arrays, so memory-mapping the pickle would not share them.
+    """
+    model_path, scaler_path, labels_path = find_model_files()
+    compiled_path = model_path.with_suffix('.npz')
+    
+    with open(labels_path) as f:
+        classes = json.load(f)
+    
+    # The compiled export needs neither scikit-learn nor joblib
+    use_compiled = MODEL_BACKEND == 'numpy' or (
+        MODEL_BACKEND == 'auto' and compiled_path.exists() and
+        (not model_path.exists() or compiled_path.stat().st_mtime >= model_path.stat().st_mtime)
+    )
+    if use_compiled:
+        model, scaler = compiled_forest.load_compiled(str(compiled_path))
+        print(f"⚡ Using compiled disease model: {compiled_path.name}", file=sys.stderr)
+        return model, scaler, classes
+    
+    if not model_path.exists():
+        raise FileNotFoundError(f'Model not found at {model_path}')
+    
+    import joblib
+    model = joblib.load(str(model_path))
+    scaler = joblib.load(str(scaler_path))
+    
+    return model, scaler, classes
+
+def get_predictor():
+    """Return the cached (model, scaler, classes), loading them on first call."""
+    global _PREDICTOR
+    if _PREDICTOR is None:
+        with _predictor_lock:
+            if _PREDICTOR is None:
+                with startup_profiler.step('load disease model'):
+                    _PREDICTOR = load_model()
+    return _PREDICTOR
+
+def predict_disease_batch(image_paths):
+    """
+    Predict diseases for several images at once: features are extracted in
+    parallel and scored with a single scaler.transform / predict_proba.
+    """
     try:
-        img = cv2.imread(image_path)
-        if img is None:
-            return None
-        
-        img_resized = cv2.resize(img, (size, size))
-        img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
-        
-        features = []
-        
-        # Color histogram features (30 features)
-        for i in range(3):
-            hist = cv2.calcHist([img_rgb], [i], None, [10], [0, 256])
-            features.extend(hist.flatten())
-        
-        # Grayscale features
-        img_gray = cv2.cvtColor(img_resized, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(img_gray, 100, 200)
-        lap = cv2.Laplacian(img_gray, cv2.CV_64F)
-        
-        features.append(edges.mean())
-        features.append(edges.std())
-        features.append(lap.mean())
-        features.append(lap.std())
-        features.append(img_gray.mean())
-        features.append(img_gray.std())
-        
-        return np.array(features, dtype=np.float32)
+        model, scaler, classes = get_predictor()
     except Exception as e:
-        print(json.dumps({'error': f'Error extracting features: {str(e)}'}))
-        return None
+        return [{'error': str(e)} for _ in image_paths]
+    
+    return leaf_features.predict_images(model, scaler, classes, image_paths, cache=leaf_features.default_cache())
 
 def predict_disease(image_path):
     """Predict disease from image"""
     try:
-        # Define model paths relative to backend-web directory
-        backend_web_dir = Path(__file__).parent.parent
-        model_path = backend_web_dir / 'ml_models' / 'pepper_disease_detector' / 'models' / 'pepper_detector_final.pkl'
-        scaler_path = backend_web_dir / 'ml_models' / 'pepper_disease_detector' / 'models' / 'scaler.pkl'
-        labels_path = backend_web_dir / 'ml_models' / 'pepper_disease_detector' / 'class_labels.json'
-        
-        # Fallback to parent directory structure
-        if not model_path.exists():
-            model_path = Path(__file__).parent.parent.parent / 'ml_models' / 'pepper_disease_detector' / 'models' / 'pepper_detector_final.pkl'
-            scaler_path = Path(__file__).parent.parent.parent / 'ml_models' / 'pepper_disease_detector' / 'models' / 'scaler.pkl'
-            labels_path = Path(__file__).parent.parent.parent / 'ml_models' / 'pepper_disease_detector' / 'class_labels.json'
-        
-        # Load model and scaler
-        if not model_path.exists():
-            return {'error': f'Model not found at {model_path}'}
-        
-        model = joblib.load(str(model_path))
-        scaler = joblib.load(str(scaler_path))
-        
-        with open(labels_path) as f:
-            classes = json.load(f)
-        
-        # Extract features from image
-        features = extract_features(image_path)
-        if features is None:
-            return {'error': 'Could not process image. Ensure it is a valid image file.'}
-        
-        # Scale features
-        features_scaled = scaler.transform([features])
-        
-        # Predict
-        predictions = model.predict_proba(features_scaled)[0]
-        class_idx = np.argmax(predictions)
-        confidence = float(predictions[class_idx]) * 100
-        
-        # Get all predictions
-        all_predictions = {
-            classes[i]: round(float(predictions[i]) * 100, 2)
-            for i in range(len(classes))
-        }
-        
-        return {
-            'disease': classes[class_idx],
-            'confidence': round(confidence, 2),
-            'all_predictions': all_predictions,
-            'success': True
-        }
-    
+        return predict_disease_batch([image_path])[0]
     except Exception as e:
         return {'error': str(e)}
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({'error': 'No image path provided'}))
-        sys.exit(1)
+    response_encoder.claim_stdout()
     
-    image_path = sys.argv[1]
-    
-    if not os.path.exists(image_path):
-        print(json.dumps({'error': f'Image file not found: {image_path}'}))
+    image_paths = sys.argv[1:]
+    if not image_paths:
+        response_encoder.emit({'error': 'No image path provided'})
         sys.exit(1)
     
-    result = predict_disease(image_path)
-    print(json.dumps(result))
+    for image_path in image_paths:
+        if not os.path.exists(image_path):
+            response_encoder.emit({'error': f'Image file not found: {image_path}'})
+            sys.exit(1)
+    
+    if len(image_paths) == 1:
+        result = predict_disease(image_paths[0])
+    else:
+        result = {'success': True, 'results': predict_disease_batch(image_paths)}
+    startup_profiler.report(result)
+    response_encoder.emit(result)
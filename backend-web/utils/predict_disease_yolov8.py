@@ -1,9 +1,20 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
-from ultralytics import YOLO
+from model_cache import load_yolo
+import precision_policy
+from detection_postprocess import get_schema, extract_detections, best_detection
+from image_io import read_image_reduced, letterbox
+import response_encoder
 
 # Suppress TensorFlow and other warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -36,84 +47,67 @@ def predict_leaf_disease_cpu(image_path, model_path):
             return result
 
         # 2. Read Image
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 640px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=640)
         if img is None:
             result["error"] = "Failed to read image file (corrupt or invalid format)"
             return result
             
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         result["image_size"] = [img_width, img_height]
         
         print(f"📸 [LEAF-CPU] Processing image: {img_width}x{img_height}", file=sys.stderr)
 
         # 3. Load Model (CPU Mode)
         print(f"🤖 [LEAF-CPU] Loading YOLO model: {model_path}", file=sys.stderr)
-        model = YOLO(model_path)
+        model = load_yolo(model_path)
         
         # Log classes for debugging
         print(f"📋 [LEAF-CPU] Model Classes: {model.names}", file=sys.stderr)
         
         # 4. Run Inference
         # Lower confidence to 0.10 to ensure we catch diseases even if model is unsure
-        results = model.predict(
-            image_path,
+        frame = letterbox(img, 640, orig_size=orig_size)
+        # fp32 unless a benchmarked precision (bf16 on AMX/AVX512-BF16 CPUs) is cached for this model
+        precision = precision_policy.policy_for('leaf', model, model_path, imgsz=640, device='cpu')
+        results = precision.predict(
+            model,
+            frame.image,
             conf=0.10,     # Lowered from 0.25 to 0.10 to be more sensitive
-            imgsz=640,
+            imgsz=frame.size,
             device='cpu',
-            half=False, 
             verbose=False,
             max_det=10     # Get top 10 to inspect
         )
         
         # 5. Process Results
-        detection = results[0]
-        
-        disease_candidates = []
-        healthy_candidates = []
+        detections = extract_detections(results[0], get_schema(model.names), letterbox=frame)
         
-        if detection.boxes is not None and len(detection.boxes) > 0:
-            for box in detection.boxes:
-                conf = float(box.conf[0])
-                cls_idx = int(box.cls[0])
-                name = detection.names[cls_idx]
-                
-                # Store all detections
-                result["detections"].append({
-                    "class": name,
-                    "confidence": round(conf * 100, 2),
-                    "bbox": [int(x) for x in box.xyxy[0].tolist()]
-                })
-                
-                # Categorize
-                if name.lower() == "healthy":
-                    healthy_candidates.append((name, conf))
-                else:
-                    disease_candidates.append((name, conf))
+        if detections:
+            # Store all detections
+            result["detections"] = [
+                {
+                    "class": det.class_name,
+                    "confidence": round(det.confidence * 100, 2),
+                    "bbox": det.bbox
+                }
+                for det in detections
+            ]
             
             # DECISION LOGIC:
             # Prioritize ANY disease detection over "Healthy"
-            if len(disease_candidates) > 0:
-                # Pick the highest confidence disease
-                disease_candidates.sort(key=lambda x: x[1], reverse=True)
-                best_class, best_conf = disease_candidates[0]
-                
+            best = best_detection(detections, prefer_disease=True)
+            best_class, best_conf = best.class_name, best.confidence
+            
+            if best_class.lower() != "healthy":
                 print(f"✅ [LEAF-CPU] Disease Detected: {best_class} ({round(best_conf*100, 2)}%)", file=sys.stderr)
-                result["success"] = True
                 result["disease"] = best_class
-                result["confidence"] = round(best_conf * 100, 2)
-                
-            elif len(healthy_candidates) > 0:
+            else:
                 # Only Healthy detected
-                healthy_candidates.sort(key=lambda x: x[1], reverse=True)
-                best_class, best_conf = healthy_candidates[0]
-                
                 print(f"✅ [LEAF-CPU] Healthy Detected: {round(best_conf*100, 2)}%", file=sys.stderr)
-                result["success"] = True
                 result["disease"] = "Healthy"
-                result["confidence"] = round(best_conf * 100, 2)
-            else:
-                # Should not happen if len > 0
-                pass
+            result["success"] = True
+            result["confidence"] = round(best_conf * 100, 2)
                 
         else:
             print(f"ℹ️ [LEAF-CPU] No detections found. Defaulting to Healthy.", file=sys.stderr)
@@ -129,12 +123,15 @@ def predict_leaf_disease_cpu(image_path, model_path):
         return result
 
 if __name__ == "__main__":
+    response_encoder.claim_stdout()
+    
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "No image path provided", "success": False}))
+        response_encoder.emit({"error": "No image path provided", "success": False})
         sys.exit(1)
     
     img_path = sys.argv[1]
     model_path = sys.argv[2] if len(sys.argv) > 2 else "leaf_disease_model.pt"
     
     final_result = predict_leaf_disease_cpu(img_path, model_path)
-    print(json.dumps(final_result))
+    startup_profiler.report(final_result)
+    response_encoder.emit(final_result)
@@ -0,0 +1,121 @@
+"""
+Cold-start profiling for the spawned predictor scripts.
+
+Enable with --profile-startup on the command line (or PYTHON_PROFILE_STARTUP=1).
+install() must run before the script's other imports: it wraps __import__ so
+the first import of each heavy package (torch, ultralytics, cv2, ...) is timed.
+step() times any other phase, such as a model load. report() prints the
+breakdown to stderr and adds it to the result payload as "startup_profile".
+Import times are inclusive: when ultralytics pulls in torch, torch is listed
+nested under it.
+
+When profiling is off, install() does nothing and step() only reads the clock.
+"""
+import os
+import sys
+import time
+import builtins
+from contextlib import contextmanager
+
+FLAG = '--profile-startup'
+ENV_FLAG = 'PYTHON_PROFILE_STARTUP'
+TRACKED_MODULES = ('torch', 'torchvision', 'ultralytics', 'cv2', 'numpy', 'PIL',
+                   'sklearn', 'joblib', 'tensorflow', 'orjson')
+
+_start = time.perf_counter()
+_enabled = False
+_records = []
+_depth = 0
+_real_import = builtins.__import__
+
+
+def enabled():
+    return _enabled
+
+
+def _record(label, elapsed_ms, depth):
+    _records.append((label, elapsed_ms, depth))
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    global _depth
+    root = name.partition('.')[0]
+    if level or root not in TRACKED_MODULES or root in sys.modules:
+        return _real_import(name, globals, locals, fromlist, level)
+
+    depth = _depth
+    _depth += 1
+    start = time.perf_counter()
+    try:
+        return _real_import(name, globals, locals, fromlist, level)
+    finally:
+        _depth -= 1
+        _record(f"import {root}", (time.perf_counter() - start) * 1000, depth)
+
+
+def install(argv=None):
+    """
+    Turn profiling on if requested and strip the flag from sys.argv,
+    so positional argument parsing in the script is unaffected.
+    """
+    global _enabled
+    argv = sys.argv if argv is None else argv
+    requested = FLAG in argv or os.environ.get(ENV_FLAG, '').strip().lower() in ('1', 'true', 'yes', 'on')
+    while FLAG in argv:
+        argv.remove(FLAG)
+    if requested and not _enabled:
+        _enabled = True
+        builtins.__import__ = _timed_import
+
+
+def reset():
+    """Restart the clock and drop recorded steps (used by forked zygote children)."""
+    global _start, _enabled, _depth
+    _start = time.perf_counter()
+    _records.clear()
+    _depth = 0
+    if _enabled:
+        builtins.__import__ = _real_import
+        _enabled = False
+
+
+@contextmanager
+def step(label):
+    """Time a block (e.g. a model load) when profiling is enabled."""
+    if not _enabled:
+        yield
+        return
+    global _depth
+    depth = _depth
+    _depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _depth -= 1
+        _record(label, (time.perf_counter() - start) * 1000, depth)
+
+
+def summary():
+    """Profile as a dict: steps in completion order plus total time since install."""
+    return {
+        "steps": [
+            {"step": label, "ms": round(elapsed_ms, 1), "depth": depth}
+            for label, elapsed_ms, depth in _records
+        ],
+        "total_ms": round((time.perf_counter() - _start) * 1000, 1)
+    }
+
+
+def report(result=None):
+    """Print the profile to stderr and attach it to `result` (a dict) if profiling is on."""
+    if not _enabled:
+        return result
+    profile = summary()
+    print(f"⏱️ Startup profile ({profile['total_ms']:.0f}ms total):", file=sys.stderr)
+    for entry in profile["steps"]:
+        indent = '  ' * (entry["depth"] + 1)
+        print(f"{indent}{entry['step']:<{40 - len(indent)}} {entry['ms']:>9.1f}ms", file=sys.stderr)
+    if isinstance(result, dict):
+        result["startup_profile"] = profile
+    return result
@@ -3,6 +3,7 @@ const path = require('path');
 const fs = require('fs');
 const { spawn } = require('child_process');
 const { uploadToCloudinary } = require('../utils/Cloudinary');
+const { parsePythonOutput } = require('../utils/pythonResponse');
 
 // Helper to normalize health_class input to a, b, c, d
 const normalizeHealthClass = (rawHealthClass, rawClassStr) => {
@@ -134,10 +135,11 @@ exports.analyzeBunga = async (req, res) => {
         timeout: 120000 
       });
 
-      let output = '';
+      const chunks = [];
       let errorOutput = '';
 
-      python.stdout.on('data', (data) => output += data.toString());
+      // Keep raw bytes: length-framed payloads count bytes, not characters
+      python.stdout.on('data', (data) => chunks.push(data));
       python.stderr.on('data', (data) => {
         errorOutput += data.toString();
         console.log(data.toString()); // Show Python debug logs in real-time
@@ -146,17 +148,7 @@ exports.analyzeBunga = async (req, res) => {
       python.on('close', (code) => {
         if (code === 0 || code === null) {
           try {
-            const lines = output.trim().split('\n');
-            let jsonLine = '';
-            for (let line of lines) {
-              line = line.trim();
-              if (line.startsWith('{')) {
-                jsonLine = line;
-                break;
-              }
-            }
-            if (jsonLine) resolve(JSON.parse(jsonLine));
-            else reject(new Error('No JSON output from Python'));
+            resolve(parsePythonOutput(Buffer.concat(chunks)));
           } catch (e) {
             reject(new Error('Parse error: ' + e.message));
           }
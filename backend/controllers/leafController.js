@@ -3,6 +3,7 @@ const path = require('path');
 const fs = require('fs');
 const { spawn } = require('child_process');
 const { uploadToCloudinary } = require('../utils/Cloudinary');
+const { parsePythonOutput } = require('../utils/pythonResponse');
 const axios = require('axios');
 
 const shouldSaveResult = (req) => {
@@ -65,11 +66,12 @@ exports.analyzeLeaf = async (req, res) => {
         stdio: ['ignore', 'pipe', 'pipe']
       });
 
-      let output = '';
+      const chunks = [];
       let errorOutput = '';
 
+      // Keep raw bytes: length-framed payloads count bytes, not characters
       python.stdout.on('data', (data) => {
-        output += data.toString();
+        chunks.push(data);
       });
 
       python.stderr.on('data', (data) => {
@@ -80,7 +82,7 @@ exports.analyzeLeaf = async (req, res) => {
       python.on('close', (code) => {
         if (code === 0) {
           try {
-            const parsedOutput = JSON.parse(output.trim());
+            const parsedOutput = parsePythonOutput(Buffer.concat(chunks));
             resolve(parsedOutput);
           } catch (e) {
             console.error(`[${requestId}] Error parsing Python output:`, e);
@@ -0,0 +1,123 @@
+"""
+Parity of compiled_forest (the NumPy export from export_disease_model.py)
+with the sklearn pipeline it replaces. Every test runs against both copies
+of the runtime (backend/utils and backend-web/utils), so they cannot drift.
+
+Run from the repository root:
+    python -m pytest backend/tests
+"""
+import os
+import sys
+import importlib.util
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+UTILS_DIRS = ('backend/utils', 'backend-web/utils')
+sys.path.insert(0, os.path.join(REPO_ROOT, 'backend', 'utils'))
+
+pytest.importorskip('sklearn')
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+import export_disease_model
+
+TOLERANCE = 1e-9
+N_FEATURES = 6
+
+
+def training_data(n_samples=300, n_classes=3, seed=0):
+    """Integer-valued features, so every split threshold is an exact k + 0.5."""
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 10, size=(n_samples, N_FEATURES)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * 2 + rng.integers(0, 3, size=n_samples)) % n_classes
+    return X, y.astype(np.int64)
+
+
+@pytest.fixture(params=UTILS_DIRS)
+def runtime(request):
+    """compiled_forest as loaded from one utils directory."""
+    path = os.path.join(REPO_ROOT, request.param, 'compiled_forest.py')
+    spec = importlib.util.spec_from_file_location(f"compiled_forest_{request.param.split('/')[0]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def compile_pipeline(runtime, model, scaler, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    export_disease_model.export_model(model, scaler, path)
+    return runtime.load_compiled(path)
+
+
+def assert_parity(runtime, model, scaler, tmp_path, X):
+    compiled_model, compiled_scaler = compile_pipeline(runtime, model, scaler, tmp_path)
+    report = export_disease_model.check_parity(model, scaler, compiled_model, compiled_scaler, X, TOLERANCE)
+    assert report['passed'], report
+    np.testing.assert_array_equal(
+        model.predict(scaler.transform(X)),
+        compiled_model.predict(compiled_scaler.transform(X))
+    )
+
+
+def test_random_forest_matches_sklearn(runtime, tmp_path):
+    X, y = training_data()
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(scaler.transform(X), y)
+    X_test, _ = training_data(n_samples=200, seed=1)
+    assert_parity(runtime, model, scaler, tmp_path, X_test)
+
+
+def test_extra_trees_with_minmax_scaler(runtime, tmp_path):
+    X, y = training_data()
+    scaler = MinMaxScaler(clip=True).fit(X)
+    model = ExtraTreesClassifier(n_estimators=10, random_state=0).fit(scaler.transform(X), y)
+    X_test, _ = training_data(n_samples=200, seed=2)
+    # Values outside the fitted range exercise the clip
+    X_test[:20] *= 3
+    assert_parity(runtime, model, scaler, tmp_path, X_test)
+
+
+@pytest.mark.parametrize('make_model', [
+    lambda: RandomForestClassifier(n_estimators=1, random_state=0),
+    lambda: DecisionTreeClassifier(random_state=0)
+], ids=['forest-of-one', 'decision-tree'])
+def test_single_tree(runtime, tmp_path, make_model):
+    X, y = training_data()
+    scaler = StandardScaler().fit(X)
+    model = make_model().fit(scaler.transform(X), y)
+    X_test, _ = training_data(n_samples=100, seed=3)
+    assert_parity(runtime, model, scaler, tmp_path, X_test)
+
+
+def test_leaf_only_trees(runtime, tmp_path):
+    X, y = training_data(n_samples=40)
+    scaler = StandardScaler().fit(X)
+    # No node may split, so every tree is a single leaf holding the class frequencies
+    model = RandomForestClassifier(n_estimators=5, min_samples_split=len(X) + 1, random_state=0)
+    model.fit(scaler.transform(X), y)
+    assert all(estimator.tree_.node_count == 1 for estimator in model.estimators_)
+
+    compiled_model, _ = compile_pipeline(runtime, model, scaler, tmp_path)
+    assert compiled_model.max_depth == 0
+    assert_parity(runtime, model, scaler, tmp_path, X)
+
+
+def test_value_equal_to_threshold(runtime, tmp_path):
+    X, y = training_data()
+    # No scaler arithmetic in the way: the test rows must hit the thresholds exactly
+    scaler = StandardScaler(with_mean=False, with_std=False).fit(X)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+
+    # Every feature set to each split value: sklearn sends x <= threshold left
+    thresholds = np.unique(np.concatenate([
+        estimator.tree_.threshold[estimator.tree_.children_left != -1] for estimator in model.estimators_
+    ]))
+    X_test = np.repeat(thresholds.astype(np.float32)[:, None], N_FEATURES, axis=1)
+    assert np.array_equal(X_test[:, 0].astype(np.float64), thresholds)
+    # Mix in rows where only one feature sits on a threshold
+    rng = np.random.default_rng(4)
+    mixed = rng.integers(0, 10, size=(len(thresholds), N_FEATURES)).astype(np.float32)
+    mixed[np.arange(len(thresholds)), np.arange(len(thresholds)) % N_FEATURES] = thresholds
+    assert_parity(runtime, model, scaler, tmp_path, np.vstack([X_test, mixed]))
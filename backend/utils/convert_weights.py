@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Convert YOLO (.pt) and ResNet50 (.pth) weights to memory-mapped safetensors.
+
+Usage:
+    python convert_weights.py                          # the default bunga, leaf and ResNet50 models
+    python convert_weights.py path/to/best.pt other/model.pth
+    python convert_weights.py --check path/to/best.pt  # also compare outputs and load times
+
+For a YOLO checkpoint this writes best.safetensors (Conv+BN fused weights,
+class names and task in the metadata) and best.arch.yaml (the architecture
+ultralytics rebuilds the model from). For a ResNet50 state dict it writes
+model.safetensors with conv weights stored channels_last. model_cache and
+predict_disease_resnet50 pick the converted files up automatically (see
+weight_store.MODEL_WEIGHTS_BACKEND).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+import weight_store
+
+BACKEND_DIR = Path(__file__).parent.parent
+DEFAULT_WEIGHTS = [
+    BACKEND_DIR / 'ml_models' / 'bunga' / 'train' / 'weights' / 'best.pt',
+    BACKEND_DIR / 'ml_models' / 'leaf' / 'train' / 'weights' / 'best.pt',
+    BACKEND_DIR.parent / 'ml_models' / 'leafdataset' / 'unified_pepper_diseases_model.pth',
+]
+
+
+def convert_yolo(model_path, fuse=True):
+    """Write <stem>.safetensors and <stem>.arch.yaml for an ultralytics checkpoint."""
+    import yaml
+    from ultralytics import YOLO
+
+    model = YOLO(str(model_path))
+    net = model.model.float().eval()
+
+    arch = dict(net.yaml)
+    scales, scale = arch.get('scales'), arch.get('scale')
+    if scales:
+        # ultralytics guesses the scale from the yaml file name and falls back to the
+        # first entry, so keep only the one this checkpoint was trained with
+        scale = scale if scale in scales else next(iter(scales))
+        arch['scales'] = {scale: scales[scale]}
+    arch['nc'] = len(net.names)
+    arch.pop('yaml_file', None)
+
+    if fuse:
+        net.fuse(verbose=False)
+
+    output_path = weight_store.converted_path(model_path)
+    arch_path = output_path.with_suffix(weight_store.ARCH_SUFFIX)
+    with open(arch_path, 'w') as f:
+        yaml.safe_dump(arch, f, sort_keys=False)
+    weight_store.save_file(net.state_dict(), output_path, metadata={
+        'format': 'yolo',
+        'task': model.task,
+        'names': json.dumps({int(k): v for k, v in net.names.items()}),
+        'fused': '1' if fuse else '0',
+        'source': Path(model_path).name
+    })
+    return output_path
+
+
+def convert_resnet50(model_path):
+    """Write <stem>.safetensors for a ResNet50 state dict, conv weights channels_last."""
+    import torch
+
+    state_dict = torch.load(str(model_path), map_location='cpu', weights_only=True)
+    output_path = weight_store.converted_path(model_path)
+    weight_store.save_file(
+        state_dict, output_path,
+        metadata={
+            'format': 'resnet50',
+            'num_classes': state_dict['fc.weight'].shape[0],
+            'source': Path(model_path).name
+        },
+        channels_last=[name for name, tensor in state_dict.items() if tensor.dim() == 4]
+    )
+    return output_path
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - start) * 1000
+
+
+def check_yolo(model_path):
+    """Compare raw outputs of the original and converted model on one random input."""
+    import torch
+    from ultralytics import YOLO
+    import model_cache
+
+    original, original_ms = _timed(lambda: YOLO(str(model_path)))
+    converted, converted_ms = _timed(lambda: model_cache.open_yolo(weight_store.converted_path(model_path)))
+    x = torch.rand(1, 3, 640, 640)
+    with torch.inference_mode():
+        a = original.model.float().fuse(verbose=False).eval()(x)
+        b = converted.model(x)
+    a = a[0] if isinstance(a, (list, tuple)) else a
+    b = b[0] if isinstance(b, (list, tuple)) else b
+    return {
+        'max_abs_diff': float((a - b).abs().max()),
+        'names_match': dict(original.names) == dict(converted.names),
+        'load_original_ms': round(original_ms, 1),
+        'load_converted_ms': round(converted_ms, 1)
+    }
+
+
+def check_resnet50(model_path):
+    import torch
+    from predict_disease_resnet50 import build_model
+
+    state_dict, original_ms = _timed(lambda: torch.load(str(model_path), map_location='cpu', weights_only=True))
+    original = build_model(state_dict['fc.weight'].shape[0])
+    original.load_state_dict(state_dict)
+    original.eval()
+
+    def load_converted():
+        tensors, _ = weight_store.load_file(weight_store.converted_path(model_path))
+        with torch.device('meta'):
+            model = build_model(tensors['fc.weight'].shape[0])
+        model.load_state_dict(tensors, assign=True)
+        return model.eval()
+
+    converted, converted_ms = _timed(load_converted)
+    x = torch.rand(2, 3, 224, 224)
+    with torch.inference_mode():
+        diff = (original(x) - converted(x.contiguous(memory_format=torch.channels_last))).abs().max()
+    return {
+        'max_abs_diff': float(diff),
+        'load_original_ms': round(original_ms, 1),
+        'load_converted_ms': round(converted_ms, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert model weights to memory-mapped safetensors')
+    parser.add_argument('weights', nargs='*', help='.pt (YOLO) or .pth (ResNet50) files')
+    parser.add_argument('--no-fuse', action='store_true', help='Keep YOLO BatchNorm layers unfused')
+    parser.add_argument('--check', action='store_true', help='Compare outputs and load times after converting')
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    args = parser.parse_args()
+
+    paths = [Path(p) for p in args.weights] or [p for p in DEFAULT_WEIGHTS if p.exists()]
+    if not paths:
+        print("❌ No weights given and none of the default models exist", file=sys.stderr)
+        return 1
+
+    report, failed = {}, False
+    for path in paths:
+        if not path.exists():
+            print(f"❌ Not found: {path}", file=sys.stderr)
+            failed = True
+            continue
+        is_yolo = path.suffix == '.pt'
+        try:
+            output_path = convert_yolo(path, fuse=not args.no_fuse) if is_yolo else convert_resnet50(path)
+        except Exception as e:
+            print(f"❌ Failed to convert {path}: {e}", file=sys.stderr)
+            failed = True
+            continue
+        print(f"✅ {path} -> {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB)", file=sys.stderr)
+
+        entry = {'output': str(output_path)}
+        if args.check:
+            entry['check'] = check_yolo(path) if is_yolo else check_resnet50(path)
+            if entry['check']['max_abs_diff'] > args.tolerance or not entry['check'].get('names_match', True):
+                print(f"❌ Output mismatch for {path}: max diff {entry['check']['max_abs_diff']:.3g}", file=sys.stderr)
+                failed = True
+        report[str(path)] = entry
+
+    print(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
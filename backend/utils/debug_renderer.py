@@ -0,0 +1,100 @@
+"""
+Optional debug-image rendering for the predictor scripts.
+
+Annotated images are only useful while tuning a model, so rendering is off
+unless requested per call or through the BUNGA_DEBUG_IMAGES environment
+variable. When on, plotting, downscaling and JPEG encoding run on a single
+background writer thread fed by a bounded queue, keeping them off the
+request path. When the queue is full the image is dropped, never waited for.
+"""
+import os
+import sys
+import queue
+import threading
+import cv2
+
+DEBUG_ENV_FLAG = 'BUNGA_DEBUG_IMAGES'
+# Longest side of the written image in pixels (0 keeps the original size)
+DEBUG_MAX_SIDE = int(os.environ.get('BUNGA_DEBUG_MAX_SIDE', 1024))
+DEBUG_JPEG_QUALITY = int(os.environ.get('BUNGA_DEBUG_JPEG_QUALITY', 80))
+DEBUG_QUEUE_SIZE = int(os.environ.get('BUNGA_DEBUG_QUEUE_SIZE', 8))
+
+_queue = None
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def debug_enabled(requested=None):
+    """
+    Resolve whether debug images should be written.
+    An explicit per-request value wins; otherwise the environment flag decides.
+    """
+    if requested is not None:
+        return bool(requested)
+    return os.environ.get(DEBUG_ENV_FLAG, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _downscale(img, max_side):
+    height, width = img.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return img
+    scale = max_side / longest
+    return cv2.resize(img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _write_loop():
+    while True:
+        item = _queue.get()
+        try:
+            if item is None:
+                return
+            result, debug_path, max_side = item
+            debug_img = _downscale(result.plot(), max_side)
+            cv2.imwrite(debug_path, debug_img, [cv2.IMWRITE_JPEG_QUALITY, DEBUG_JPEG_QUALITY])
+            print(f"🧪 Debug image saved: {debug_path}", file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️ Failed to save debug image: {e}", file=sys.stderr)
+        finally:
+            _queue.task_done()
+
+
+def _ensure_worker():
+    global _queue, _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _queue = queue.Queue(maxsize=DEBUG_QUEUE_SIZE)
+            _worker = threading.Thread(target=_write_loop, name='debug-image-writer', daemon=True)
+            _worker.start()
+
+
+def submit(result, debug_path, max_side=DEBUG_MAX_SIDE):
+    """
+    Queue an ultralytics result to be plotted and written to `debug_path`.
+    Returns False if the queue is full and the image was dropped.
+    """
+    _ensure_worker()
+    try:
+        _queue.put_nowait((result, debug_path, max_side))
+        return True
+    except queue.Full:
+        print(f"⚠️ Debug queue full, skipping {debug_path}", file=sys.stderr)
+        return False
+
+
+def flush(timeout=10.0):
+    """
+    Wait for queued debug images to be written.
+    Short-lived scripts call this before exiting so pending writes are not lost.
+    """
+    if _worker is None or not _worker.is_alive():
+        return
+    done = threading.Event()
+
+    def _join():
+        _queue.join()
+        done.set()
+
+    threading.Thread(target=_join, daemon=True).start()
+    if not done.wait(timeout):
+        print(f"⚠️ Debug images still pending after {timeout}s", file=sys.stderr)
@@ -0,0 +1,199 @@
+"""
+Shared post-processing for ultralytics detection results.
+
+Instead of walking `result.boxes` and converting every tensor element to a
+Python number separately, the whole `boxes.data` tensor is pulled to NumPy
+once and every per-box field is computed with array operations. Class-name
+parsing ('Class A-a' -> ripeness 'A', health 'a') and the percentage ranges
+are compiled once per model into a ClassSchema.
+"""
+import numpy as np
+
+# Ripeness letter ranges: A: 76-100%, B: 51-75%, C: 26-50%, D: 0-25%
+RIPENESS_RANGES = {
+    'A': (76, 100),
+    'B': (51, 75),
+    'C': (26, 50),
+    'D': (0, 25)
+}
+
+# Health letter ranges: a: 76-100%, b: 51-75%, c: 26-50%, d: 0-25%
+HEALTH_RANGES = {
+    'a': (76, 100),
+    'b': (51, 75),
+    'c': (26, 50),
+    'd': (0, 25)
+}
+
+RIPE_LETTERS = ('A', 'B')
+
+
+def parse_bunga_class(class_name):
+    """
+    Split a unified bunga class into (ripeness_letter, health_letter).
+    Handles "Class A-a", "A-a" and "A_a". Returns (None, None) if the name
+    does not follow the pattern (e.g. "Rotten" or leaf disease names).
+    """
+    if '-' in class_name:
+        parts = class_name.split('-')
+    elif '_' in class_name:
+        parts = class_name.split('_')
+    else:
+        return None, None
+
+    if len(parts) < 2:
+        return None, None
+
+    # Handle "Class A" or just "A"
+    ripeness_part = parts[0].strip()
+    ripeness_letter = ripeness_part.split()[-1] if ' ' in ripeness_part else ripeness_part
+    health_part = parts[1].strip()
+    health_letter = health_part[0].lower() if health_part else '?'
+    return ripeness_letter.upper(), health_letter
+
+
+class ClassSchema:
+    """
+    Per-model lookup tables, indexed by class id.
+    Built once when the model is loaded (see get_schema) and reused for every result.
+    """
+    __slots__ = ('names', 'ripeness', 'ripeness_letter', 'health_letter',
+                 'health_range', 'r_min', 'r_span', 'h_min', 'h_span')
+
+    def __init__(self, names):
+        if isinstance(names, dict):
+            size = max(names.keys()) + 1 if names else 0
+            self.names = [names.get(i, str(i)) for i in range(size)]
+        else:
+            self.names = list(names)
+
+        size = len(self.names)
+        self.ripeness = [None] * size
+        self.ripeness_letter = [None] * size
+        self.health_letter = [None] * size
+        self.health_range = [None] * size
+        # NaN marks "no range" so percentages come out as NaN and are mapped to 0
+        self.r_min = np.full(size, np.nan)
+        self.r_span = np.full(size, np.nan)
+        self.h_min = np.full(size, np.nan)
+        self.h_span = np.full(size, np.nan)
+
+        for idx, name in enumerate(self.names):
+            if name.lower() == 'rotten':
+                self.ripeness[idx] = 'Rotten'
+                continue
+
+            ripeness_letter, health_letter = parse_bunga_class(name)
+            if ripeness_letter is None:
+                continue
+
+            self.ripeness_letter[idx] = ripeness_letter
+            self.health_letter[idx] = health_letter
+            self.ripeness[idx] = 'Ripe' if ripeness_letter in RIPE_LETTERS else 'Unripe'
+            if ripeness_letter in RIPENESS_RANGES:
+                r_min, r_max = RIPENESS_RANGES[ripeness_letter]
+                self.r_min[idx] = r_min
+                self.r_span[idx] = r_max - r_min
+            if health_letter in HEALTH_RANGES:
+                h_min, h_max = HEALTH_RANGES[health_letter]
+                self.h_min[idx] = h_min
+                self.h_span[idx] = h_max - h_min
+                self.health_range[idx] = f"{h_min}-{h_max}%"
+
+
+_SCHEMAS = {}
+
+
+def get_schema(names):
+    """Return the (cached) ClassSchema for a model's `names` mapping."""
+    key = tuple(sorted(names.items())) if isinstance(names, dict) else tuple(names)
+    schema = _SCHEMAS.get(key)
+    if schema is None:
+        schema = ClassSchema(names)
+        _SCHEMAS[key] = schema
+    return schema
+
+
+class Detection:
+    """One detected box. Percentages are 0 when the class has no range."""
+    __slots__ = ('cls', 'class_name', 'confidence', 'bbox', 'center',
+                 'ripeness', 'ripeness_letter', 'health_class', 'health_range',
+                 'ripeness_percentage', 'health_percentage')
+
+    def __init__(self, cls, class_name, confidence, bbox, center, ripeness,
+                 ripeness_letter, health_class, health_range,
+                 ripeness_percentage, health_percentage):
+        self.cls = cls
+        self.class_name = class_name
+        self.confidence = confidence
+        self.bbox = bbox
+        self.center = center
+        self.ripeness = ripeness
+        self.ripeness_letter = ripeness_letter
+        self.health_class = health_class
+        self.health_range = health_range
+        self.ripeness_percentage = ripeness_percentage
+        self.health_percentage = health_percentage
+
+    def bunga_dict(self):
+        """Entry in the `bunga_detections` format of predict_bunga_with_objects.py."""
+        return {
+            "class": self.class_name,
+            "confidence": round(self.confidence, 4),
+            "bbox": self.bbox,
+            "center": self.center
+        }
+
+
+def extract_detections(result, schema=None, letterbox=None):
+    """
+    Convert an ultralytics result into a list of Detection records.
+    Order is preserved (ultralytics sorts boxes by confidence, best first).
+    If the model ran on a pre-letterboxed frame (image_io.letterbox), pass it as
+    `letterbox` so boxes are reported in original-image pixels.
+    """
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return []
+    if schema is None:
+        schema = get_schema(result.names)
+
+    # Single device->host transfer: columns are x1, y1, x2, y2, [track_id,] conf, cls
+    data = boxes.data.cpu().numpy()
+    boxes_xyxy = data[:, :4] if letterbox is None else letterbox.to_original(data[:, :4])
+    xyxy = boxes_xyxy.astype(np.int64)
+    conf = data[:, -2].astype(np.float64)
+    cls = data[:, -1].astype(np.int64)
+
+    centers = np.round((xyxy[:, :2] + xyxy[:, 2:]) / 2, 2)
+    ripeness_pct = np.nan_to_num(np.round(schema.r_min[cls] + conf * schema.r_span[cls], 1))
+    health_pct = np.nan_to_num(np.round(schema.h_min[cls] + conf * schema.h_span[cls], 1))
+
+    names = schema.names
+    ripeness = schema.ripeness
+    ripeness_letter = schema.ripeness_letter
+    health_letter = schema.health_letter
+    health_range = schema.health_range
+
+    return [
+        Detection(c, names[c], cf, bbox, center, ripeness[c], ripeness_letter[c],
+                  health_letter[c], health_range[c], rp, hp)
+        for c, cf, bbox, center, rp, hp in zip(
+            cls.tolist(), conf.tolist(), xyxy.tolist(), centers.tolist(),
+            ripeness_pct.tolist(), health_pct.tolist()
+        )
+    ]
+
+
+def best_detection(detections, prefer_disease=False):
+    """
+    Highest-confidence detection, or None.
+    With prefer_disease, any non-'healthy' class beats a 'healthy' one (leaf models).
+    """
+    if not detections:
+        return None
+    if prefer_disease:
+        diseased = [d for d in detections if d.class_name.lower() != 'healthy']
+        if diseased:
+            detections = diseased
+    return max(detections, key=lambda d: d.confidence)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Export the sklearn pepper disease model (pepper_detector_final.pkl + scaler.pkl)
+to a NumPy-only .npz that compiled_forest.py can run without scikit-learn.
+
+Usage:
+    python export_disease_model.py                    # export next to the .pkl
+    python export_disease_model.py --check            # export, then parity check + benchmark
+    python export_disease_model.py --check --images DIR
+
+The parity check scores the same feature matrix with the pickled model and
+the compiled one and fails if any predict_proba value differs by more than
+--tolerance. Features come from the images in --images when given, otherwise
+from random samples around the scaler's statistics.
+"""
+import os
+import sys
+import time
+import json
+import argparse
+import numpy as np
+from pathlib import Path
+import compiled_forest
+
+SUPPORTED_TREES = ('DecisionTreeClassifier', 'ExtraTreeClassifier')
+SUPPORTED_FORESTS = ('RandomForestClassifier', 'ExtraTreesClassifier')
+
+
+def flatten_trees(model):
+    """Concatenate every tree's node arrays into one table with self-looping leaves."""
+    name = type(model).__name__
+    if name in SUPPORTED_FORESTS:
+        estimators = model.estimators_
+        average = True
+    elif name in SUPPORTED_TREES:
+        estimators = [model]
+        average = False
+    else:
+        raise ValueError(f"Unsupported model type {name}; expected one of {SUPPORTED_FORESTS + SUPPORTED_TREES}")
+
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Multi-output models are not supported")
+
+    roots, lefts, rights, features, thresholds, values = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        node_ids = np.arange(n_nodes)
+        is_leaf = tree.children_left == -1
+
+        # Leaves point to themselves so extra iterations are no-ops
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+
+        # Per-tree normalization exactly as DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :model.n_classes_].astype(np.float64)
+        normalizer = value.sum(axis=1)
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(value / normalizer[:, np.newaxis])
+
+        roots.append(offset)
+        offset += n_nodes
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        'roots': np.asarray(roots, dtype=np.intp),
+        'left': np.concatenate(lefts).astype(np.intp),
+        'right': np.concatenate(rights).astype(np.intp),
+        'feature': np.concatenate(features).astype(np.intp),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'value': np.concatenate(values),
+        'max_depth': np.int64(max_depth),
+        # Object arrays would need pickle to load; class labels are plain strings or ints
+        'classes': np.asarray(model.classes_.tolist()),
+        'average': np.bool_(average)
+    }
+
+
+def scaler_casts(scaler, offset, scale):
+    """
+    Whether this sklearn version's StandardScaler casts its statistics to float32
+    input before subtracting and dividing. Probed on random rows, because the
+    behaviour changed between releases and the two differ in the last bit.
+    """
+    if offset is None and scale is None:
+        return False
+    rng = np.random.default_rng(0)
+    X = rng.normal(0, 10, size=(256, scaler.n_features_in_)).astype(np.float32)
+    expected = scaler.transform(X)
+    cast = compiled_forest.CompiledScaler('standard', offset, scale, cast=True).transform(X)
+    return bool(np.array_equal(expected, cast))
+
+
+def flatten_scaler(scaler):
+    name = type(scaler).__name__
+    if name == 'StandardScaler':
+        offset = getattr(scaler, 'mean_', None) if scaler.with_mean else None
+        scale = getattr(scaler, 'scale_', None) if scaler.with_std else None
+        kind, clip = 'standard', None
+        cast = scaler_casts(scaler, offset, scale)
+    elif name == 'MinMaxScaler':
+        offset, scale = scaler.min_, scaler.scale_
+        kind = 'minmax'
+        clip = scaler.feature_range if getattr(scaler, 'clip', False) else None
+        cast = False
+    else:
+        raise ValueError(f"Unsupported scaler type {name}; expected StandardScaler or MinMaxScaler")
+
+    return {
+        'scaler_kind': np.str_(kind),
+        'scaler_has_offset': np.bool_(offset is not None),
+        'scaler_offset': np.asarray(offset if offset is not None else [], dtype=np.float64),
+        'scaler_has_scale': np.bool_(scale is not None),
+        'scaler_scale': np.asarray(scale if scale is not None else [], dtype=np.float64),
+        'scaler_clip': np.asarray(clip if clip is not None else [], dtype=np.float64),
+        'scaler_cast': np.bool_(cast)
+    }
+
+
+def export_model(model, scaler, output_path):
+    """Write the compiled model to `output_path` (.npz)."""
+    arrays = {'format_version': np.int64(compiled_forest.FORMAT_VERSION)}
+    arrays.update(flatten_trees(model))
+    arrays.update(flatten_scaler(scaler))
+    np.savez(output_path, **arrays)
+    return output_path
+
+
+def sample_features(scaler, n_samples, seed=0):
+    """Random feature rows around the training distribution (for when no images are given)."""
+    rng = np.random.default_rng(seed)
+    n_features = scaler.n_features_in_
+    mean = getattr(scaler, 'mean_', None)
+    std = getattr(scaler, 'scale_', None) if type(scaler).__name__ == 'StandardScaler' else None
+    if mean is None:
+        mean = np.zeros(n_features)
+    if std is None:
+        std = np.ones(n_features)
+    X = rng.normal(mean, std * 1.5, size=(n_samples, n_features))
+    return np.clip(X, 0, None).astype(np.float32)
+
+
+def image_features(image_dir, limit):
+    import leaf_features
+    paths = [str(p) for p in sorted(Path(image_dir).rglob('*')) if p.suffix.lower() in ('.jpg', '.jpeg', '.png')][:limit]
+    X, ok = leaf_features.extract_features_batch(paths)
+    return X[ok]
+
+
+def check_parity(model, scaler, compiled_model, compiled_scaler, X, tolerance):
+    """Compare predict_proba of the pickled and compiled pipelines on X."""
+    expected = model.predict_proba(scaler.transform(X))
+    actual = compiled_model.predict_proba(compiled_scaler.transform(X))
+    max_diff = float(np.max(np.abs(expected - actual))) if len(X) else 0.0
+    argmax_match = bool(np.array_equal(expected.argmax(axis=1), actual.argmax(axis=1)))
+    return {
+        'samples': int(len(X)),
+        'max_abs_diff': max_diff,
+        'argmax_match': argmax_match,
+        'passed': max_diff <= tolerance and argmax_match
+    }
+
+
+def _time_per_call(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def benchmark(model, scaler, compiled_model, compiled_scaler, X, repeats=50):
+    """Per-sample (batch of 1) and full-batch latency in ms for both pipelines."""
+    one = X[:1]
+    return {
+        'batch_size': int(len(X)),
+        'sklearn_single_ms': round(_time_per_call(lambda: model.predict_proba(scaler.transform(one)), repeats), 4),
+        'compiled_single_ms': round(_time_per_call(lambda: compiled_model.predict_proba(compiled_scaler.transform(one)), repeats), 4),
+        'sklearn_batch_ms': round(_time_per_call(lambda: model.predict_proba(scaler.transform(X)), repeats), 4),
+        'compiled_batch_ms': round(_time_per_call(lambda: compiled_model.predict_proba(compiled_scaler.transform(X)), repeats), 4)
+    }
+
+
+def main():
+    # Imported here so the export functions load without predict_disease's cv2 dependency
+    from predict_disease import find_model_files
+    parser = argparse.ArgumentParser(description='Export the sklearn disease model to a NumPy-only predictor')
+    default_model, default_scaler, _ = find_model_files()
+    parser.add_argument('--model', default=str(default_model))
+    parser.add_argument('--scaler', default=str(default_scaler))
+    parser.add_argument('--output', default=None, help='Output .npz (default: next to the model)')
+    parser.add_argument('--check', action='store_true', help='Run the parity check and benchmark after exporting')
+    parser.add_argument('--images', default=None, help='Directory of images to build check features from')
+    parser.add_argument('--samples', type=int, default=512)
+    parser.add_argument('--tolerance', type=float, default=1e-9)
+    args = parser.parse_args()
+
+    import joblib
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+
+    output_path = args.output or str(Path(args.model).with_suffix('.npz'))
+    export_model(model, scaler, output_path)
+    print(f"✅ Exported {type(model).__name__} + {type(scaler).__name__} to {output_path} "
+          f"({os.path.getsize(output_path) / 1024:.0f} KB)", file=sys.stderr)
+
+    if not args.check:
+        return 0
+
+    compiled_model, compiled_scaler = compiled_forest.load_compiled(output_path)
+    X = image_features(args.images, args.samples) if args.images else sample_features(scaler, args.samples)
+
+    report = {
+        'parity': check_parity(model, scaler, compiled_model, compiled_scaler, X, args.tolerance),
+        'benchmark': benchmark(model, scaler, compiled_model, compiled_scaler, X)
+    }
+    print(json.dumps(report, indent=2))
+
+    if not report['parity']['passed']:
+        print(f"❌ Parity check failed: max diff {report['parity']['max_abs_diff']:.3g}", file=sys.stderr)
+        return 1
+    print(f"✅ Parity check passed on {report['parity']['samples']} samples", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
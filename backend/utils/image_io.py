@@ -0,0 +1,151 @@
+"""
+Shared image decoding and letterboxing for the predictor scripts.
+
+Phone photos are 12-48 MP, but every model looks at them at 100-1024 px.
+read_image_reduced() reads the JPEG header first and lets the decoder do the
+downscaling in the DCT domain (1/2, 1/4 or 1/8 - cv2.IMREAD_REDUCED_* or PIL
+draft), picking the smallest decode that still covers the model input.
+Other formats fall back to a full decode.
+
+Decode an image once, then letterbox it once per model input size.
+letterbox() reproduces ultralytics' rectangular inference letterbox
+(LetterBox(auto=True) for a single image): the long side goes to `size`
+and the short side is padded only up to the next multiple of the model
+stride. The result can go straight to `model.predict(..., imgsz=size)`:
+ultralytics sees a frame its own LetterBox leaves unchanged, so the model
+input is the same tensor it would have built from the full image (up to
+the resize interpolation of a reduced decode).
+Boxes predicted on a letterboxed frame are mapped back to original-image
+pixels with Letterboxed.to_original (or by passing the frame to
+detection_postprocess.extract_detections).
+"""
+import cv2
+import numpy as np
+from PIL import Image
+
+LETTERBOX_COLOR = (114, 114, 114)
+# Largest stride of the YOLOv8 detection heads
+MODEL_STRIDE = 32
+JPEG_FORMATS = ('JPEG', 'MPO')
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+
+def read_image(image_path):
+    """Decode an image file to a BGR array, or None if it cannot be read."""
+    return cv2.imread(image_path)
+
+
+def image_header(image_path):
+    """Return (width, height, format) from the file header without decoding pixels."""
+    try:
+        with Image.open(image_path) as image:
+            return image.width, image.height, image.format
+    except Exception:
+        return None
+
+
+def decode_factor(width, height, max_side=None, min_side=None):
+    """
+    Largest DCT scale factor (1, 2, 4 or 8) that keeps the decoded image at least
+    `max_side` on its long side and `min_side` on its short side.
+    YOLO letterboxing needs the long side, Resize(256)/CenterCrop needs the short side.
+    """
+    for factor in (8, 4, 2):
+        if max_side and max(width, height) / factor < max_side:
+            continue
+        if min_side and min(width, height) / factor < min_side:
+            continue
+        return factor
+    return 1
+
+
+def read_image_reduced(image_path, max_side=None, min_side=None):
+    """
+    Decode an image at reduced resolution when it is a JPEG larger than needed.
+    Returns (img, (orig_width, orig_height)); img is a BGR array or None.
+    Coordinates measured on img scale back to the original by orig_width / img width.
+    """
+    header = image_header(image_path)
+    if header is None:
+        img = cv2.imread(image_path)
+        if img is None:
+            return None, (0, 0)
+        return img, (img.shape[1], img.shape[0])
+
+    width, height, image_format = header
+    factor = decode_factor(width, height, max_side, min_side) if image_format in JPEG_FORMATS else 1
+    img = cv2.imread(image_path, _REDUCED_FLAGS[factor]) if factor > 1 else cv2.imread(image_path)
+    if img is None:
+        return None, (0, 0)
+
+    # cv2 applies the EXIF orientation; the header size is before rotation
+    if (img.shape[1] > img.shape[0]) != (width > height) and width != height:
+        width, height = height, width
+    return img, (width, height)
+
+
+def open_pil_reduced(image_path, max_side=None, min_side=None):
+    """PIL counterpart of read_image_reduced: an RGB image, JPEG-drafted to the smallest usable size."""
+    image = Image.open(image_path)
+    if image.format in JPEG_FORMATS:
+        factor = decode_factor(image.width, image.height, max_side, min_side)
+        if factor > 1:
+            image.draft('RGB', (image.width // factor, image.height // factor))
+    return image.convert('RGB')
+
+
+class Letterboxed:
+    """A frame resized with unchanged aspect ratio to `size` on its long side, padded to stride multiples."""
+    __slots__ = ('image', 'size', 'ratio', 'pad', 'orig_shape')
+    # ratio and orig_shape refer to the original image, even when `img` was decoded reduced
+
+    def __init__(self, image, size, ratio, pad, orig_shape):
+        self.image = image
+        self.size = size
+        self.ratio = ratio
+        self.pad = pad
+        self.orig_shape = orig_shape
+
+    def to_original(self, xyxy):
+        """Map an (N, 4) array of x1, y1, x2, y2 boxes back to original-image pixels."""
+        pad_x, pad_y = self.pad
+        boxes = (np.asarray(xyxy, dtype=np.float64) - (pad_x, pad_y, pad_x, pad_y)) / self.ratio
+        height, width = self.orig_shape
+        np.clip(boxes[:, 0::2], 0, width, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, height, out=boxes[:, 1::2])
+        return boxes
+
+
+def letterbox(img, size, color=LETTERBOX_COLOR, orig_size=None, stride=MODEL_STRIDE):
+    """
+    Resize `img` to fit in a size x size square, then pad each side only up to
+    the next multiple of `stride`, as ultralytics' LetterBox(auto=True) does
+    for single-image predict. Rounding and padding split match LetterBox, so
+    ultralytics passes the frame through untouched.
+    orig_size: (width, height) of the full image when `img` came from read_image_reduced.
+    """
+    height, width = img.shape[:2]
+    orig_width, orig_height = orig_size or (width, height)
+    ratio = min(size / height, size / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+
+    if (new_width, new_height) != (width, height):
+        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    dw = np.mod(size - new_width, stride) / 2
+    dh = np.mod(size - new_height, stride) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    if top or bottom or left or right:
+        img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+
+    return Letterboxed(img, size, ratio * width / orig_width, (left, top), (orig_height, orig_width))
+
+
+def letterbox_sizes(img, sizes, orig_size=None):
+    """Letterbox `img` once for every distinct size. Returns {size: Letterboxed}."""
+    return {size: letterbox(img, size, orig_size=orig_size) for size in dict.fromkeys(sizes)}
@@ -0,0 +1,217 @@
+"""
+Concurrent inference with per-model replica pools.
+
+An ultralytics model object is not safe to call from several threads at
+once: its predictor keeps per-call state. InferenceExecutor gives each
+model a ReplicaPool of up to `replicas` independent copies. A request
+borrows one replica, runs on the executor's thread pool, and returns it.
+Replicas are loaded lazily, one at a time per model, under that pool's
+load lock. The pool only grows when every replica is busy.
+
+The forward pass runs in torch kernels that release the GIL, so
+replicas on different threads use different cores. Intra-op threads per
+replica are capped at cores // workers to avoid oversubscription.
+
+With exclusive=True (the inference server's memory-saving default), loading
+one model first closes the pools of the others, except those named in
+`keep`. Replicas still in use finish their request and are then dropped.
+When the weights are converted to safetensors (convert_weights.py),
+replicas memory-map the same file and share its pages.
+"""
+import os
+import sys
+import gc
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolClosed(Exception):
+    """The pool was unloaded while waiting; borrow again to get a fresh one."""
+
+
+class ReplicaPool:
+    """Up to `size` replicas of one model, handed out to one caller at a time."""
+
+    def __init__(self, name, load_replica, size):
+        self.name = name
+        self.size = max(1, int(size))
+        self._load_replica = load_replica
+        self._cond = threading.Condition()
+        self._load_lock = threading.Lock()
+        self._idle = []
+        self._created = 0
+        self.in_use = 0
+        self.closed = False
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolClosed(self.name)
+                if self._idle:
+                    self.in_use += 1
+                    return self._idle.pop()
+                if self._created < self.size:
+                    # Reserve a slot and load outside the condition so releases are not blocked
+                    self._created += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No '{self.name}' replica free after {timeout}s")
+                self._cond.wait(remaining)
+
+        try:
+            with self._load_lock:
+                replica = self._load_replica()
+        except BaseException:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            if self.closed:
+                raise PoolClosed(self.name)
+            self.in_use += 1
+        return replica
+
+    def release(self, replica):
+        with self._cond:
+            self.in_use -= 1
+            if self.closed:
+                return
+            self._idle.append(replica)
+            self._cond.notify()
+
+    def close(self):
+        """Drop idle replicas now; busy ones are dropped when released."""
+        with self._cond:
+            self.closed = True
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def status(self):
+        with self._cond:
+            return {"replicas": self._created, "in_use": self.in_use, "max_replicas": self.size}
+
+
+class InferenceExecutor:
+    """
+    Runs inference callables against borrowed model replicas.
+
+    model_paths: {name: weights path}
+    load_model:  path -> model (called once per replica)
+    on_load:     optional (name, path, model) -> None, e.g. warm-up / precision choice
+    """
+
+    def __init__(self, model_paths, load_model, replicas=None, workers=None,
+                 exclusive=True, on_load=None, timeout=None):
+        self.model_paths = dict(model_paths)
+        self.replicas = max(1, int(replicas or os.environ.get('INFERENCE_REPLICAS', 2)))
+        self.workers = max(1, int(workers or os.environ.get('INFERENCE_WORKERS', 0) or self.replicas * len(self.model_paths)))
+        self.exclusive = exclusive
+        self.timeout = timeout if timeout is not None else float(os.environ.get('INFERENCE_TIMEOUT', 60))
+        self._load_model = load_model
+        self._on_load = on_load
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+        self._threads_configured = False
+
+    def _configure_threads(self):
+        """Split the cores between concurrently running replicas (once, after torch is loaded)."""
+        if self._threads_configured:
+            return
+        self._threads_configured = True
+        try:
+            import torch
+        except ImportError:
+            return
+        threads = int(os.environ.get('INFERENCE_INTRAOP_THREADS', 0)) or max(1, (os.cpu_count() or 1) // self.workers)
+        torch.set_num_threads(threads)
+        print(f"🧵 {self.workers} inference worker(s) x {threads} intra-op thread(s)", file=sys.stderr)
+
+    def _load_replica(self, name):
+        path = self.model_paths[name]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found: {path}")
+        start = time.perf_counter()
+        model = self._load_model(path)
+        self._configure_threads()
+        if self._on_load is not None:
+            self._on_load(name, path, model)
+        print(f"📥 Loaded '{name}' replica in {(time.perf_counter() - start) * 1000:.0f}ms", file=sys.stderr)
+        return model
+
+    def _pool(self, name, keep=()):
+        if name not in self.model_paths:
+            raise KeyError(f"Unknown model '{name}'")
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is not None and not pool.closed:
+                return pool
+            if self.exclusive:
+                unloaded = False
+                for other in list(self._pools):
+                    if other != name and other not in keep:
+                        print(f"🗑️ Unloading '{other}' model...", file=sys.stderr)
+                        self._pools.pop(other).close()
+                        unloaded = True
+                if unloaded:
+                    gc.collect()
+            pool = ReplicaPool(name, lambda: self._load_replica(name), self.replicas)
+            self._pools[name] = pool
+            return pool
+
+    @contextmanager
+    def borrow(self, name, keep=(), timeout=None):
+        """Hold one replica of `name` for the duration of the block."""
+        timeout = self.timeout if timeout is None else timeout
+        while True:
+            pool = self._pool(name, keep)
+            try:
+                replica = pool.acquire(timeout)
+                break
+            except PoolClosed:
+                continue  # unloaded while we waited: get the new pool
+        try:
+            yield replica
+        finally:
+            pool.release(replica)
+
+    def _call(self, name, fn, args, kwargs, keep):
+        with self.borrow(name, keep) as model:
+            return fn(model, *args, **kwargs)
+
+    def submit(self, name, fn, *args, keep=(), **kwargs):
+        """Run fn(model_replica, *args, **kwargs) on the worker pool. Returns a Future."""
+        return self._executor.submit(self._call, name, fn, args, kwargs, keep)
+
+    def run(self, name, fn, *args, keep=(), **kwargs):
+        """submit() and wait for the result (raises the callable's exception)."""
+        return self.submit(name, fn, *args, keep=keep, **kwargs).result(timeout=self.timeout)
+
+    def loaded(self, name):
+        with self._lock:
+            pool = self._pools.get(name)
+            return pool is not None and not pool.closed and pool.status()["replicas"] > 0
+
+    def status(self):
+        with self._lock:
+            pools = dict(self._pools)
+        return {
+            "workers": self.workers,
+            "replicas_per_model": self.replicas,
+            "exclusive": self.exclusive,
+            "models": {name: pool.status() for name, pool in pools.items()}
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
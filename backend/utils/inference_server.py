@@ -4,10 +4,14 @@ import cv2
 import numpy as np
 import json
 from flask import Flask, request, jsonify
-from ultralytics import YOLO
+from model_cache import open_yolo
+from detection_postprocess import get_schema, extract_detections, best_detection
+from predict_whole_plant import run_detector, run_plant_detectors
+from inference_executor import InferenceExecutor
+import precision_policy
 import time
+import threading
 from pathlib import Path
-import gc
 
 # Initialize Flask App
 app = Flask(__name__)
@@ -18,49 +22,32 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LEAF_MODEL_PATH = os.path.join(BASE_DIR, '../ml_models/leaf/train/weights/best.pt')
 BUNGA_MODEL_PATH = os.path.join(BASE_DIR, '../ml_models/bunga/train/weights/best.pt')
 
-# --- GLOBAL MODEL STORAGE (LAZY LOADING) ---
-models = {
-    'leaf': None,
-    'bunga': None
-}
-
-def get_model(model_name):
-    """
-    Lazy loads the requested model and unloads others to save memory.
-    """
-    global models
-    
-    # 1. Check if requested model is already loaded
-    if models.get(model_name) is not None:
-        return models[model_name]
-
-    print(f"🔄 [SERVER] Switching to '{model_name}' model. Unloading others...")
-
-    # 2. Unload ALL other models to free memory
-    for name in list(models.keys()):
-        if name != model_name and models[name] is not None:
-            print(f"🗑️ [SERVER] Unloading '{name}' model...")
-            del models[name]
-            models[name] = None
-    
-    # Force garbage collection
-    gc.collect()
-
-    # 3. Load the requested model
-    model_path = LEAF_MODEL_PATH if model_name == 'leaf' else BUNGA_MODEL_PATH
-    
-    if not os.path.exists(model_path):
-        print(f"❌ [SERVER] Model file not found: {model_path}")
-        return None
-
-    try:
-        print(f"📥 [SERVER] Loading '{model_name}' model from disk...")
-        models[model_name] = YOLO(model_path)
-        print(f"✅ [SERVER] '{model_name}' Model Loaded Successfully!")
-        return models[model_name]
-    except Exception as e:
-        print(f"❌ [SERVER] Failed to load '{model_name}' model: {e}")
-        return None
+# --- MODEL REPLICAS (LAZY LOADING) ---
+# Each model gets a pool of INFERENCE_REPLICAS copies so concurrent requests never share
+# one ultralytics predictor. INFERENCE_EXCLUSIVE_MODELS=1 (default) keeps the old
+# memory-saving behaviour: loading one model unloads the other.
+EXCLUSIVE_MODELS = os.environ.get('INFERENCE_EXCLUSIVE_MODELS', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+# Precision chosen per model when it is first loaded (benchmarked once per hardware, then cached)
+precisions = {}
+_precision_lock = threading.Lock()
+
+def _on_model_loaded(model_name, model_path, model):
+    """Pick the precision once per model; every replica then gets the same warm-up."""
+    with _precision_lock:
+        if model_name not in precisions:
+            precisions[model_name] = precision_policy.policy_for(
+                model_name, model, model_path, imgsz=640, benchmark_missing=True, device='cpu'
+            )
+    # Warm up here, under the pool's load lock, so predictor setup never races with requests
+    precisions[model_name].predict(model, np.zeros((640, 640, 3), dtype=np.uint8), imgsz=640, device='cpu', verbose=False)
+
+executor = InferenceExecutor(
+    {'leaf': LEAF_MODEL_PATH, 'bunga': BUNGA_MODEL_PATH},
+    open_yolo,
+    exclusive=EXCLUSIVE_MODELS,
+    on_load=_on_model_loaded
+)
 
 # NOTE: Removed load_models() call at startup to save memory!
 
@@ -69,21 +56,19 @@ def health_check():
     return jsonify({
         "status": "running",
         "models_loaded": {
-            "leaf": models['leaf'] is not None,
-            "bunga": models['bunga'] is not None
+            "leaf": executor.loaded('leaf'),
+            "bunga": executor.loaded('bunga')
         },
-        "memory_optimization": "lazy_loading_enabled"
+        "memory_optimization": "lazy_loading_enabled",
+        "executor": executor.status(),
+        "precision": precision_policy.summary()
     })
 
-@app.route('/predict/leaf', methods=['POST'])
-def predict_leaf():
+def read_request_image():
     """
-    Endpoint for Leaf Disease Prediction
-    Expects: 
-    - Multipart file 'image' OR
-    - JSON body { "file_path": "/path/to/image.jpg" }
+    Decode the request image from a JSON { "file_path": ... } body or a multipart 'image' upload.
+    Returns (img, None) on success or (None, error_response).
     """
-    start_time = time.time()
     img = None
     
     # Check if JSON with file_path is provided
@@ -93,83 +78,85 @@ def predict_leaf():
             try:
                 img = cv2.imread(data['file_path'])
                 if img is None:
-                    return jsonify({"success": False, "error": "Failed to read file from path"}), 400
+                    return None, (jsonify({"success": False, "error": "Failed to read file from path"}), 400)
             except Exception as e:
-                return jsonify({"success": False, "error": f"Error reading file: {str(e)}"}), 400
+                return None, (jsonify({"success": False, "error": f"Error reading file: {str(e)}"}), 400)
     
     # Fallback to file upload
     if img is None:
         if 'image' not in request.files:
-            return jsonify({"success": False, "error": "No image provided (file upload or file_path)"}), 400
+            return None, (jsonify({"success": False, "error": "No image provided (file upload or file_path)"}), 400)
         
         file = request.files['image']
         if file.filename == '':
-            return jsonify({"success": False, "error": "No image selected"}), 400
+            return None, (jsonify({"success": False, "error": "No image selected"}), 400)
 
         try:
             # Read Image directly from memory
             file_bytes = np.frombuffer(file.read(), np.uint8)
             img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
         except Exception as e:
-             return jsonify({"success": False, "error": f"Error decoding image: {str(e)}"}), 400
+             return None, (jsonify({"success": False, "error": f"Error decoding image: {str(e)}"}), 400)
             
     if img is None:
-        return jsonify({"success": False, "error": "Invalid image format"}), 400
+        return None, (jsonify({"success": False, "error": "Invalid image format"}), 400)
+    return img, None
+
+def _detect_leaf(model, img):
+    """Leaf inference on one borrowed replica (runs on an executor worker thread)."""
+    # conf=0.10: Low threshold to catch diseases
+    results = precisions['leaf'].predict(
+        model,
+        img,
+        conf=0.10,
+        imgsz=640,
+        device='cpu',
+        verbose=False,
+        max_det=10
+    )
+    return extract_detections(results[0], get_schema(model.names))
+
+def _detect_plant_part(model, name, frame, conf):
+    """One whole-plant detector on a borrowed replica, with the same device and precision as /predict/leaf."""
+    return run_detector(model, frame, conf, precisions[name], device='cpu')
+
+@app.route('/predict/leaf', methods=['POST'])
+def predict_leaf():
+    """
+    Endpoint for Leaf Disease Prediction
+    Expects: 
+    - Multipart file 'image' OR
+    - JSON body { "file_path": "/path/to/image.jpg" }
+    """
+    start_time = time.time()
+    img, error_response = read_request_image()
+    if error_response is not None:
+        return error_response
             
     img_height, img_width = img.shape[:2]
     
     try:
-        # 2. Get Model (Lazy Load)
-        model = get_model('leaf')
-        if model is None:
+        # 2-3. Run Inference on a free leaf replica (lazy loaded) in the worker pool
+        try:
+            detections = executor.run('leaf', _detect_leaf, img)
+        except FileNotFoundError as e:
+            print(f"❌ [SERVER] {e}")
             return jsonify({"success": False, "error": "Failed to load leaf model"}), 500
 
-        # 3. Run Inference (Fast!)
-        # conf=0.10: Low threshold to catch diseases
-        results = model.predict(
-            img,
-            conf=0.10,
-            imgsz=640,
-            device='cpu',
-            half=False,
-            verbose=False,
-            max_det=10
-        )
-        
         # 4. Process Results
-        detection = results[0]
-        
-        disease_candidates = []
-        healthy_candidates = []
-        all_detections = []
+        all_detections = [
+            {
+                "class": det.class_name,
+                "confidence": round(det.confidence * 100, 2),
+                "bbox": det.bbox
+            }
+            for det in detections
+        ]
         
-        if detection.boxes is not None and len(detection.boxes) > 0:
-            for box in detection.boxes:
-                conf = float(box.conf[0])
-                cls_idx = int(box.cls[0])
-                name = detection.names[cls_idx]
-                
-                all_detections.append({
-                    "class": name,
-                    "confidence": round(conf * 100, 2),
-                    "bbox": [int(x) for x in box.xyxy[0].tolist()]
-                })
-                
-                if name.lower() == "healthy":
-                    healthy_candidates.append((name, conf))
-                else:
-                    disease_candidates.append((name, conf))
-            
-            # Decision Logic (Prioritize Disease)
-            if len(disease_candidates) > 0:
-                disease_candidates.sort(key=lambda x: x[1], reverse=True)
-                best_class, best_conf = disease_candidates[0]
-            elif len(healthy_candidates) > 0:
-                healthy_candidates.sort(key=lambda x: x[1], reverse=True)
-                best_class, best_conf = healthy_candidates[0]
-            else:
-                best_class = "Healthy"
-                best_conf = 0.95
+        # Decision Logic (Prioritize Disease)
+        best = best_detection(detections, prefer_disease=True)
+        if best is not None:
+            best_class, best_conf = best.class_name, best.confidence
         else:
             best_class = "Healthy"
             best_conf = 0.95
@@ -191,7 +178,46 @@ def predict_leaf():
         print(f"❌ [SERVER] Error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/predict/plant', methods=['POST'])
+def predict_plant():
+    """
+    Whole-plant analysis: leaf disease and bunga ripeness from one photo.
+    The image is decoded once and both detectors run concurrently.
+    Expects the same inputs as /predict/leaf.
+    """
+    start_time = time.time()
+    img, error_response = read_request_image()
+    if error_response is not None:
+        return error_response
+
+    available = {name: os.path.exists(path) for name, path in executor.model_paths.items()}
+    if not available['leaf'] and not available['bunga']:
+        print("❌ [SERVER] Neither the leaf nor the bunga model file exists")
+        return jsonify({"success": False, "error": "Failed to load leaf and bunga models"}), 500
+
+    def submit(name, frame, conf):
+        # Both detectors run on the executor's workers, each on its own borrowed replica;
+        # keep= stops exclusive mode from unloading the other model mid-request
+        if not available[name]:
+            return None
+        other = 'bunga' if name == 'leaf' else 'leaf'
+        return executor.submit(name, _detect_plant_part, name, frame, conf, keep=(other,))
+
+    try:
+        # Letterbox at the size the replicas were warmed up and precision-benchmarked at
+        result = run_plant_detectors(img, submit, imgsz={'leaf': 640, 'bunga': 640})
+        process_time = (time.time() - start_time) * 1000 # ms
+        result["server_processing_time_ms"] = int(process_time)
+
+        print(f"⚡ [SERVER] Plant Request: leaf={result['leaf'].get('disease')} bunga={result['bunga'].get('ripeness')} - took {int(process_time)}ms")
+        return jsonify(result)
+
+    except Exception as e:
+        print(f"❌ [SERVER] Error: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 if __name__ == "__main__":
     print("🚀 Starting Python Inference Server on port 5000 (Lazy Loading Enabled)...")
     print("⚠️  Ensure you have 'flask' installed: pip install flask")
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    # threaded=True: request threads hand inference to the executor's replica pools
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
@@ -0,0 +1,65 @@
+"""
+Per-process cache of loaded YOLO models.
+
+ultralytics (and with it torch) is imported on the first load, not when a
+predictor script starts, so early exits and non-YOLO paths skip that cost.
+A model file is loaded once per process and shared by later calls.
+
+If convert_weights.py has written a .safetensors copy of the weights, it is
+memory-mapped instead of unpickling the .pt (see weight_store).
+"""
+import os
+import json
+import threading
+from pathlib import Path
+import startup_profiler
+import weight_store
+
+_MODELS = {}
+_LOAD_LOCKS = {}
+_lock = threading.Lock()
+
+
+def _open_converted(converted):
+    """Rebuild a YOLO model from its architecture file and mapped safetensors weights."""
+    from ultralytics import YOLO
+    state_dict, metadata = weight_store.load_file(converted)
+    arch_path = Path(converted).with_suffix(weight_store.ARCH_SUFFIX)
+
+    model = YOLO(str(arch_path), task=metadata.get('task'))
+    if metadata.get('fused') == '1':
+        # Converted weights are already Conv+BN fused: match the module layout first
+        model.model.fuse(verbose=False)
+    weight_store.assign_state_dict(model.model, state_dict)
+    model.model.names = {int(k): v for k, v in json.loads(metadata['names']).items()}
+    model.model.eval()
+    return model
+
+
+def open_yolo(model_path):
+    """Load a YOLO model without caching (servers that manage their own models use this)."""
+    converted = weight_store.resolve(model_path)
+    if converted is not None:
+        return _open_converted(converted)
+    from ultralytics import YOLO
+    return YOLO(str(model_path))
+
+
+def load_yolo(model_path):
+    """Return the YOLO model for `model_path`, loading it on first use."""
+    key = os.path.abspath(str(model_path))
+    model = _MODELS.get(key)
+    if model is not None:
+        return model
+
+    # One lock per file: different models can still load in parallel
+    with _lock:
+        load_lock = _LOAD_LOCKS.setdefault(key, threading.Lock())
+
+    with load_lock:
+        model = _MODELS.get(key)
+        if model is None:
+            with startup_profiler.step(f"load {os.path.basename(key)}"):
+                model = open_yolo(model_path)
+            _MODELS[key] = model
+    return model
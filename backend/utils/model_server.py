@@ -8,14 +8,20 @@ import json
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from model_cache import open_yolo
+from detection_postprocess import get_schema, extract_detections, best_detection
+from image_io import read_image_reduced, letterbox
 from typing import Dict, Any
+import response_encoder
+import precision_policy
 
 # Global model instances (loaded once, reused for every prediction)
 _models = {
     'bunga': None,
     'disease': None
 }
+# Inference precision per loaded model (see precision_policy)
+_precisions = {}
 
 def load_models():
     """Load all models into memory once"""
@@ -27,12 +33,18 @@ def load_models():
         
         print('🚀 Loading BUNGA model...', file=sys.stderr)
         if os.path.exists(bunga_model_path):
-            _models['bunga'] = YOLO(bunga_model_path)
+            _models['bunga'] = open_yolo(bunga_model_path)
+            _precisions['bunga'] = precision_policy.policy_for(
+                'bunga', _models['bunga'], bunga_model_path, imgsz=640, benchmark_missing=True
+            )
             print('✅ BUNGA model loaded', file=sys.stderr)
         
         print('🚀 Loading DISEASE model...', file=sys.stderr)
         if os.path.exists(disease_model_path):
-            _models['disease'] = YOLO(disease_model_path)
+            _models['disease'] = open_yolo(disease_model_path)
+            _precisions['disease'] = precision_policy.policy_for(
+                'disease', _models['disease'], disease_model_path, imgsz=640, benchmark_missing=True
+            )
             print('✅ DISEASE model loaded', file=sys.stderr)
     except Exception as e:
         print(f'❌ Error loading models: {e}', file=sys.stderr)
@@ -44,52 +56,33 @@ def predict_bunga(image_path: str, model_path: str) -> Dict[str, Any]:
     global _models
     
     try:
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 640px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=640)
         if img is None:
             return {"success": False, "error": "Image read failed", "ripeness": None, "confidence": 0}
         
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         
         # Use cached model or load if needed
         if _models['bunga'] is None:
             bunga_model_path = r'C:\Users\admin\Documents\6.1 Reporting\pipersmart\ml_models\ripebunga2\bunga_ripeness_v1\weights\best.pt'
-            _models['bunga'] = YOLO(bunga_model_path)
+            _models['bunga'] = open_yolo(bunga_model_path)
+            _precisions['bunga'] = precision_policy.policy_for('bunga', _models['bunga'], bunga_model_path, imgsz=640)
         
         # Fast prediction with cached model
-        results = _models['bunga'].predict(image_path, conf=0.25, verbose=False, half=True)
+        frame = letterbox(img, 640, orig_size=orig_size)
+        results = _precisions['bunga'].predict(_models['bunga'], frame.image, conf=0.25, verbose=False, imgsz=frame.size)
         result = results[0]
         
         best_ripeness = None
         best_confidence = 0
-        bunga_detections = []
         
-        if result.boxes is not None and len(result.boxes) > 0:
-            for detection in result.boxes:
-                conf = float(detection.conf[0])
-                cls = int(detection.cls[0])
-                class_name = result.names[cls]
-                
-                try:
-                    bbox_tensor = detection.xyxy[0]
-                    px1, py1, px2, py2 = int(bbox_tensor[0]), int(bbox_tensor[1]), int(bbox_tensor[2]), int(bbox_tensor[3])
-                except:
-                    norm_coords = detection.xyxyn[0]
-                    x1, y1, x2, y2 = float(norm_coords[0]), float(norm_coords[1]), float(norm_coords[2]), float(norm_coords[3])
-                    px1, py1, px2, py2 = int(x1 * img_width), int(y1 * img_height), int(x2 * img_width), int(y2 * img_height)
-                
-                center_x = (px1 + px2) / 2
-                center_y = (py1 + py2) / 2
-                
-                bunga_detections.append({
-                    "class": class_name,
-                    "confidence": round(conf, 4),
-                    "bbox": [px1, py1, px2, py2],
-                    "center": [center_x, center_y]
-                })
-                
-                if conf > best_confidence:
-                    best_confidence = conf
-                    best_ripeness = class_name
+        detections = extract_detections(result, get_schema(_models['bunga'].names), letterbox=frame)
+        bunga_detections = [det.bunga_dict() for det in detections]
+        best = best_detection(detections)
+        if best is not None:
+            best_confidence = best.confidence
+            best_ripeness = best.class_name
         
         return {
             "success": True,
@@ -113,6 +106,8 @@ def predict_bunga(image_path: str, model_path: str) -> Dict[str, Any]:
         }
 
 if __name__ == '__main__':
+    response_encoder.claim_stdout()
+    
     # Load models once at startup
     load_models()
     print('✅ Model server initialized', file=sys.stderr)
@@ -125,4 +120,4 @@ if __name__ == '__main__':
         if model_type == 'bunga':
             model_path = sys.argv[3] if len(sys.argv) > 3 else None
             result = predict_bunga(image_path, model_path)
-            print(json.dumps(result))
+            response_encoder.emit(result)
@@ -1,10 +1,19 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from model_cache import load_yolo
+from detection_postprocess import get_schema, extract_detections
+import response_encoder
 
 # Suppress TensorFlow logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -112,7 +121,7 @@ def predict_bunga_ripeness(image_path):
             }
         
         # Load YOLO model
-        model = YOLO(str(yolo_model_path))
+        model = load_yolo(str(yolo_model_path))
         
         # STEP 3: Run YOLOv8 inference
         results = model.predict(image_path, conf=0.25, verbose=False)
@@ -132,15 +141,9 @@ def predict_bunga_ripeness(image_path):
             }
         
         # STEP 4: Analyze detections for ripeness classification
-        confidences = []
-        class_predictions = []
-        
-        for detection in detections:
-            conf = float(detection.conf[0])
-            cls = int(detection.cls[0])
-            class_name = result.names[cls]
-            confidences.append(conf)
-            class_predictions.append(class_name)
+        records = extract_detections(result, get_schema(model.names))
+        confidences = [det.confidence for det in records]
+        class_predictions = [det.class_name for det in records]
         
         avg_detection_conf = np.mean(confidences)
         
@@ -194,10 +197,13 @@ def predict_bunga_ripeness(image_path):
 
 
 if __name__ == '__main__':
+    response_encoder.claim_stdout()
+    
     if len(sys.argv) != 2:
-        print(json.dumps({'error': 'Usage: python predict_bunga_ripeness.py <image_path>'}))
+        response_encoder.emit({'error': 'Usage: python predict_bunga_ripeness.py <image_path>'})
         sys.exit(1)
     
     image_path = sys.argv[1]
     result = predict_bunga_ripeness(image_path)
-    print(json.dumps(result))
+    startup_profiler.report(result)
+    response_encoder.emit(result)
@@ -1,10 +1,19 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from model_cache import load_yolo
+from detection_postprocess import get_schema, extract_detections
+import response_encoder
 
 # Suppress TensorFlow logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -74,7 +83,7 @@ def run_single_model_inference(model_path, image_path):
         if not model_path.exists():
             return None, 0, 0
         
-        model = YOLO(str(model_path))
+        model = load_yolo(str(model_path))
         results = model.predict(image_path, conf=0.25, verbose=False)
         result = results[0]
         
@@ -84,22 +93,13 @@ def run_single_model_inference(model_path, image_path):
         if detection_count == 0:
             return None, 0, 0
         
-        confidences = []
-        ripe_count = 0
-        unripe_count = 0
+        records = extract_detections(result, get_schema(model.names))
+        confidences = [det.confidence for det in records]
         
-        for detection in detections:
-            conf = float(detection.conf[0])
-            cls = int(detection.cls[0])
-            class_name = result.names[cls]
-            confidences.append(conf)
-            
-            # Classify based on class name
-            # 'Ripe' or 'RIPE' = ripe, anything else = unripe
-            if class_name.upper() == 'RIPE':
-                ripe_count += 1
-            else:
-                unripe_count += 1
+        # Classify based on class name
+        # 'Ripe' or 'RIPE' = ripe, anything else = unripe
+        ripe_count = sum(1 for det in records if det.class_name.upper() == 'RIPE')
+        unripe_count = len(records) - ripe_count
         
         avg_confidence = np.mean(confidences)
         
@@ -239,10 +239,13 @@ def predict_bunga_ripeness_ensemble(image_path):
 
 
 if __name__ == '__main__':
+    response_encoder.claim_stdout()
+    
     if len(sys.argv) != 2:
-        print(json.dumps({'error': 'Usage: python predict_bunga_ripeness_ensemble.py <image_path>'}))
+        response_encoder.emit({'error': 'Usage: python predict_bunga_ripeness_ensemble.py <image_path>'})
         sys.exit(1)
     
     image_path = sys.argv[1]
     result = predict_bunga_ripeness_ensemble(image_path)
-    print(json.dumps(result))
+    startup_profiler.report(result)
+    response_encoder.emit(result)
@@ -0,0 +1,220 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
+import os
+import json
+import sys
+import time
+import cv2
+from model_cache import load_yolo
+from detection_postprocess import get_schema, extract_detections
+import response_encoder
+
+# Suppress warnings
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+# Stage 1 only has to localize bunches, so a small input size is enough
+DETECTOR_IMGSZ = int(os.environ.get('BUNGA_DETECTOR_IMGSZ', 512))
+DETECTOR_CONF = float(os.environ.get('BUNGA_DETECTOR_CONF', 0.10))
+# Stage 2 sees one bunch per crop, cut from the full-resolution image; the
+# classifier's preprocessing resizes every crop to CLASSIFIER_IMGSZ
+CLASSIFIER_IMGSZ = int(os.environ.get('BUNGA_CLASSIFIER_IMGSZ', 224))
+# Extra context kept around each box before cropping (fraction of box size)
+CROP_MARGIN = 0.10
+MAX_CROPS = 32
+
+
+def crop_regions(img, boxes, margin=CROP_MARGIN):
+    """
+    Cut each detected box out of the full-resolution image.
+    Boxes are widened by `margin` on every side and clipped to the image.
+    """
+    img_height, img_width = img.shape[:2]
+    crops = []
+    for x1, y1, x2, y2 in boxes:
+        pad_x = (x2 - x1) * margin
+        pad_y = (y2 - y1) * margin
+        cx1 = max(0, int(x1 - pad_x))
+        cy1 = max(0, int(y1 - pad_y))
+        cx2 = min(img_width, int(x2 + pad_x))
+        cy2 = min(img_height, int(y2 + pad_y))
+        if cx2 <= cx1 or cy2 <= cy1:
+            crops.append(None)
+            continue
+        crops.append(img[cy1:cy2, cx1:cx2])
+    return crops
+
+
+def classify_crops(classifier, crops):
+    """
+    Run the ripeness/health classifier on all crops in a single batch.
+    Returns one (class_name, confidence) tuple per crop, or None for empty crops.
+    """
+    valid = [i for i, crop in enumerate(crops) if crop is not None]
+    labels = [None] * len(crops)
+    if not valid:
+        return labels
+
+    results = classifier.predict(
+        [crops[i] for i in valid],
+        imgsz=CLASSIFIER_IMGSZ,
+        verbose=False
+    )
+    for i, result in zip(valid, results):
+        top1 = int(result.probs.top1)
+        labels[i] = (result.names[top1], float(result.probs.top1conf))
+    return labels
+
+
+def predict_bunga_two_stage(image_path, detector_model_path, classifier_model_path=None):
+    """
+    Two-stage bunga analysis:
+    1. A detector at low resolution finds bunch boxes.
+    2. The boxes are cropped from the original image and classified in one batch
+       for ripeness (A-D) and health (a-d).
+    If no classifier is given, the detector's own class for each box is kept.
+
+    Returns (same shape as predict_bunga_with_objects.py):
+    {
+        "success": true/false,
+        "ripeness": "Class A-a",
+        "confidence": float (0-100),
+        "bunga_detections": [
+            {"class": "Class A-a", "confidence": 0.95, "bbox": [x1, y1, x2, y2], "center": [cx, cy]}
+        ],
+        "other_objects": [],
+        "error": null,
+        "image_size": [width, height]
+    }
+    """
+
+    try:
+        # Read image
+        img = cv2.imread(image_path)
+        if img is None:
+            return {
+                "success": False,
+                "error": "Could not read image",
+                "ripeness": None,
+                "confidence": 0,
+                "bunga_detections": [],
+                "other_objects": [],
+                "image_size": [0, 0]
+            }
+
+        img_height, img_width = img.shape[:2]
+
+        if not os.path.exists(detector_model_path):
+            return {
+                "success": False,
+                "error": f"Detector model not found at {detector_model_path}",
+                "ripeness": None,
+                "confidence": 0,
+                "bunga_detections": [],
+                "other_objects": [],
+                "image_size": [img_width, img_height]
+            }
+
+        # Stage 1: localize bunches
+        stage_start = time.perf_counter()
+        detector = load_yolo(detector_model_path)
+        det_result = detector.predict(
+            img,
+            conf=DETECTOR_CONF,
+            imgsz=DETECTOR_IMGSZ,
+            verbose=False,
+            max_det=MAX_CROPS
+        )[0]
+        detect_ms = (time.perf_counter() - stage_start) * 1000
+
+        if det_result.boxes is None or len(det_result.boxes) == 0:
+            print(f"⚠️ No bunga detected (stage 1: {detect_ms:.0f}ms)", file=sys.stderr)
+            return {
+                "success": False,
+                "error": "No pepper bunches detected",
+                "ripeness": None,
+                "confidence": 0,
+                "bunga_detections": [],
+                "other_objects": [],
+                "image_size": [img_width, img_height]
+            }
+
+        detections = extract_detections(det_result, get_schema(detector.names))
+        boxes = [det.bbox for det in detections]
+        print(f"📦 Stage 1: {len(boxes)} bunch(es) at imgsz={DETECTOR_IMGSZ} in {detect_ms:.0f}ms", file=sys.stderr)
+
+        # Stage 2: classify the crops
+        stage_start = time.perf_counter()
+        labels = [None] * len(boxes)
+        if classifier_model_path and os.path.exists(classifier_model_path):
+            classifier = load_yolo(classifier_model_path)
+            labels = classify_crops(classifier, crop_regions(img, boxes))
+        elif classifier_model_path:
+            print(f"⚠️ Classifier not found: {classifier_model_path} - using detector classes", file=sys.stderr)
+        classify_ms = (time.perf_counter() - stage_start) * 1000
+        print(f"🔬 Stage 2: classified {sum(1 for l in labels if l)} crop(s) in {classify_ms:.0f}ms", file=sys.stderr)
+
+        bunga_detections = []
+        max_confidence = 0
+        best_ripeness = None
+
+        for det, label in zip(detections, labels):
+            if label is not None:
+                class_name, cls_conf = label
+                # Keep the box score in the picture: a confident label on a weak box is still weak
+                det.class_name = class_name
+                det.confidence = cls_conf * det.confidence
+            class_name, conf = det.class_name, det.confidence
+            bunga_detections.append(det.bunga_dict())
+
+            if conf > max_confidence:
+                max_confidence = conf
+                best_ripeness = class_name
+
+        print(f"✅ Result: {best_ripeness} ({max_confidence:.2f} confidence)", file=sys.stderr)
+
+        return {
+            "success": best_ripeness is not None,
+            "ripeness": best_ripeness,
+            "confidence": round(max_confidence * 100, 2) if best_ripeness else 0,
+            "bunga_detections": bunga_detections,
+            "other_objects": [],
+            "error": None,
+            "image_size": [img_width, img_height]
+        }
+
+    except Exception as e:
+        print(f"❌ Fatal error: {str(e)}", file=sys.stderr)
+        return {
+            "success": False,
+            "error": f"Processing error: {str(e)}",
+            "ripeness": None,
+            "confidence": 0,
+            "bunga_detections": [],
+            "other_objects": [],
+            "image_size": [0, 0]
+        }
+
+
+if __name__ == "__main__":
+    response_encoder.claim_stdout()
+    
+    if len(sys.argv) < 2:
+        response_encoder.emit({"error": "No image path provided", "success": False, "bunga_detections": [], "other_objects": [], "image_size": [0, 0]})
+        sys.exit(1)
+
+    image_path = sys.argv[1]
+    detector_model_path = sys.argv[2] if len(sys.argv) > 2 else "bunga_model.pt"
+    classifier_model_path = sys.argv[3] if len(sys.argv) > 3 else None
+
+    print(f"📸 Input image: {image_path}", file=sys.stderr)
+    print(f"🤖 Detector: {detector_model_path}", file=sys.stderr)
+    print(f"🔬 Classifier: {classifier_model_path}", file=sys.stderr)
+
+    result = predict_bunga_two_stage(image_path, detector_model_path, classifier_model_path)
+    startup_profiler.report(result)
+    response_encoder.emit(result)
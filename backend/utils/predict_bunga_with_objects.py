@@ -1,22 +1,21 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
-
-# TensorFlow for general object detection
-try:
-    import tensorflow as tf
-    import tensorflow_hub as hub
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
-    print("⚠️ TensorFlow not available, falling back to YOLO", file=sys.stderr)
-
-# Suppress TensorFlow logging
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+from model_cache import load_yolo
+import precision_policy
+from detection_postprocess import get_schema, extract_detections, best_detection
+from image_io import read_image_reduced, letterbox
+import response_encoder
 
 
 def predict_bunga_ripeness_with_objects(image_path, bunga_model_path, general_model_path):
@@ -42,7 +41,8 @@ def predict_bunga_ripeness_with_objects(image_path, bunga_model_path, general_mo
     
     try:
         # Read image
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 640px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=640)
         if img is None:
             return {
                 "success": False,
@@ -54,7 +54,7 @@ def predict_bunga_ripeness_with_objects(image_path, bunga_model_path, general_mo
                 "image_size": [0, 0]
             }
         
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         
         # Step 1: Detect bunga ripeness (custom model)
         bunga_ripeness_result = None
@@ -67,50 +67,22 @@ def predict_bunga_ripeness_with_objects(image_path, bunga_model_path, general_mo
                 bunga_ripeness_result = {"ripeness": None, "confidence": 0}
             else:
                 print(f"✅ Loading bunga model...", file=sys.stderr)
-                bunga_model = YOLO(bunga_model_path)
-                # Use half precision for faster inference
-                bunga_results = bunga_model.predict(image_path, conf=0.25, verbose=False, half=True)
+                bunga_model = load_yolo(bunga_model_path)
+                # Precision (fp32/fp16/bf16) comes from the precision policy for this hardware
+                frame = letterbox(img, 640, orig_size=orig_size)
+                precision = precision_policy.policy_for('bunga', bunga_model, bunga_model_path, imgsz=640)
+                bunga_results = precision.predict(bunga_model, frame.image, conf=0.25, verbose=False, imgsz=frame.size)
                 bunga_result = bunga_results[0]
                 
-                max_confidence = 0
-                best_ripeness = None
+                detections = extract_detections(bunga_result, get_schema(bunga_model.names), letterbox=frame)
+                bunga_detections = [det.bunga_dict() for det in detections]
+                best = best_detection(detections)
                 
-                if bunga_result.boxes is not None and len(bunga_result.boxes) > 0:
-                    for detection in bunga_result.boxes:
-                        conf = float(detection.conf[0])
-                        cls = int(detection.cls[0])
-                        class_name = bunga_result.names[cls]
-                        
-                        # Get bounding box coordinates in pixel space
-                        try:
-                            # xyxy returns [x1, y1, x2, y2] in pixel coordinates
-                            bbox_tensor = detection.xyxy[0]
-                            px1, py1, px2, py2 = int(bbox_tensor[0]), int(bbox_tensor[1]), int(bbox_tensor[2]), int(bbox_tensor[3])
-                        except:
-                            # Fallback: try normalized coordinates
-                            norm_coords = detection.xyxyn[0]
-                            x1, y1, x2, y2 = float(norm_coords[0]), float(norm_coords[1]), float(norm_coords[2]), float(norm_coords[3])
-                            px1, py1, px2, py2 = int(x1 * img_width), int(y1 * img_height), int(x2 * img_width), int(y2 * img_height)
-                        
-                        center_x = (px1 + px2) / 2
-                        center_y = (py1 + py2) / 2
-                        
-                        bunga_detections.append({
-                            "class": class_name,
-                            "confidence": round(conf, 4),
-                            "bbox": [px1, py1, px2, py2],
-                            "center": [round(center_x, 2), round(center_y, 2)]
-                        })
-                        
-                        # Track best ripeness prediction
-                        if conf > max_confidence:
-                            max_confidence = conf
-                            best_ripeness = class_name
-                    
-                    print(f"✅ Pepper detected: {best_ripeness} ({max_confidence:.2f})", file=sys.stderr)
+                if best is not None:
+                    print(f"✅ Pepper detected: {best.class_name} ({best.confidence:.2f})", file=sys.stderr)
                     bunga_ripeness_result = {
-                        "ripeness": best_ripeness,
-                        "confidence": round(max_confidence * 100, 2)
+                        "ripeness": best.class_name,
+                        "confidence": round(best.confidence * 100, 2)
                     }
                 else:
                     print(f"⚠️ No peppers detected in image", file=sys.stderr)
@@ -155,8 +127,10 @@ def predict_bunga_ripeness_with_objects(image_path, bunga_model_path, general_mo
 
 
 if __name__ == "__main__":
+    response_encoder.claim_stdout()
+    
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "No image path provided", "success": False, "bunga_detections": [], "other_objects": [], "image_size": [0, 0]}))
+        response_encoder.emit({"error": "No image path provided", "success": False, "bunga_detections": [], "other_objects": [], "image_size": [0, 0]})
         sys.exit(1)
     
     image_path = sys.argv[1]
@@ -168,4 +142,5 @@ if __name__ == "__main__":
     print(f"📂 Model exists: {os.path.exists(bunga_model_path)}", file=sys.stderr)
     
     result = predict_bunga_ripeness_with_objects(image_path, bunga_model_path, None)
-    print(json.dumps(result))
+    startup_profiler.report(result)
+    response_encoder.emit(result)
@@ -1,126 +1,277 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
-import torch
-import torch.nn as nn
-from torchvision import models, transforms
+import threading
 from PIL import Image
 from pathlib import Path
+from image_io import open_pil_reduced
+import response_encoder
+import weight_store
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+DEFAULT_MODEL_PATH = PROJECT_ROOT / 'ml_models' / 'leafdataset' / 'unified_pepper_diseases_model.pth'
+DEFAULT_METRICS_PATH = PROJECT_ROOT / 'ml_models' / 'leafdataset' / 'unified_pepper_diseases_metrics.json'
+
+# Graph mode for long-lived predictors: 'trace' (TorchScript, frozen), 'compile' (torch.compile) or 'none'.
+# 'trace' is skipped when the weights are memory-mapped from a converted .safetensors file on CPU:
+# freezing copies every Conv/BN weight, which would give up the page sharing between processes
+GRAPH_MODE = os.environ.get('RESNET50_GRAPH', 'trace').strip().lower()
+INPUT_SIZE = 224
+RESIZE_SIZE = 256
+
+# torch and torchvision are imported on first use (get_predictor / ResNet50Predictor),
+# so importing this module for its helpers or constants stays cheap
+_TRANSFORM = None
+_CLASS_NAMES = {}
+_PREDICTORS = {}
+_predictors_lock = threading.Lock()
+
+
+def load_class_names(metrics_path):
+    """Read the class list from a training metrics.json (cached per path)."""
+    metrics_path = str(metrics_path)
+    if metrics_path not in _CLASS_NAMES:
+        with open(metrics_path, 'r') as f:
+            metrics = json.load(f)
+        _CLASS_NAMES[metrics_path] = list(metrics.get('classes', []))
+    return _CLASS_NAMES[metrics_path]
+
+
+def get_transform():
+    """Same transforms as used during training - built once, not per image"""
+    global _TRANSFORM
+    if _TRANSFORM is None:
+        from torchvision import transforms
+        _TRANSFORM = transforms.Compose([
+            transforms.Resize(RESIZE_SIZE),
+            transforms.CenterCrop(INPUT_SIZE),
+            transforms.ToTensor(),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                                 std=[0.229, 0.224, 0.225])
+        ])
+    return _TRANSFORM
+
+
+def build_model(num_classes):
+    """ResNet50 with the final layer replaced for our classes (no pretrained weights)"""
+    import torch.nn as nn
+    from torchvision import models
+    model = models.resnet50(weights=None)
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model
+
 
 def load_model(model_path, device, class_names):
-    """Load the pre-trained ResNet50 model"""
+    """
+    Build ResNet50 for our classes and load the trained weights.
+    Returns (model, mapped): mapped is True when the parameters are views of a
+    memory-mapped .safetensors file, shared with every other process that maps it.
+    """
+    import torch
     try:
         num_classes = len(class_names)
-        
-        # Load ResNet50 with pre-trained weights
-        model = models.resnet50(weights=models.ResNet50_Weights.DEFAULT)
-        
-        # Replace the final layer to match our number of classes
-        model.fc = nn.Linear(model.fc.in_features, num_classes)
-        
-        # Load the trained weights
-        checkpoint = torch.load(model_path, map_location=device)
-        model.load_state_dict(checkpoint)
-        
-        model = model.to(device)
+        mapped = False
+
+        # Memory-mapped safetensors copy from convert_weights.py, if there is one
+        converted = weight_store.resolve(model_path)
+        if converted is not None and weight_store.supports_assign():
+            state_dict, _ = weight_store.load_file(converted)
+            # Build on the meta device: every tensor comes from the mapped file, nothing is initialized
+            with torch.device('meta'):
+                model = build_model(num_classes)
+            model.load_state_dict(state_dict, assign=True)
+            mapped = device.type == 'cpu'
+        else:
+            # No ImageNet weights: every parameter is overwritten by the checkpoint anyway
+            model = build_model(num_classes)
+            if converted is not None:
+                state_dict, _ = weight_store.load_file(converted)
+            else:
+                state_dict = torch.load(model_path, map_location=device, weights_only=True)
+            model.load_state_dict(state_dict)
+
+        # Converted conv weights are already channels_last on CPU, so this copies nothing
+        model = model.to(device, memory_format=torch.channels_last)
         model.eval()
-        
-        return model
+
+        return model, mapped
     except Exception as e:
         raise Exception(f"Failed to load model: {str(e)}")
 
-def preprocess_image(image_path):
-    """Preprocess image for ResNet50"""
+
+def preprocess_image(image):
+    """Preprocess one image (path or PIL image) for ResNet50"""
     try:
-        # Define transforms (same as used during training)
-        transform = transforms.Compose([
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                                 std=[0.229, 0.224, 0.225])
-        ])
-        
-        # Load and transform image
-        image = Image.open(image_path).convert('RGB')
-        image_tensor = transform(image)
-        
-        return image_tensor.unsqueeze(0)  # Add batch dimension
+        if not isinstance(image, Image.Image):
+            # Resize(256) only needs a 256px short side - JPEG-draft straight to it
+            image = open_pil_reduced(image, min_side=RESIZE_SIZE)
+        return get_transform()(image.convert('RGB'))
     except Exception as e:
         raise Exception(f"Failed to preprocess image: {str(e)}")
 
+
+class ResNet50Predictor:
+    """
+    Resident ResNet50 disease classifier.
+    The network is built and its weights loaded once; every call after that
+    is a single forward pass under torch.inference_mode on channels_last input.
+    Use get_predictor() to share one instance per model file.
+    With memory-mapped weights, the eager module is kept in place of a frozen
+    trace (see GRAPH_MODE), so the weight pages stay shared.
+    """
+
+    def __init__(self, model_path, class_names, device=None, graph_mode=GRAPH_MODE):
+        import torch
+        self.device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+        self.class_names = list(class_names)
+        self.graph_mode = graph_mode
+        self._lock = threading.Lock()
+
+        model, mapped = load_model(model_path, self.device, self.class_names)
+        if mapped and self.graph_mode == 'trace':
+            print("ℹ️ ResNet50 weights are memory-mapped; keeping the eager model so their pages stay shared",
+                  file=sys.stderr)
+            self.graph_mode = 'none'
+        self.model = self._to_graph(model)
+
+    def _to_graph(self, model):
+        import torch
+        example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE, device=self.device).to(memory_format=torch.channels_last)
+        try:
+            with torch.inference_mode():
+                if self.graph_mode == 'trace':
+                    graph = torch.jit.trace(model, example, check_trace=False)
+                    graph = torch.jit.optimize_for_inference(torch.jit.freeze(graph))
+                elif self.graph_mode == 'compile' and hasattr(torch, 'compile'):
+                    graph = torch.compile(model, dynamic=True)
+                else:
+                    return model
+                # Warm-up pass so the first real request does not pay for optimization
+                graph(example)
+            print(f"⚡ ResNet50 graph ready ({self.graph_mode}) on {self.device}", file=sys.stderr)
+            return graph
+        except Exception as e:
+            print(f"⚠️ ResNet50 {self.graph_mode} failed, using eager model: {str(e)}", file=sys.stderr)
+            return model
+
+    def predict_batch(self, images):
+        """
+        Classify a list of images (paths or PIL images) in one forward pass.
+        Returns one result dict per image, in order.
+        """
+        if not images:
+            return []
+        import torch
+
+        batch = torch.stack([preprocess_image(image) for image in images])
+        batch = batch.to(self.device, non_blocking=True).contiguous(memory_format=torch.channels_last)
+
+        # Graph modules are not guaranteed to be re-entrant
+        with self._lock, torch.inference_mode():
+            probabilities = torch.softmax(self.model(batch), dim=1).float().cpu()
+
+        confidences, pred_classes = probabilities.max(dim=1)
+        rows = (probabilities * 100).tolist()
+
+        results = []
+        for pred_idx, confidence, row in zip(pred_classes.tolist(), confidences.tolist(), rows):
+            results.append({
+                'disease': self.class_names[pred_idx],
+                'confidence': round(confidence * 100, 2),
+                'all_predictions': {name: round(pct, 2) for name, pct in zip(self.class_names, row)},
+                'success': True
+            })
+        return results
+
+    def predict(self, image):
+        """Classify a single image."""
+        return self.predict_batch([image])[0]
+
+
+def get_predictor(model_path=DEFAULT_MODEL_PATH, metrics_path=DEFAULT_METRICS_PATH, graph_mode=GRAPH_MODE,
+                  class_names=None):
+    """
+    Return the shared ResNet50Predictor for a model file, loading it on first use.
+    The classes come from metrics_path unless class_names is given.
+    """
+    with _predictors_lock:
+        if class_names is None:
+            class_names = load_class_names(metrics_path)
+        if not class_names:
+            raise Exception('No classes found in metrics.json')
+        key = (str(model_path), tuple(class_names), graph_mode)
+        if key not in _PREDICTORS:
+            _PREDICTORS[key] = ResNet50Predictor(str(model_path), class_names, graph_mode=graph_mode)
+        return _PREDICTORS[key]
+
+
 def predict_disease(image_path, model_path, class_names):
     """Predict disease from image using ResNet50 model"""
     try:
-        # Set device
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        
         # Check if model path exists
         if not os.path.exists(model_path):
             return {'error': f'Model not found at {model_path}'}
-        
+
         # Check if image path exists
         if not os.path.exists(image_path):
             return {'error': f'Image not found at {image_path}'}
-        
-        # Load model
-        model = load_model(model_path, device, class_names)
-        
-        # Preprocess image
-        image_tensor = preprocess_image(image_path)
-        image_tensor = image_tensor.to(device)
-        
-        # Run inference
-        with torch.no_grad():
-            outputs = model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, pred_class = torch.max(probabilities, 1)
-        
-        # Get results
-        pred_idx = pred_class.item()
-        pred_disease = class_names[pred_idx]
-        pred_confidence = float(confidence.item()) * 100
-        
-        # Get all predictions as percentages
-        all_predictions = {
-            class_names[i]: round(float(probabilities[0][i].item()) * 100, 2)
-            for i in range(len(class_names))
-        }
-        
-        return {
-            'disease': pred_disease,
-            'confidence': round(pred_confidence, 2),
-            'all_predictions': all_predictions,
-            'success': True
-        }
-    
+
+        predictor = get_predictor(model_path, class_names=class_names, graph_mode=GRAPH_MODE)
+        return predictor.predict(image_path)
+
     except Exception as e:
         return {'error': str(e)}
 
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print(json.dumps({'error': 'No image path provided'}))
+    response_encoder.claim_stdout()
+
+    image_paths = [arg.strip('"') for arg in sys.argv[1:]]
+    if not image_paths:
+        response_encoder.emit({'error': 'No image path provided'})
+        sys.exit(1)
+
+    missing = [path for path in image_paths if not os.path.exists(path)]
+    if missing:
+        response_encoder.emit({'error': f'Image not found at {missing[0]}'})
         sys.exit(1)
-    
-    image_path = sys.argv[1].strip('"')
-    
-    # Define paths using project root
-    project_root = Path(__file__).parent.parent.parent
-    model_path = project_root / 'ml_models' / 'leafdataset' / 'unified_pepper_diseases_model.pth'
-    metrics_path = project_root / 'ml_models' / 'leafdataset' / 'unified_pepper_diseases_metrics.json'
-    
+
     # Load class names from metrics.json
     try:
-        with open(metrics_path, 'r') as f:
-            metrics = json.load(f)
-            class_names = metrics.get('classes', [])
-        
+        class_names = load_class_names(DEFAULT_METRICS_PATH)
         if not class_names:
-            print(json.dumps({'error': 'No classes found in metrics.json'}))
+            response_encoder.emit({'error': 'No classes found in metrics.json'})
             sys.exit(1)
     except Exception as e:
-        print(json.dumps({'error': f'Failed to load metrics.json: {str(e)}'}))
+        response_encoder.emit({'error': f'Failed to load metrics.json: {str(e)}'})
         sys.exit(1)
-    
-    result = predict_disease(image_path, str(model_path), class_names)
-    print(json.dumps(result))
+
+    if not DEFAULT_MODEL_PATH.exists():
+        response_encoder.emit({'error': f'Model not found at {DEFAULT_MODEL_PATH}'})
+        sys.exit(1)
+
+    try:
+        # A one-shot call with a single image would spend more on graph optimization than it saves
+        graph_mode = GRAPH_MODE if len(image_paths) > 1 else 'none'
+        with startup_profiler.step('load resnet50'):
+            predictor = get_predictor(DEFAULT_MODEL_PATH, DEFAULT_METRICS_PATH, graph_mode=graph_mode)
+    except Exception as e:
+        response_encoder.emit({'error': f'Failed to load model: {str(e)}'})
+        sys.exit(1)
+
+    try:
+        results = predictor.predict_batch(image_paths)
+    except Exception as e:
+        response_encoder.emit({'error': str(e)})
+        sys.exit(1)
+
+    result = results[0] if len(results) == 1 else {'success': True, 'results': results}
+    startup_profiler.report(result)
+    response_encoder.emit(result)
@@ -1,10 +1,21 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
 import os
 import json
 import sys
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from model_cache import load_yolo
+import precision_policy
+from detection_postprocess import get_schema, extract_detections, best_detection
+from image_io import read_image_reduced, letterbox
+import response_encoder
 
 # Suppress warnings
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
@@ -28,7 +39,8 @@ def predict_leaf_disease(image_path, model_path):
     
     try:
         # Read image
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 512px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=512)
         if img is None:
             return {
                 "success": False,
@@ -38,7 +50,7 @@ def predict_leaf_disease(image_path, model_path):
                 "image_size": [0, 0]
             }
         
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         image_size = [img_width, img_height]
         
         # Check if model path exists
@@ -54,20 +66,23 @@ def predict_leaf_disease(image_path, model_path):
         print(f"🤖 Loading YOLOv8 leaf disease model...", file=sys.stderr)
         
         # Load YOLOv8 model
-        model = YOLO(model_path)
+        model = load_yolo(model_path)
         
         # Print model details for debugging
         print(f"📋 Model names dict: {model.names}", file=sys.stderr)
         print(f"📋 Number of classes: {len(model.names)}", file=sys.stderr)
         
         # Run inference - Optimized for speed
-        # Use conf=0.5 (filter weak detections), imgsz=512 (smaller = faster), half=True (FP16)
-        results = model.predict(
-            image_path, 
+        # Use conf=0.5 (filter weak detections), imgsz=512 (smaller = faster)
+        # Precision (fp32/fp16/bf16) comes from the precision policy for this hardware
+        frame = letterbox(img, 512, orig_size=orig_size)
+        precision = precision_policy.policy_for('leaf', model, model_path, imgsz=512)
+        results = precision.predict(
+            model,
+            frame.image, 
             conf=0.5,      # Higher confidence threshold - only strong detections
-            imgsz=512,     # Smaller size = ~30% faster than 640 with minimal accuracy loss
-            verbose=False, 
-            half=True      # FP16 inference (faster on GPU)
+            imgsz=frame.size,     # Smaller size = ~30% faster than 640 with minimal accuracy loss
+            verbose=False
         )
         detection_data = results[0]
         
@@ -75,22 +90,18 @@ def predict_leaf_disease(image_path, model_path):
         best_disease = "Healthy"
         best_confidence = 0
         
+        detections = extract_detections(detection_data, get_schema(model.names), letterbox=frame)
         print(f"📊 Model class names: {detection_data.names}", file=sys.stderr)
-        print(f"🔍 Total detections: {len(detection_data.boxes) if detection_data.boxes is not None else 0}", file=sys.stderr)
+        print(f"🔍 Total detections: {len(detections)}", file=sys.stderr)
         
-        if detection_data.boxes is not None and len(detection_data.boxes) > 0:
-            # Find best detection only
-            for idx, box in enumerate(detection_data.boxes):
-                confidence = float(box.conf[0])
-                cls_idx = int(box.cls[0])
-                disease_name = detection_data.names[cls_idx]
-                
-                print(f"  📍 Detection {idx}: cls_idx={cls_idx}, name='{disease_name}', conf={confidence:.4f}", file=sys.stderr)
-                
-                # Track only the best confidence
-                if confidence > best_confidence:
-                    best_confidence = confidence
-                    best_disease = disease_name
+        if detections:
+            for idx, det in enumerate(detections):
+                print(f"  📍 Detection {idx}: cls_idx={det.cls}, name='{det.class_name}', conf={det.confidence:.4f}", file=sys.stderr)
+            
+            # Track only the best confidence
+            best = best_detection(detections)
+            best_disease = best.class_name
+            best_confidence = best.confidence
             
             print(f"✅ Best detection: {best_disease} ({best_confidence:.4f})", file=sys.stderr)
         else:
@@ -120,14 +131,16 @@ def predict_leaf_disease(image_path, model_path):
 
 
 if __name__ == "__main__":
+    response_encoder.claim_stdout()
+    
     if len(sys.argv) < 2:
-        print(json.dumps({
+        response_encoder.emit({
             "error": "No image path provided",
             "success": False,
             "disease": None,
             "confidence": 0,
             "image_size": [0, 0]
-        }))
+        })
         sys.exit(1)
     
     image_path = sys.argv[1]
@@ -137,4 +150,5 @@ if __name__ == "__main__":
     print(f"🤖 Model: {model_path}", file=sys.stderr)
     
     result = predict_leaf_disease(image_path, model_path)
-    print(json.dumps(result))
+    startup_profiler.report(result)
+    response_encoder.emit(result)
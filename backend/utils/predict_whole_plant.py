@@ -0,0 +1,231 @@
+import startup_profiler
+import zygote_client
+if __name__ == "__main__":
+    # Hand off to a running prediction zygote (predict_zygote.py) if there is one
+    zygote_client.delegate(__file__)
+    # Before the other imports, so --profile-startup can time them
+    startup_profiler.install()
+import os
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from model_cache import load_yolo
+import precision_policy
+from detection_postprocess import get_schema, extract_detections, best_detection
+from image_io import read_image_reduced, letterbox_sizes
+import response_encoder
+
+# Suppress warnings
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+# Same settings as predict_disease_yolov8.py and predict_bunga_dual_models.py
+LEAF_IMGSZ = 512
+LEAF_CONF = 0.5
+BUNGA_IMGSZ = 1024
+BUNGA_CONF = 0.10
+
+# One pool shared by every request; torch releases the GIL while a model runs,
+# so the leaf and bunga detectors really do run side by side
+PLANT_WORKERS = int(os.environ.get('PLANT_MODEL_WORKERS', 2))
+_executor = None
+
+
+def get_executor():
+    """Return the shared model thread pool, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PLANT_WORKERS, thread_name_prefix='plant-model')
+    return _executor
+
+
+def summarize_leaf(detections):
+    """Leaf block in the predict_disease_yolov8.py format (minus image_size)."""
+    best = best_detection(detections)
+    if best is None:
+        # No disease detected - assume healthy
+        return {"success": True, "disease": "Healthy", "confidence": 95.0, "error": None}
+    return {
+        "success": True,
+        "disease": best.class_name,
+        "confidence": round(best.confidence * 100, 2),
+        "error": None
+    }
+
+
+def summarize_bunga(detections):
+    """Bunga block in the predict_bunga_dual_models.py format (minus image_size)."""
+    if not detections:
+        return {
+            "success": False,
+            "ripeness": None,
+            "ripeness_percentage": 0,
+            "health_class": None,
+            "health_percentage": 0,
+            "confidence": 0,
+            "bunga_detections": [],
+            "error": "No black pepper bunga detected in image"
+        }
+    best = detections[0]
+    return {
+        "success": best.ripeness is not None,
+        "ripeness": best.ripeness,
+        "ripeness_percentage": best.ripeness_percentage,
+        "health_class": best.health_class,
+        "health_percentage": best.health_percentage,
+        "confidence": round(best.confidence * 100, 2),
+        "bunga_detections": [det.bunga_dict() for det in detections],
+        "error": None
+    }
+
+
+def run_detector(model, frame, conf, precision, **predict_kwargs):
+    """Run one detector on a letterboxed frame. Returns (detections, elapsed_ms)."""
+    start = time.perf_counter()
+    result = precision.predict(model, frame.image, conf=conf, imgsz=frame.size, verbose=False, **predict_kwargs)[0]
+    detections = extract_detections(result, get_schema(model.names), letterbox=frame)
+    return detections, (time.perf_counter() - start) * 1000
+
+
+def _failed_block(kind, error):
+    if kind == 'leaf':
+        return {"success": False, "disease": None, "confidence": 0, "error": error}
+    return {"success": False, "ripeness": None, "confidence": 0, "bunga_detections": [], "error": error}
+
+
+def analyze_plant(img, leaf_model, bunga_model, orig_size=None, precisions=None):
+    """
+    Run the leaf and bunga detectors concurrently on one decoded BGR image.
+    Either model may be None, in which case its block reports an error.
+    orig_size: (width, height) of the full image when `img` was decoded reduced.
+    precisions: optional {'leaf': Precision, 'bunga': Precision} from
+    precision_policy; models without one use the hardware default.
+
+    Returns:
+    {
+        "success": true/false,
+        "leaf": {"success", "disease", "confidence", "error"},
+        "bunga": {"success", "ripeness", "ripeness_percentage", "health_class",
+                  "health_percentage", "confidence", "bunga_detections", "error"},
+        "timings_ms": {"letterbox", "leaf", "bunga", "total"},
+        "image_size": [width, height],
+        "error": null
+    }
+    """
+    models = {'leaf': leaf_model, 'bunga': bunga_model}
+    precisions = precisions or {}
+    executor = get_executor()
+
+    def submit(kind, frame, conf):
+        model = models[kind]
+        if model is None:
+            return None
+        precision = precisions.get(kind) or precision_policy.policy_for(kind, model, imgsz=frame.size)
+        return executor.submit(run_detector, model, frame, conf, precision)
+
+    return run_plant_detectors(img, submit, orig_size)
+
+
+def run_plant_detectors(img, submit, orig_size=None, imgsz=None):
+    """
+    Body of analyze_plant for callers that schedule the detectors themselves
+    (inference_server runs them on its replica executor).
+    submit(kind, frame, conf) starts one detector and returns a Future of
+    (detections, elapsed_ms), or None when that model is not available.
+    imgsz: {'leaf': size, 'bunga': size}; defaults to LEAF_IMGSZ and BUNGA_IMGSZ.
+    """
+    start = time.perf_counter()
+    img_width, img_height = orig_size or (img.shape[1], img.shape[0])
+    imgsz = imgsz or {'leaf': LEAF_IMGSZ, 'bunga': BUNGA_IMGSZ}
+
+    frames = letterbox_sizes(img, imgsz.values(), orig_size=(img_width, img_height))
+    timings = {"letterbox": round((time.perf_counter() - start) * 1000, 1)}
+
+    jobs = {
+        'leaf': submit('leaf', frames[imgsz['leaf']], LEAF_CONF),
+        'bunga': submit('bunga', frames[imgsz['bunga']], BUNGA_CONF)
+    }
+
+    blocks = {}
+    for kind, summarize in (('leaf', summarize_leaf), ('bunga', summarize_bunga)):
+        if jobs[kind] is None:
+            blocks[kind] = _failed_block(kind, f"{kind.capitalize()} model not loaded")
+            continue
+        try:
+            detections, elapsed_ms = jobs[kind].result()
+            timings[kind] = round(elapsed_ms, 1)
+            blocks[kind] = summarize(detections)
+            print(f"✅ {kind}: {len(detections)} detection(s) in {elapsed_ms:.0f}ms", file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️ {kind} detection error: {str(e)}", file=sys.stderr)
+            blocks[kind] = _failed_block(kind, f"Detection error: {str(e)}")
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+
+    return {
+        "success": blocks['leaf']["success"] or blocks['bunga']["success"],
+        "leaf": blocks['leaf'],
+        "bunga": blocks['bunga'],
+        "timings_ms": timings,
+        "image_size": [img_width, img_height],
+        "error": None
+    }
+
+
+def predict_whole_plant(image_path, leaf_model_path, bunga_model_path):
+    """
+    Whole-plant analysis from the command line: decode once, load both models
+    in parallel, then run analyze_plant.
+    """
+    try:
+        start = time.perf_counter()
+        # Decode only as much of the JPEG as the larger of the two models needs
+        img, orig_size = read_image_reduced(image_path, max_side=max(LEAF_IMGSZ, BUNGA_IMGSZ))
+        if img is None:
+            return {"success": False, "error": "Could not read image", "leaf": None, "bunga": None, "image_size": [0, 0]}
+        decode_ms = (time.perf_counter() - start) * 1000
+
+        def _load(path):
+            if not path or not os.path.exists(path):
+                print(f"⚠️ Model not found: {path}", file=sys.stderr)
+                return None
+            return load_yolo(path)
+
+        executor = get_executor()
+        leaf_job = executor.submit(_load, leaf_model_path)
+        bunga_job = executor.submit(_load, bunga_model_path)
+        leaf_model, bunga_model = leaf_job.result(), bunga_job.result()
+
+        precisions = {}
+        if leaf_model is not None:
+            precisions['leaf'] = precision_policy.policy_for('leaf', leaf_model, leaf_model_path, imgsz=LEAF_IMGSZ)
+        if bunga_model is not None:
+            precisions['bunga'] = precision_policy.policy_for('bunga', bunga_model, bunga_model_path, imgsz=BUNGA_IMGSZ)
+
+        result = analyze_plant(img, leaf_model, bunga_model, orig_size, precisions)
+        result["timings_ms"]["decode"] = round(decode_ms, 1)
+        return result
+
+    except Exception as e:
+        print(f"❌ Fatal error: {str(e)}", file=sys.stderr)
+        return {"success": False, "error": f"Processing error: {str(e)}", "leaf": None, "bunga": None, "image_size": [0, 0]}
+
+
+if __name__ == "__main__":
+    response_encoder.claim_stdout()
+
+    if len(sys.argv) < 2:
+        response_encoder.emit({"error": "No image path provided", "success": False, "leaf": None, "bunga": None, "image_size": [0, 0]})
+        sys.exit(1)
+
+    image_path = sys.argv[1]
+    leaf_model_path = sys.argv[2] if len(sys.argv) > 2 else "leaf_disease_model.pt"
+    bunga_model_path = sys.argv[3] if len(sys.argv) > 3 else "unified_model.pt"
+
+    print(f"📸 Input image: {image_path}", file=sys.stderr)
+    print(f"🍃 Leaf model: {leaf_model_path}", file=sys.stderr)
+    print(f"🫑 Bunga model: {bunga_model_path}", file=sys.stderr)
+
+    result = predict_whole_plant(image_path, leaf_model_path, bunga_model_path)
+    startup_profiler.report(result)
+    response_encoder.emit(result)
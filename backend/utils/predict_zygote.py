@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Fork server ("zygote") for the spawned predictor scripts.
+
+Node still calls spawn(python, [script, image, model]); each script first
+hands itself to this server through zygote_client.delegate(). The zygote
+has already imported torch/ultralytics/cv2 and loaded the registered YOLO
+weights into model_cache, so a request costs a fork instead of a full
+interpreter and model cold start. The child runs the unchanged script as
+__main__ on the caller's stdin/stdout/stderr, so Node sees the same JSON.
+
+Run:
+    python predict_zygote.py                     # default models used by the controllers
+    PREDICT_ZYGOTE_MODELS=a.pt:b.pt python predict_zygote.py
+
+The zygote only loads weights; it never runs inference, so no torch
+intra-op thread pool exists yet when it forks.
+"""
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import socket
+import struct
+import selectors
+import traceback
+import zygote_client
+
+BACKEND_DIR = os.path.dirname(zygote_client.UTILS_DIR)
+DEFAULT_MODELS = [
+    os.path.join(BACKEND_DIR, 'ml_models', 'bunga', 'train', 'weights', 'best.pt'),
+    os.path.join(BACKEND_DIR, 'ml_models', 'leaf', 'train', 'weights', 'best.pt'),
+]
+PRELOAD_MODULES = ('numpy', 'cv2', 'PIL.Image', 'torch', 'ultralytics')
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+
+def registered_models():
+    configured = os.environ.get('PREDICT_ZYGOTE_MODELS')
+    paths = configured.split(os.pathsep) if configured else DEFAULT_MODELS
+    return [path for path in paths if path]
+
+
+def allowed_script(name):
+    """Only predictor scripts that live next to this file may be run."""
+    return (
+        name == os.path.basename(name)
+        and name.startswith('predict_') and name.endswith('.py')
+        and name != os.path.basename(__file__)
+        and os.path.isfile(os.path.join(zygote_client.UTILS_DIR, name))
+    )
+
+
+def preload():
+    """Import heavy modules and load registered weights once, before any fork."""
+    import importlib
+    import model_cache
+
+    for module in PRELOAD_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+            print(f"📦 Imported {module} in {(time.perf_counter() - start) * 1000:.0f}ms", file=sys.stderr)
+        except ImportError as e:
+            print(f"⚠️ Could not import {module}: {e}", file=sys.stderr)
+
+    for path in registered_models():
+        if not os.path.exists(path):
+            print(f"⚠️ Model not found, skipping: {path}", file=sys.stderr)
+            continue
+        start = time.perf_counter()
+        model_cache.load_yolo(path)
+        print(f"✅ Loaded {path} in {(time.perf_counter() - start) * 1000:.0f}ms", file=sys.stderr)
+
+
+def read_request(conn):
+    """Receive (request dict, [stdin, stdout, stderr] fds) from a client."""
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise ValueError("expected stdin/stdout/stderr descriptors")
+    while len(data) < 4:
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise ValueError("truncated request")
+        data += chunk
+    (length,) = struct.unpack('!I', data[:4])
+    if length > MAX_REQUEST_BYTES:
+        raise ValueError("request too large")
+    while len(data) < 4 + length:
+        chunk = conn.recv(65536)
+        if not chunk:
+            raise ValueError("truncated request")
+        data += chunk
+    return json.loads(data[4:4 + length].decode('utf-8')), fds
+
+
+def run_child(listener, selector, conn, request, fds):
+    """In the forked child: take over the caller's stdio and run the script as __main__."""
+    import runpy
+    import startup_profiler
+
+    code = 1
+    try:
+        selector.close()
+        listener.close()
+        conn.close()
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        os.environ.clear()
+        os.environ.update(request.get("env", {}))
+        os.environ[zygote_client.ENV_CHILD] = '1'
+        os.chdir(request.get("cwd") or '/')
+        # Profile this request, not the zygote's own startup
+        startup_profiler.reset()
+
+        script_path = os.path.join(zygote_client.UTILS_DIR, request["script"])
+        sys.argv = [script_path] + list(request.get("argv", []))
+        try:
+            runpy.run_path(script_path, run_name='__main__')
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o600)
+    listener.listen(64)
+    listener.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    running = {}  # pid -> client connection
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    print(f"🚀 Prediction zygote listening on {path}", file=sys.stderr)
+
+    try:
+        while True:
+            for key, _ in selector.select(timeout=0.2):
+                if key.fileobj is listener:
+                    try:
+                        conn, _ = listener.accept()
+                    except BlockingIOError:
+                        continue
+                    conn.setblocking(True)
+                    try:
+                        request, fds = read_request(conn)
+                    except (OSError, ValueError) as e:
+                        print(f"⚠️ Bad request: {e}", file=sys.stderr)
+                        conn.close()
+                        continue
+                    if not allowed_script(request.get("script", "")):
+                        print(f"⚠️ Refusing script {request.get('script')!r}", file=sys.stderr)
+                        for fd in fds:
+                            os.close(fd)
+                        conn.sendall(b"1\n")
+                        conn.close()
+                        continue
+
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    pid = os.fork()
+                    if pid == 0:
+                        run_child(listener, selector, conn, request, fds)
+                    for fd in fds:
+                        os.close(fd)
+                    running[pid] = conn
+                    selector.register(conn, selectors.EVENT_READ, pid)
+                else:
+                    # A client only becomes readable when it disconnects (Node timeout or kill)
+                    pid = key.data
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    if running.pop(pid, None) is not None:
+                        try:
+                            os.kill(pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+
+            # Reap finished children and report their exit codes
+            while running:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if pid == 0:
+                    break
+                conn = running.pop(pid, None)
+                if conn is None:
+                    continue
+                code = os.waitstatus_to_exitcode(status)
+                selector.unregister(conn)
+                try:
+                    conn.sendall(b"%d\n" % (code if code >= 0 else 128 - code))
+                except OSError as e:
+                    if e.errno != errno.EPIPE:
+                        raise
+                conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in list(running):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        selector.close()
+        listener.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        print("👋 Prediction zygote stopped", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    if not zygote_client.supported():
+        print("❌ The prediction zygote needs fork() and Unix sockets (Linux/macOS)", file=sys.stderr)
+        sys.exit(1)
+    print(f"🔧 Starting prediction zygote...", file=sys.stderr)
+    preload()
+    serve(zygote_client.socket_path())
@@ -0,0 +1,70 @@
+// Decoder for the payloads the Python predictors write with response_encoder.py.
+//
+// Handles both framings (PYTHON_RESPONSE_FRAMING):
+//   newline - one JSON payload per line (default)
+//   length  - a line with the payload's byte length, then exactly that many bytes
+// and expands compact detection lists (PYTHON_RESPONSE_COMPACT=1),
+// {"fields": [...], "rows": [[...], ...]}, back into arrays of objects.
+
+// Must match response_encoder.COMPACT_KEYS
+const COMPACT_KEYS = ['bunga_detections', 'detections'];
+
+const isCompactRows = (value) =>
+  value !== null && typeof value === 'object' && !Array.isArray(value) &&
+  Array.isArray(value.fields) && Array.isArray(value.rows);
+
+const expandRows = ({ fields, rows }) =>
+  rows.map((row) => {
+    const item = {};
+    fields.forEach((field, i) => { item[field] = row[i]; });
+    return item;
+  });
+
+// Shallow, like response_encoder.compact_payload
+const expandCompact = (payload) => {
+  if (payload === null || typeof payload !== 'object' || Array.isArray(payload)) return payload;
+  const expanded = { ...payload };
+  for (const key of COMPACT_KEYS) {
+    if (isCompactRows(expanded[key])) expanded[key] = expandRows(expanded[key]);
+  }
+  return expanded;
+};
+
+// Every payload in a chunk of stdout (Buffer or string), in order
+const parsePythonPayloads = (output) => {
+  const buffer = Buffer.isBuffer(output) ? output : Buffer.from(String(output), 'utf8');
+  const payloads = [];
+  let offset = 0;
+
+  while (offset < buffer.length) {
+    let end = buffer.indexOf(0x0a, offset);
+    if (end === -1) end = buffer.length;
+    const line = buffer.toString('utf8', offset, end).trim();
+    offset = end + 1;
+    if (!line) continue;
+
+    if (/^\d+$/.test(line)) {
+      // Length framing: the payload is the next N bytes, newlines included
+      const length = Number(line);
+      const body = buffer.toString('utf8', offset, offset + length);
+      offset += length;
+      payloads.push(expandCompact(JSON.parse(body)));
+    } else if (line.startsWith('{')) {
+      try {
+        payloads.push(expandCompact(JSON.parse(line)));
+      } catch (e) {
+        // Not a payload (e.g. a stray log line that starts with '{')
+      }
+    }
+  }
+  return payloads;
+};
+
+// The first payload in stdout; throws when there is none
+const parsePythonOutput = (output) => {
+  const payloads = parsePythonPayloads(output);
+  if (!payloads.length) throw new Error('No JSON output from Python');
+  return payloads[0];
+};
+
+module.exports = { COMPACT_KEYS, expandCompact, parsePythonPayloads, parsePythonOutput };
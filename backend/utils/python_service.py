@@ -13,7 +13,12 @@ import sys
 import cv2
 import numpy as np
 from pathlib import Path
-from ultralytics import YOLO
+from model_cache import open_yolo
+from detection_postprocess import get_schema, extract_detections, best_detection
+from image_io import read_image_reduced, letterbox
+import response_encoder
+import precision_policy
+import predict_disease
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import traceback
@@ -24,6 +29,10 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
 # Global model cache
 MODEL_CACHE = {}
+# Class schemas compiled once per loaded model (see detection_postprocess)
+MODEL_SCHEMAS = {}
+# Inference precision per loaded model (see precision_policy)
+MODEL_PRECISION = {}
 
 def load_models():
     """Load models once at startup"""
@@ -40,7 +49,11 @@ def load_models():
         
         if bunga_model_path.exists():
             print(f"📦 Loading bunga model...", file=sys.stderr)
-            MODEL_CACHE['bunga'] = YOLO(str(bunga_model_path))
+            MODEL_CACHE['bunga'] = open_yolo(str(bunga_model_path))
+            MODEL_SCHEMAS['bunga'] = get_schema(MODEL_CACHE['bunga'].names)
+            MODEL_PRECISION['bunga'] = precision_policy.policy_for(
+                'bunga', MODEL_CACHE['bunga'], bunga_model_path, imgsz=640, benchmark_missing=True
+            )
             print(f"✅ Bunga model loaded successfully", file=sys.stderr)
         else:
             print(f"❌ Bunga model NOT found at {bunga_model_path}", file=sys.stderr)
@@ -55,6 +68,14 @@ def load_models():
     except Exception as e:
         print(f"❌ Error loading models: {str(e)}", file=sys.stderr)
         traceback.print_exc()
+    
+    try:
+        # sklearn disease model: loaded once here (memory-mapped) and reused by /predict/disease
+        predict_disease.get_predictor()
+        MODEL_CACHE['disease'] = True
+        print(f"✅ Disease model loaded successfully", file=sys.stderr)
+    except Exception as e:
+        print(f"⚠️ Disease model not loaded: {str(e)}", file=sys.stderr)
 
 def predict_bunga_ripeness_with_objects(image_path):
     """
@@ -73,7 +94,8 @@ def predict_bunga_ripeness_with_objects(image_path):
             }
         
         # Read image
-        img = cv2.imread(image_path)
+        # Decode only as much of the JPEG as the 640px model input needs
+        img, orig_size = read_image_reduced(image_path, max_side=640)
         if img is None:
             return {
                 "success": False,
@@ -85,12 +107,13 @@ def predict_bunga_ripeness_with_objects(image_path):
                 "image_size": [0, 0]
             }
         
-        img_height, img_width = img.shape[:2]
+        img_width, img_height = orig_size
         
         print(f"🤖 Running inference on {image_path}...", file=sys.stderr)
         
         # Use cached model for inference
-        results = MODEL_CACHE['bunga'].predict(image_path, conf=0.25, verbose=False, half=True)
+        frame = letterbox(img, 640, orig_size=orig_size)
+        results = MODEL_PRECISION['bunga'].predict(MODEL_CACHE['bunga'], frame.image, conf=0.25, verbose=False, imgsz=frame.size)
         result = results[0]
         
         bunga_detections = []
@@ -98,33 +121,12 @@ def predict_bunga_ripeness_with_objects(image_path):
         best_ripeness = None
         
         # Process detections
-        if result.boxes is not None and len(result.boxes) > 0:
-            for detection in result.boxes:
-                conf = float(detection.conf[0])
-                cls = int(detection.cls[0])
-                class_name = result.names[cls]
-                
-                try:
-                    bbox_tensor = detection.xyxy[0]
-                    px1, py1, px2, py2 = int(bbox_tensor[0]), int(bbox_tensor[1]), int(bbox_tensor[2]), int(bbox_tensor[3])
-                except:
-                    norm_coords = detection.xyxyn[0]
-                    x1, y1, x2, y2 = float(norm_coords[0]), float(norm_coords[1]), float(norm_coords[2]), float(norm_coords[3])
-                    px1, py1, px2, py2 = int(x1 * img_width), int(y1 * img_height), int(x2 * img_width), int(y2 * img_height)
-                
-                center_x = (px1 + px2) / 2
-                center_y = (py1 + py2) / 2
-                
-                bunga_detections.append({
-                    "class": class_name,
-                    "confidence": round(conf, 4),
-                    "bbox": [px1, py1, px2, py2],
-                    "center": [round(center_x, 2), round(center_y, 2)]
-                })
-                
-                if conf > max_confidence:
-                    max_confidence = conf
-                    best_ripeness = class_name
+        detections = extract_detections(result, MODEL_SCHEMAS.get('bunga'), letterbox=frame)
+        if detections:
+            bunga_detections = [det.bunga_dict() for det in detections]
+            best = best_detection(detections)
+            max_confidence = best.confidence
+            best_ripeness = best.class_name
             
             print(f"✅ Result: {best_ripeness} ({max_confidence:.2f} confidence)", file=sys.stderr)
         else:
@@ -153,27 +155,39 @@ def predict_bunga_ripeness_with_objects(image_path):
             "image_size": [0, 0]
         }
 
+# Constant error bodies are encoded once instead of per request
+_NOT_FOUND_BODY = response_encoder.dumps({"error": "Not found"})
+_IMAGE_NOT_FOUND_BODY = response_encoder.dumps({"error": "Image not found"})
+
+
 class PredictionHandler(BaseHTTPRequestHandler):
     """HTTP handler for prediction requests"""
     
+    def _send_json(self, status, payload):
+        """Send a JSON response. `payload` may be a dict or already-encoded bytes."""
+        body = payload if isinstance(payload, bytes) else response_encoder.dumps(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _health(self):
+        return {
+            "status": "ok",
+            "models_loaded": list(MODEL_CACHE.keys()),
+            "precision": precision_policy.summary()
+        }
+    
     def do_GET(self):
         """Handle GET requests"""
         parsed_url = urlparse(self.path)
         path = parsed_url.path
         
         if path == '/health':
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({
-                "status": "ok",
-                "models_loaded": list(MODEL_CACHE.keys())
-            }).encode())
+            self._send_json(200, self._health())
         else:
-            self.send_response(404)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "Not found"}).encode())
+            self._send_json(404, _NOT_FOUND_BODY)
     
     def do_POST(self):
         """Handle POST requests"""
@@ -197,42 +211,41 @@ class PredictionHandler(BaseHTTPRequestHandler):
                 
                 if not image_path or not os.path.exists(image_path):
                     print(f"❌ Image not found: {image_path}", file=sys.stderr)
-                    self.send_response(400)
-                    self.send_header('Content-Type', 'application/json')
-                    self.end_headers()
-                    self.wfile.write(json.dumps({"error": "Image not found"}).encode())
+                    self._send_json(400, _IMAGE_NOT_FOUND_BODY)
                     return
                 
                 result = predict_bunga_ripeness_with_objects(image_path)
+                if data.get('compact'):
+                    result = response_encoder.compact_payload(result)
+                self._send_json(200, result)
+            
+            elif path == '/predict/disease':
+                # Expect JSON with image_path or image_paths (batch)
+                data = json.loads(body.decode('utf-8'))
+                image_paths = data.get('image_paths') or [data.get('image_path')]
+                
+                if not all(p and os.path.exists(p) for p in image_paths):
+                    print(f"❌ Image not found: {image_paths}", file=sys.stderr)
+                    self._send_json(400, _IMAGE_NOT_FOUND_BODY)
+                    return
                 
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(result).encode())
+                results = predict_disease.predict_disease_batch(image_paths)
+                if 'image_paths' in data:
+                    self._send_json(200, {"success": True, "results": results})
+                else:
+                    self._send_json(200, results[0])
             
             elif path == '/health':
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "status": "ok",
-                    "models_loaded": list(MODEL_CACHE.keys())
-                }).encode())
+                self._send_json(200, self._health())
             
             else:
                 print(f"❌ Unknown path: {path}", file=sys.stderr)
-                self.send_response(404)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": f"Path {path} not found. Use /predict/bunga or /health"}).encode())
+                self._send_json(404, {"error": f"Path {path} not found. Use /predict/bunga, /predict/disease or /health"})
         
         except Exception as e:
             print(f"❌ Handler error: {str(e)}", file=sys.stderr)
             traceback.print_exc()
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
+            self._send_json(500, {"error": str(e)})
     
     def log_message(self, format, *args):
         """Suppress default logging"""
@@ -0,0 +1,123 @@
+"""
+Shared JSON response encoder for the Python entry points.
+
+- Uses orjson when it is installed, falling back to a compact json.dumps.
+- Framing: one payload per line (default) or a byte-length prefix line
+  followed by the payload (PYTHON_RESPONSE_FRAMING=length).
+- claim_stdout() points file descriptor 1 at stderr, so library chatter can
+  never end up mixed with payloads; emit() writes to the saved original stdout.
+- Compact mode (PYTHON_RESPONSE_COMPACT=1) sends large detection
+  lists as {"fields": [...], "rows": [[...], ...]} instead of a list of objects.
+"""
+import os
+import sys
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FRAMING_ENV = 'PYTHON_RESPONSE_FRAMING'
+COMPACT_ENV = 'PYTHON_RESPONSE_COMPACT'
+# Detection lists that are worth sending as array-of-arrays
+COMPACT_KEYS = ('bunga_detections', 'detections')
+
+_payload_fd = None
+
+
+def _default(obj):
+    # NumPy scalars and arrays (np.mean, np.float32, ...) that slipped into a payload
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(payload):
+        """Encode a payload to UTF-8 JSON bytes."""
+        return orjson.dumps(payload, default=_default, option=_ORJSON_OPTIONS)
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=_default)
+
+    def dumps(payload):
+        """Encode a payload to UTF-8 JSON bytes."""
+        return _encoder.encode(payload).encode('utf-8')
+
+
+def compact_enabled(requested=None):
+    if requested is not None:
+        return bool(requested)
+    return os.environ.get(COMPACT_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def compact_rows(items):
+    """
+    Turn a list of dicts with the same keys into {"fields": [...], "rows": [[...]]}.
+    Lists whose entries do not share one key set are returned unchanged.
+    """
+    if not items or not isinstance(items[0], dict):
+        return items
+    fields = list(items[0].keys())
+    field_set = set(fields)
+    if any(not isinstance(item, dict) or item.keys() != field_set for item in items):
+        return items
+    return {"fields": fields, "rows": [[item[f] for f in fields] for item in items]}
+
+
+def compact_payload(payload):
+    """Shallow copy of `payload` with its detection lists in array-of-arrays form."""
+    if not isinstance(payload, dict):
+        return payload
+    compacted = dict(payload)
+    for key in COMPACT_KEYS:
+        value = compacted.get(key)
+        if isinstance(value, list) and value:
+            compacted[key] = compact_rows(value)
+    return compacted
+
+
+def frame(body, framing=None):
+    """Wrap encoded bytes in the configured framing."""
+    framing = framing or os.environ.get(FRAMING_ENV, 'newline')
+    if framing == 'length':
+        return b"%d\n" % len(body) + body
+    return body + b"\n"
+
+
+def encode(payload, compact=None, framing=None):
+    """Encode and frame a payload, ready to be written to a pipe or socket."""
+    if compact_enabled(compact):
+        payload = compact_payload(payload)
+    return frame(dumps(payload), framing)
+
+
+def claim_stdout():
+    """
+    Reserve the real stdout for payloads.
+    Everything printed afterwards - by us, ultralytics, torch or C extensions -
+    goes to stderr instead. Safe to call more than once.
+    """
+    global _payload_fd
+    if _payload_fd is not None:
+        return
+    sys.stdout.flush()
+    _payload_fd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+
+def emit(payload, compact=None, framing=None):
+    """Write one framed payload to the payload stream (the original stdout)."""
+    data = encode(payload, compact, framing)
+    fd = _payload_fd if _payload_fd is not None else sys.stdout.fileno()
+    if _payload_fd is None:
+        sys.stdout.flush()
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
@@ -0,0 +1,177 @@
+"""
+Memory-mapped safetensors weights for the YOLO and ResNet50 models.
+
+convert_weights.py writes <name>.safetensors next to best.pt / the ResNet50
+.pth. Loading maps the file copy-on-write (np.memmap mode 'c') and wraps
+each tensor around the mapping without copying. Until a tensor is
+written to, its pages stay in the OS page cache and every process that
+loads the same file shares them. A second load is little more than
+reading the JSON header.
+
+The file layout is the standard safetensors one: an 8-byte little-endian
+header length, a JSON header (dtype, shape, data_offsets per tensor plus
+a "__metadata__" str->str map), then the raw row-major data. It can be
+read by the safetensors package, and this module does not need it.
+
+4-D tensors listed in the "channels_last" metadata entry are stored
+NHWC and come back as NCHW views with channels_last strides. Models
+converted with memory_format=channels_last then need no copy either.
+
+MODEL_WEIGHTS_BACKEND picks the format: 'auto' (default) uses the
+.safetensors file when it exists and is at least as new as the original,
+'safetensors' requires it, and 'torch' always loads the original.
+"""
+import os
+import json
+import struct
+import numpy as np
+from pathlib import Path
+
+SUFFIX = '.safetensors'
+ARCH_SUFFIX = '.arch.yaml'
+MODEL_BACKEND = os.environ.get('MODEL_WEIGHTS_BACKEND', 'auto').strip().lower()
+
+# safetensors dtype -> numpy dtype used to view the raw bytes
+_NUMPY_DTYPES = {
+    'F64': np.float64, 'F32': np.float32, 'F16': np.float16,
+    'BF16': np.int16,  # no numpy bfloat16: viewed as int16, reinterpreted by torch
+    'I64': np.int64, 'I32': np.int32, 'I16': np.int16, 'I8': np.int8,
+    'U8': np.uint8, 'BOOL': np.bool_
+}
+
+
+def converted_path(original_path):
+    """Where convert_weights.py puts the safetensors copy of `original_path`."""
+    return Path(original_path).with_suffix(SUFFIX)
+
+
+def resolve(original_path):
+    """
+    Return the .safetensors path to load instead of `original_path`, or None
+    to load the original. Raises FileNotFoundError if MODEL_WEIGHTS_BACKEND is
+    'safetensors' and there is no converted file.
+    """
+    original_path = Path(original_path)
+    if original_path.suffix == SUFFIX:
+        return original_path
+    if MODEL_BACKEND == 'torch':
+        return None
+
+    converted = converted_path(original_path)
+    if MODEL_BACKEND == 'safetensors':
+        if not converted.exists():
+            raise FileNotFoundError(f"No converted weights at {converted} (run convert_weights.py)")
+        return converted
+    if converted.exists() and (
+        not original_path.exists() or converted.stat().st_mtime >= original_path.stat().st_mtime
+    ):
+        return converted
+    return None
+
+
+def _torch_dtypes():
+    import torch
+    return {
+        torch.float64: 'F64', torch.float32: 'F32', torch.float16: 'F16', torch.bfloat16: 'BF16',
+        torch.int64: 'I64', torch.int32: 'I32', torch.int16: 'I16', torch.int8: 'I8',
+        torch.uint8: 'U8', torch.bool: 'BOOL'
+    }
+
+
+def save_file(tensors, path, metadata=None, channels_last=()):
+    """
+    Write `tensors` (name -> torch tensor) to `path` in safetensors format.
+    Names in `channels_last` (4-D tensors) are stored NHWC. The file is
+    written to a temp name and renamed, so readers never see a partial file.
+    """
+    import torch
+    dtype_names = _torch_dtypes()
+    metadata = {str(k): str(v) for k, v in (metadata or {}).items()}
+    channels_last = sorted(name for name in channels_last if tensors[name].dim() == 4)
+    if channels_last:
+        metadata['channels_last'] = json.dumps(channels_last)
+
+    # Widest dtypes first (as the safetensors library does) so every tensor is aligned
+    names = sorted(tensors, key=lambda name: (-tensors[name].element_size(), name))
+    header, blobs, offset = {}, [], 0
+    for name in names:
+        tensor = tensors[name].detach().cpu()
+        if name in channels_last:
+            tensor = tensor.permute(0, 2, 3, 1)
+        tensor = tensor.contiguous()
+        if tensor.dtype not in dtype_names:
+            raise ValueError(f"Unsupported dtype {tensor.dtype} for {name}")
+        raw = (tensor.view(torch.int16) if tensor.dtype == torch.bfloat16 else tensor).numpy().tobytes()
+        header[name] = {
+            'dtype': dtype_names[tensor.dtype],
+            'shape': list(tensor.shape),
+            'data_offsets': [offset, offset + len(raw)]
+        }
+        blobs.append(raw)
+        offset += len(raw)
+    if metadata:
+        header['__metadata__'] = metadata
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad with spaces so the data section starts 8-byte aligned
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for raw in blobs:
+            f.write(raw)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path):
+    """Return (tensor entries, metadata, data start offset) without touching the data."""
+    with open(path, 'rb') as f:
+        (length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(length).decode('utf-8'))
+    metadata = header.pop('__metadata__', {}) or {}
+    return header, metadata, 8 + length
+
+
+def read_metadata(path):
+    return read_header(path)[1]
+
+
+def load_file(path):
+    """
+    Map `path` and return (state_dict, metadata). Tensors share memory with
+    the mapping; writing to one copies only the touched pages (copy-on-write).
+    """
+    import torch
+    entries, metadata, data_start = read_header(path)
+    channels_last = set(json.loads(metadata.get('channels_last', '[]')))
+    mapped = np.memmap(path, dtype=np.uint8, mode='c') if entries else None
+
+    state_dict = {}
+    for name, entry in entries.items():
+        begin, end = entry['data_offsets']
+        array = mapped[data_start + begin:data_start + end].view(_NUMPY_DTYPES[entry['dtype']])
+        tensor = torch.from_numpy(array.reshape(entry['shape']))
+        if entry['dtype'] == 'BF16':
+            tensor = tensor.view(torch.bfloat16)
+        if name in channels_last:
+            # NHWC bytes -> NCHW view with channels_last strides
+            tensor = tensor.permute(0, 3, 1, 2)
+        state_dict[name] = tensor
+    return state_dict, metadata
+
+
+def supports_assign():
+    """load_state_dict(assign=True) (torch >= 2.1) keeps the mapped tensors instead of copying."""
+    import inspect
+    import torch
+    return 'assign' in inspect.signature(torch.nn.Module.load_state_dict).parameters
+
+
+def assign_state_dict(module, state_dict):
+    """Load `state_dict` into `module`, sharing the mapped storage where torch allows it."""
+    if supports_assign():
+        return module.load_state_dict(state_dict, assign=True)
+    return module.load_state_dict(state_dict)
@@ -0,0 +1,89 @@
+"""
+Client side of the predictor fork server (predict_zygote.py).
+
+Predictor scripts call delegate(__file__) first thing in __main__. If a
+zygote is listening for this directory, the script's stdin/stdout/stderr
+file descriptors, argv, environment and cwd are handed over the Unix
+socket. A forked child of the zygote, with torch and the models already
+loaded, then runs the script and writes straight to our stdout. We only
+wait for its exit code and exit with it, so Node's spawn() sees the same
+process output as before.
+
+If no zygote is running (or PREDICT_ZYGOTE=0), delegate() returns and the
+script runs normally.
+"""
+import os
+import sys
+import json
+import socket
+import struct
+import hashlib
+import tempfile
+
+ENV_SOCKET = 'PREDICT_ZYGOTE_SOCKET'
+ENV_ENABLED = 'PREDICT_ZYGOTE'
+# Set in forked children so a delegated script never delegates again
+ENV_CHILD = 'PREDICT_ZYGOTE_CHILD'
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def socket_path():
+    """Socket for this utils directory (overridable with PREDICT_ZYGOTE_SOCKET)."""
+    override = os.environ.get(ENV_SOCKET)
+    if override:
+        return override
+    tag = hashlib.sha1(UTILS_DIR.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(tempfile.gettempdir(), f"pipersmart-predict-{tag}.sock")
+
+
+def supported():
+    return hasattr(os, 'fork') and hasattr(socket, 'send_fds') and hasattr(socket, 'AF_UNIX')
+
+
+def delegate(script_path):
+    """Run this invocation in the zygote if one is available; never returns in that case."""
+    if os.environ.get(ENV_CHILD) or os.environ.get(ENV_ENABLED, '1').strip().lower() in ('0', 'false', 'no', 'off'):
+        return
+    if not supported():
+        return
+    path = socket_path()
+    if not os.path.exists(path):
+        return
+
+    body = json.dumps({
+        "script": os.path.basename(script_path),
+        "argv": sys.argv[1:],
+        "cwd": os.getcwd(),
+        "env": dict(os.environ)
+    }).encode('utf-8')
+    request = struct.pack('!I', len(body)) + body
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        socket.send_fds(sock, [request], [0, 1, 2])
+    except OSError:
+        # Stale socket or zygote busy restarting - run locally instead
+        sock.close()
+        return
+
+    # From here on the child owns our stdout; a failure can no longer fall back.
+    # Keep the connection open: the zygote kills the child if we go away.
+    reply = b''
+    try:
+        while not reply.endswith(b'\n'):
+            chunk = sock.recv(64)
+            if not chunk:
+                break
+            reply += chunk
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+    try:
+        code = int(reply.strip())
+    except ValueError:
+        print("❌ Prediction zygote closed the connection without an exit code", file=sys.stderr)
+        code = 1
+    os._exit(code)
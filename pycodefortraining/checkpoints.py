@@ -0,0 +1,122 @@
+"""
+Full training checkpoints for leaf_trainer: resume a pre-empted run exactly.
+
+A checkpoint holds everything the epoch loop depends on: model, optimizer,
+ReduceLROnPlateau and GradScaler (--perf) state, the last completed epoch,
+history, best val loss, elapsed training time, and the python / numpy /
+torch / CUDA RNG states plus the train loader's shuffle generator. A
+resumed run therefore sees the same batch order, and with --workers 0 the
+same augmentations. Worker processes keep their own RNG, which cannot be
+captured, so with workers > 0 the random augmentations after a resume
+differ from an uninterrupted run.
+
+Files are <checkpoint_dir>/epoch_<NNN>.ckpt. Each is written to a
+temporary file, fsynced and renamed into place, so a kill mid-write
+leaves the previous checkpoint intact. Only the newest `keep` are kept.
+"""
+import os
+import re
+import glob
+import random
+import numpy as np
+import torch
+
+CHECKPOINT_PATTERN = re.compile(r'epoch_(\d+)\.ckpt$')
+
+
+def checkpoint_path(checkpoint_dir, epoch):
+    return os.path.join(checkpoint_dir, f"epoch_{epoch:03d}.ckpt")
+
+
+def list_checkpoints(checkpoint_dir):
+    """[(epoch, path)] sorted oldest first."""
+    found = []
+    for path in glob.glob(os.path.join(checkpoint_dir, 'epoch_*.ckpt')):
+        match = CHECKPOINT_PATTERN.search(path)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def latest_checkpoint(checkpoint_dir):
+    found = list_checkpoints(checkpoint_dir)
+    return found[-1][1] if found else None
+
+
+def rng_state():
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def save_checkpoint(path, state):
+    """Atomic torch.save: temp file, fsync, rename."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def prune(checkpoint_dir, keep):
+    """Delete all but the newest `keep` checkpoints (keep <= 0 keeps everything)."""
+    if keep <= 0:
+        return
+    for _, path in list_checkpoints(checkpoint_dir)[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_checkpoint(path):
+    # Not weights_only: the state carries optimizer/scheduler dicts and RNG tuples
+    return torch.load(path, map_location='cpu', weights_only=False)
+
+
+def capture(epoch, model, optimizer, scheduler, history, best_val_loss, elapsed, task,
+            scaler=None, shuffle_generator=None):
+    state = {
+        'epoch': epoch,
+        'task': task,
+        'model': model.state_dict(),
+        'optimizer': optimizer.state_dict(),
+        'scheduler': scheduler.state_dict(),
+        'history': history,
+        'best_val_loss': best_val_loss,
+        'elapsed': elapsed,
+        'rng': rng_state()
+    }
+    if scaler is not None:
+        state['scaler'] = scaler.state_dict()
+    if shuffle_generator is not None:
+        state['shuffle_rng'] = shuffle_generator.get_state()
+    return state
+
+
+def restore(state, model, optimizer, scheduler, scaler=None, shuffle_generator=None):
+    """Load a captured state into the live objects. Returns (epoch, history, best_val_loss, elapsed)."""
+    model.load_state_dict(state['model'])
+    optimizer.load_state_dict(state['optimizer'])
+    scheduler.load_state_dict(state['scheduler'])
+    if scaler is not None and 'scaler' in state:
+        scaler.load_state_dict(state['scaler'])
+    if shuffle_generator is not None and 'shuffle_rng' in state:
+        shuffle_generator.set_state(state['shuffle_rng'])
+    set_rng_state(state['rng'])
+    return state['epoch'], state['history'], state['best_val_loss'], state['elapsed']
@@ -0,0 +1,247 @@
+"""
+Pre-decoded, memory-mapped image cache for the leaf disease datasets.
+
+prepare() decodes every image under <dataset>/{train,val,test}/<class>/
+once, at full resolution, and shrinks it so its short side is base_size.
+The aspect ratio is kept and nothing is cropped. Images whose short side
+is already base_size or less are stored as they are. Each split becomes
+one ragged uint8 shard:
+- <cache>/<split>_images.npy: every image's RGB bytes back to back;
+- <split>_offsets.npy: the start of each image;
+- <split>_shapes.npy: each image's (height, width);
+- <split>_labels.npy: the labels;
+- <split>_index.json: the classes, source paths and a fingerprint of the source files.
+
+MemmapImageDataset reads samples straight from the shard. Each DataLoader
+worker maps the file itself and shares the page cache, so an epoch costs
+no JPEG decoding.
+
+What the transforms see compared with decoding the JPEG every epoch:
+- Resize(base_size) + CenterCrop (the 'center_crop' eval transform with
+  the default base_size 256): the same pixels. The stored image already is
+  the Resize output (same PIL bilinear filter), so Resize is a no-op.
+- Resize((224, 224)) (the 'square' eval tasks): the stored image is
+  resampled a second time, so pixels differ slightly from one resize of
+  the original.
+- Training augmentation: RandomResizedCrop, flips, rotation and jitter
+  draw the same crop geometry relative to the image (the full frame and
+  aspect ratio are kept). But crops of large photos are resampled from the
+  base_size copy instead of the original pixels, so they are softer.
+Training from the cache is therefore close to, not identical with,
+training from the JPEGs.
+
+Usage:
+    python dataset_cache.py --task unified_pepper_diseases
+    python dataset_cache.py --dataset-path DIR --cache-dir DIR --size 256
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import datasets
+
+SPLITS = ('train', 'val', 'test')
+# 2: ragged aspect-preserving storage (1 was cropped/squashed, draft-decoded squares)
+FORMAT_VERSION = 2
+CACHE_DIRNAME = '.memmap_cache'
+
+
+def default_cache_dir(dataset_path, base_size):
+    return os.path.join(dataset_path, CACHE_DIRNAME, f"short{base_size}")
+
+
+def _fingerprint(samples):
+    """Hash of paths, sizes and mtimes: changes when any source image changes."""
+    digest = hashlib.sha1()
+    for path, label in samples:
+        stat = os.stat(path)
+        digest.update(f"{path}|{label}|{stat.st_size}|{int(stat.st_mtime)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def stored_size(width, height, base_size):
+    """(width, height) an image is stored at: short side base_size, never enlarged."""
+    scale = base_size / min(width, height)
+    if scale >= 1:
+        return width, height
+    # Same rounding as torchvision's Resize(base_size)
+    if width <= height:
+        return base_size, int(base_size * height / width)
+    return int(base_size * width / height), base_size
+
+
+def load_image(path, base_size):
+    """Decode one image to an (H, W, 3) uint8 RGB array with its short side at most base_size."""
+    with Image.open(path) as img:
+        # Full decode (no JPEG draft), as ImageFolder's loader does
+        img = img.convert('RGB')
+        size = stored_size(img.width, img.height, base_size)
+        if size != img.size:
+            img = img.resize(size, Image.BILINEAR)
+        return np.asarray(img, dtype=np.uint8)
+
+
+def _index_path(cache_dir, split):
+    return os.path.join(cache_dir, f"{split}_index.json")
+
+
+def is_prepared(dataset_path, cache_dir, base_size, splits=SPLITS):
+    for split in splits:
+        try:
+            with open(_index_path(cache_dir, split)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        samples = datasets.ImageFolder(os.path.join(dataset_path, split)).samples
+        if (index.get('format_version') != FORMAT_VERSION or index.get('base_size') != base_size
+                or index.get('fingerprint') != _fingerprint(samples)):
+            return False
+    return True
+
+
+def prepare_split(dataset_path, cache_dir, split, base_size=256, workers=None):
+    """Decode one split into the <split>_* shard files listed in the module docstring."""
+    folder = datasets.ImageFolder(os.path.join(dataset_path, split))
+    samples = folder.samples
+    n = len(samples)
+
+    # Stored sizes come from the headers, so the shard can be allocated before decoding
+    shapes = np.zeros((n, 2), dtype=np.int64)
+    for i, (path, _) in enumerate(samples):
+        with Image.open(path) as img:
+            width, height = stored_size(img.width, img.height, base_size)
+        shapes[i] = (height, width)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(shapes[:, 0] * shapes[:, 1] * 3, out=offsets[1:])
+
+    images_path = os.path.join(cache_dir, f"{split}_images.npy")
+    tmp_path = images_path + '.tmp'
+    images = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(int(offsets[-1]),))
+
+    def decode(i):
+        image = load_image(samples[i][0], base_size)
+        if image.shape[:2] != tuple(shapes[i]):
+            raise ValueError(f"{samples[i][0]}: decoded {image.shape[:2]}, header said {tuple(shapes[i])}")
+        images[offsets[i]:offsets[i + 1]] = image.reshape(-1)
+
+    # PIL releases the GIL while decoding and resizing, so threads scale here
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        list(pool.map(decode, range(n)))
+    images.flush()
+    del images
+    os.replace(tmp_path, images_path)
+
+    np.save(os.path.join(cache_dir, f"{split}_offsets.npy"), offsets)
+    np.save(os.path.join(cache_dir, f"{split}_shapes.npy"), shapes)
+    np.save(os.path.join(cache_dir, f"{split}_labels.npy"), np.asarray([label for _, label in samples], dtype=np.int64))
+    index = {
+        'format_version': FORMAT_VERSION,
+        'split': split,
+        'classes': folder.classes,
+        'base_size': base_size,
+        'count': n,
+        'bytes': int(offsets[-1]),
+        'paths': [os.path.relpath(path, dataset_path) for path, _ in samples],
+        'fingerprint': _fingerprint(samples)
+    }
+    # The index is written last: it marks the split as complete
+    with open(_index_path(cache_dir, split), 'w') as f:
+        json.dump(index, f)
+    return index
+
+
+def prepare(dataset_path, cache_dir=None, base_size=256, splits=SPLITS, workers=None, force=False):
+    """Build the cache for every split unless it is already up to date. Returns the cache dir."""
+    cache_dir = cache_dir or default_cache_dir(dataset_path, base_size)
+    if not force and is_prepared(dataset_path, cache_dir, base_size, splits):
+        return cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    for split in splits:
+        start = time.time()
+        index = prepare_split(dataset_path, cache_dir, split, base_size, workers)
+        print(f"✓ Cached {split}: {index['count']} images ({index['bytes'] / 1e6:.0f} MB) in {time.time() - start:.1f}s")
+    return cache_dir
+
+
+class MemmapImageDataset(Dataset):
+    """
+    ImageFolder-compatible dataset over a prepared split: returns
+    (transform(PIL image), label). The memmap is opened lazily in each
+    process so the dataset pickles cheaply to DataLoader workers.
+    """
+
+    def __init__(self, cache_dir, split, transform=None):
+        self.cache_dir = cache_dir
+        self.split = split
+        self.transform = transform
+        with open(_index_path(cache_dir, split)) as f:
+            index = json.load(f)
+        self.classes = index['classes']
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+        self.base_size = index['base_size']
+        self.paths = index['paths']
+        self.offsets = np.load(os.path.join(cache_dir, f"{split}_offsets.npy"))
+        self.shapes = np.load(os.path.join(cache_dir, f"{split}_shapes.npy"))
+        self.targets = np.load(os.path.join(cache_dir, f"{split}_labels.npy")).tolist()
+        self.rows = None
+        self._images = None
+
+    def select(self, keep):
+        """Restrict to the samples whose dataset-relative path is in `keep` ('/'-separated)."""
+        self.rows = [i for i, path in enumerate(self.paths) if path.replace(os.sep, '/') in keep]
+        labels = np.load(os.path.join(self.cache_dir, f"{self.split}_labels.npy"))
+        self.targets = labels[self.rows].tolist()
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.cache_dir, f"{self.split}_images.npy"), mmap_mode='r')
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        row = idx if self.rows is None else self.rows[idx]
+        height, width = self.shapes[row]
+        pixels = self.images[self.offsets[row]:self.offsets[row + 1]]
+        image = Image.fromarray(np.asarray(pixels).reshape(height, width, 3))
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, self.targets[idx]
+
+
+def main():
+    from leaf_trainer import TASKS, task_config
+
+    parser = argparse.ArgumentParser(description='Decode a leaf dataset once into memory-mapped shards')
+    parser.add_argument('--task', choices=sorted(TASKS), default=None, help='Use the dataset of a training task')
+    parser.add_argument('--dataset-path', default=None)
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--size', type=int, default=256, help='Stored short side in pixels')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the cache is up to date')
+    args = parser.parse_args()
+
+    dataset_path = args.dataset_path
+    if args.task:
+        dataset_path = dataset_path or task_config(args.task)['dataset_path']
+    if not dataset_path:
+        parser.error('--task or --dataset-path is required')
+
+    cache_dir = prepare(dataset_path, args.cache_dir, args.size, workers=args.workers, force=args.force)
+    print(f"✓ Cache ready: {cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Perceptual-hash deduplication for the leaf (*_organized) and YOLO datasets.
+
+Phone bursts leave many near-identical frames. They cost epoch time without
+adding information, and when a burst is split across train and val/test,
+the evaluation is optimistic. This tool:
+
+1. Hashes every image with a 64-bit DCT perceptual hash (pHash) on a
+   thread pool. The hash is the 8x8 low-frequency DCT of a 32x32
+   grayscale thumbnail, thresholded at its median.
+2. Finds all pairs within --threshold bits with a multi-probe band index.
+   The hash is cut into --bands bands and each band is a hash-table key;
+   a query also probes every key within --probe bits of its own band. Two
+   hashes within t bits share at least one band within t // bands bits, so
+   every pair with t < bands * (probe + 1) is found. Candidate pairs stay
+   near-linear instead of the n^2 of all-pairs comparison.
+3. Clusters the pairs with union-find.
+4. Reports clusters that span splits (leakage) and clusters that span
+   classes (label conflicts).
+5. Writes a pruned manifest. A leaked cluster stays only in its most
+   protected split (test > val > train), so the evaluation sets keep their
+   images and train loses the copies. Within a split and class, the
+   largest image of each cluster is kept (--keep-per-cluster).
+
+Layouts:
+    *_organized   <root>/<split>/<class>/<image>   (ImageFolder)
+    YOLO          <root>/<split>/images/<image> with labels/<stem>.txt
+
+Output (--out, default <root>/dedup_manifest.json):
+    {"root", "threshold", "keep": [relative paths], "removed": {path: kept path},
+     "leakage": [...], "label_conflicts": [...], "summary": {...}}
+For YOLO datasets it also writes <split>.txt image lists and a
+data_dedup.yaml next to the manifest; pass that to train_bunga_yolo.py --data.
+The leaf trainers take the manifest directly: --manifest dedup_manifest.json.
+
+Usage:
+    python dedup_dataset.py --task unified_pepper_diseases
+    python dedup_dataset.py --root DIR [--threshold 6] [--bands 4] [--probe 1] [--out FILE]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+SPLIT_NAMES = {'train': 'train', 'val': 'val', 'valid': 'val', 'validation': 'val', 'test': 'test'}
+# Which copy of a leaked cluster survives: the highest priority split
+SPLIT_PRIORITY = {'test': 2, 'val': 1, 'train': 0}
+HASH_BITS = 64
+
+
+# ======================== HASHING ========================
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+DCT_32 = _dct_matrix(32)
+
+
+def phash(path):
+    """(64-bit pHash, width, height) of one image."""
+    with Image.open(path) as img:
+        width, height = img.size
+        img.draft('L', (64, 64))
+        pixels = np.asarray(img.convert('L').resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    low = (DCT_32 @ pixels @ DCT_32.T)[:8, :8].ravel()
+    # The DC term only carries mean brightness; leave it out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big'), width, height
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+# ======================== INDEX ========================
+class UnionFind:
+    __slots__ = ('parent',)
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+class BandIndex:
+    """Multi-probe index over `bands` equal slices of a 64-bit hash."""
+
+    def __init__(self, bands=4, probe=1):
+        if HASH_BITS % bands:
+            raise ValueError(f"bands must divide {HASH_BITS}")
+        self.bands = bands
+        self.width = HASH_BITS // bands
+        self.mask = (1 << self.width) - 1
+        self.tables = [dict() for _ in range(bands)]
+        # XOR masks of every key within `probe` bits of a band value
+        self.flips = [0] + [
+            sum(1 << bit for bit in combo)
+            for radius in range(1, probe + 1)
+            for combo in itertools.combinations(range(self.width), radius)
+        ]
+
+    def _keys(self, value):
+        return [(value >> (band * self.width)) & self.mask for band in range(self.bands)]
+
+    def candidates(self, value):
+        found = set()
+        for table, key in zip(self.tables, self._keys(value)):
+            for flip in self.flips:
+                found.update(table.get(key ^ flip, ()))
+        return found
+
+    def add(self, item, value):
+        for table, key in zip(self.tables, self._keys(value)):
+            table.setdefault(key, []).append(item)
+
+
+def cluster(hashes, threshold, bands=4, probe=1):
+    """Union-find clusters (lists of indices, size > 1) of hashes within `threshold` bits."""
+    index = BandIndex(bands, probe)
+    uf = UnionFind(len(hashes))
+    compared = 0
+    for i, value in enumerate(hashes):
+        for j in index.candidates(value):
+            compared += 1
+            if hamming(value, hashes[j]) <= threshold:
+                uf.union(i, j)
+        index.add(i, value)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(uf.find(i), []).append(i)
+    return [members for members in groups.values() if len(members) > 1], compared
+
+
+# ======================== DATASET ========================
+def scan(root):
+    """[{path, rel, split, label}] for every image under root (ImageFolder or YOLO layout)."""
+    items = []
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMAGE_SUFFIXES:
+                continue
+            path = os.path.join(dirpath, name)
+            parts = os.path.relpath(path, root).replace(os.sep, '/').split('/')
+            if parts[0].startswith('.'):
+                continue  # .memmap_cache, .embedding_cache, ...
+            split = SPLIT_NAMES.get(parts[0].lower())
+            if 'images' in parts[:-1]:
+                label = None  # YOLO: boxes, no image-level class
+            else:
+                label = parts[-2] if len(parts) > 2 else None
+            items.append({'path': path, 'rel': '/'.join(parts), 'split': split, 'label': label})
+    return items
+
+
+def choose_keep(members, items, keep_per_cluster):
+    """Indices to keep from one cluster, and {removed: kept} for the rest."""
+    splits = {items[i]['split'] for i in members}
+    top = max(splits, key=lambda s: SPLIT_PRIORITY.get(s, -1))
+    keep, removed = [], {}
+    # Label conflicts are reported, never pruned: each class keeps its own copy
+    by_label = {}
+    for i in members:
+        if items[i]['split'] == top:
+            by_label.setdefault(items[i]['label'], []).append(i)
+    for group in by_label.values():
+        group.sort(key=lambda i: (items[i]['width'] * items[i]['height'], os.path.getsize(items[i]['path'])), reverse=True)
+        keep.extend(group[:keep_per_cluster])
+    for i in members:
+        if i not in keep:
+            same_label = [k for k in keep if items[k]['label'] == items[i]['label']] or keep
+            removed[items[i]['rel']] = items[same_label[0]]['rel']
+    return keep, removed
+
+
+def deduplicate(root, threshold=6, bands=4, probe=1, keep_per_cluster=1, workers=None):
+    start = time.time()
+    items = scan(root)
+    if not items:
+        raise ValueError(f"No images found under {root}")
+    print(f"🔍 Hashing {len(items)} images...", file=sys.stderr)
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        for item, (value, width, height) in zip(items, pool.map(lambda it: phash(it['path']), items)):
+            item.update(hash=value, width=width, height=height)
+
+    if threshold >= bands * (probe + 1):
+        print(f"⚠️ threshold {threshold} >= bands x (probe + 1) = {bands * (probe + 1)}: "
+              f"some pairs may be missed", file=sys.stderr)
+    clusters, compared = cluster([item['hash'] for item in items], threshold, bands, probe)
+
+    keep_set = set(range(len(items)))
+    removed, leakage, conflicts = {}, [], []
+    for members in clusters:
+        splits = sorted({items[i]['split'] or '' for i in members})
+        labels = sorted({items[i]['label'] for i in members if items[i]['label'] is not None})
+        entry = [items[i]['rel'] for i in members]
+        if len(splits) > 1:
+            leakage.append({'splits': splits, 'images': entry})
+        if len(labels) > 1:
+            conflicts.append({'labels': labels, 'images': entry})
+        keep, dropped = choose_keep(members, items, keep_per_cluster)
+        keep_set -= set(members) - set(keep)
+        removed.update(dropped)
+
+    per_split = {}
+    for item in items:
+        split = item['split'] or ''
+        counts = per_split.setdefault(split, {'images': 0, 'kept': 0})
+        counts['images'] += 1
+    for i in keep_set:
+        per_split[items[i]['split'] or '']['kept'] += 1
+
+    return {
+        'root': os.path.abspath(root),
+        'threshold': threshold,
+        'bands': bands,
+        'probe': probe,
+        'keep': sorted(items[i]['rel'] for i in keep_set),
+        'removed': removed,
+        'leakage': leakage,
+        'label_conflicts': conflicts,
+        'summary': {
+            'images': len(items),
+            'kept': len(keep_set),
+            'removed': len(removed),
+            'clusters': len(clusters),
+            'leaked_clusters': len(leakage),
+            'label_conflicts': len(conflicts),
+            'splits': per_split,
+            'pairs_compared': compared,
+            'seconds': round(time.time() - start, 1)
+        }
+    }
+
+
+def write_yolo_lists(manifest, out_dir, data_yaml=None):
+    """<split>.txt image lists plus data_dedup.yaml (classes copied from data.yaml)."""
+    import yaml
+
+    root = manifest['root']
+    lists = {}
+    for rel in manifest['keep']:
+        split = SPLIT_NAMES.get(rel.split('/')[0].lower())
+        if split:
+            lists.setdefault(split, []).append(os.path.join(root, *rel.split('/')))
+    config = {}
+    data_yaml = data_yaml or os.path.join(root, 'data.yaml')
+    if os.path.exists(data_yaml):
+        with open(data_yaml) as f:
+            config = yaml.safe_load(f) or {}
+    config.pop('path', None)
+    for split, paths in lists.items():
+        list_path = os.path.join(out_dir, f"{split}.txt")
+        with open(list_path, 'w') as f:
+            f.write('\n'.join(paths) + '\n')
+        config[split] = os.path.abspath(list_path)
+    yaml_path = os.path.join(out_dir, 'data_dedup.yaml')
+    with open(yaml_path, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return yaml_path
+
+
+def load_manifest(path):
+    """The set of kept paths (relative to the dataset root, '/'-separated)."""
+    with open(path) as f:
+        return set(json.load(f)['keep'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate images and write a pruned manifest')
+    parser.add_argument('--task', default=None, help='Use the dataset of a leaf_trainer task')
+    parser.add_argument('--root', default=None, help='Dataset root (ImageFolder or YOLO layout)')
+    parser.add_argument('--threshold', type=int, default=6, help='Max Hamming distance between duplicates (of 64 bits)')
+    parser.add_argument('--bands', type=int, choices=(2, 4, 8, 16), default=4)
+    parser.add_argument('--probe', type=int, default=1, help='Bits flipped per band when probing')
+    parser.add_argument('--keep-per-cluster', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=None, help='Manifest path (default <root>/dedup_manifest.json)')
+    args = parser.parse_args()
+
+    root = args.root
+    if args.task:
+        from leaf_trainer import task_config
+        root = root or task_config(args.task)['dataset_path']
+    if not root:
+        parser.error('--task or --root is required')
+
+    try:
+        manifest = deduplicate(root, args.threshold, args.bands, args.probe, args.keep_per_cluster, args.workers)
+    except Exception as e:
+        print(json.dumps({'success': False, 'error': str(e)}))
+        return 1
+
+    out = args.out or os.path.join(root, 'dedup_manifest.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    summary = manifest['summary']
+    print(f"✅ {summary['images']} images, {summary['clusters']} duplicate clusters, "
+          f"{summary['removed']} pruned, {summary['leaked_clusters']} leaked across splits "
+          f"({summary['pairs_compared']} pairs compared in {summary['seconds']}s)", file=sys.stderr)
+
+    result = {'success': True, 'manifest': os.path.abspath(out), 'summary': summary}
+    if any(rel.split('/')[1:2] == ['images'] for rel in manifest['keep']):
+        result['data_yaml'] = write_yolo_lists(manifest, os.path.dirname(os.path.abspath(out)))
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Multi-process data-parallel training for leaf_trainer.
+
+Each process (rank) holds a full model replica, trains on its own shard of
+every batch and averages gradients with an all-reduce (DistributedDataParallel).
+The default backend is gloo, which runs on CPU-only machines. Only rank 0
+prints, saves the model, writes checkpoints and writes the metrics and plot.
+
+--batch-size stays the global batch: every rank gets batch_size / world_size.
+--workers is the DataLoader worker count per node, split between the local
+ranks. The cores are split between them too.
+
+One node, 4 processes:
+    python distributed.py footrot --nproc-per-node 4 -- --epochs 20
+
+Several nodes (run on each, same master address/port):
+    python distributed.py unified_pepper_diseases --nnodes 2 --node-rank 0 \\
+        --nproc-per-node 8 --master-addr 10.0.0.5 -- --checkpoint-every 1
+
+torchrun sets the same environment, so this also works:
+    torchrun --nproc-per-node 4 train_footrot.py
+"""
+import os
+import sys
+import math
+import argparse
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+
+
+def world_size():
+    return int(os.environ.get('WORLD_SIZE', 1))
+
+
+def is_enabled():
+    return dist.is_available() and dist.is_initialized()
+
+
+def setup(cfg):
+    """
+    Join the process group when launched with WORLD_SIZE > 1.
+    Returns (rank, world_size, local_rank). Adjusts cfg batch_size/workers per rank.
+    """
+    if world_size() <= 1:
+        return 0, 1, 0
+    dist.init_process_group(cfg['dist_backend'])
+    rank, size = dist.get_rank(), dist.get_world_size()
+    local_rank = int(os.environ.get('LOCAL_RANK', 0))
+    local_size = int(os.environ.get('LOCAL_WORLD_SIZE', size))
+
+    cfg['batch_size'] = max(1, cfg['batch_size'] // size)
+    cfg['workers'] = cfg['workers'] // local_size
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_size))
+    if torch.cuda.is_available():
+        torch.cuda.set_device(local_rank % torch.cuda.device_count())
+    if rank != 0:
+        sys.stdout = open(os.devnull, 'w')
+    print(f"🌐 Distributed: {size} processes ({cfg['dist_backend']}), "
+          f"{cfg['batch_size']} images x {cfg['workers']} workers per rank")
+    return rank, size, local_rank
+
+
+def cleanup():
+    if is_enabled():
+        dist.destroy_process_group()
+
+
+def broadcast_seed(generator):
+    """Seed `generator` identically on every rank from a value drawn on rank 0."""
+    seed = torch.tensor([torch.randint(2 ** 62, (1,), generator=generator).item()], dtype=torch.int64)
+    if dist.get_backend() == 'nccl':
+        seed = seed.cuda()
+    dist.broadcast(seed, src=0)
+    generator.manual_seed(int(seed.item()))
+
+
+def all_reduce_sums(values, device):
+    """Sum a list of numbers over all ranks (identity when not distributed)."""
+    if not is_enabled():
+        return values
+    target = device if dist.get_backend() == 'nccl' else torch.device('cpu')
+    totals = torch.tensor([float(v) for v in values], dtype=torch.float64, device=target)
+    dist.all_reduce(totals)
+    return totals.tolist()
+
+
+class ShardedShuffleSampler(Sampler):
+    """
+    Every rank draws the same permutation from a shared generator and takes
+    every world_size-th index. The list is padded by wrapping around so the
+    ranks run the same number of steps. Checkpointing the generator replays
+    the order, as the single-process shuffle does.
+    """
+
+    def __init__(self, dataset, rank, world, generator):
+        self.n = len(dataset)
+        self.rank, self.world = rank, world
+        self.generator = generator
+        self.num_samples = math.ceil(self.n / world)
+
+    def __iter__(self):
+        order = torch.randperm(self.n, generator=self.generator).tolist()
+        total = self.num_samples * self.world
+        order += order[:total - len(order)]
+        return iter(order[self.rank:total:self.world])
+
+    def __len__(self):
+        return self.num_samples
+
+
+class ShardSampler(Sampler):
+    """In-order, unpadded shard for evaluation: each sample is seen once across ranks."""
+
+    def __init__(self, dataset, rank, world):
+        self.indices = list(range(rank, len(dataset), world))
+
+    def __iter__(self):
+        return iter(self.indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+
+def _worker(local_rank, task, argv, nproc, node_rank, nnodes):
+    os.environ.update({
+        'RANK': str(node_rank * nproc + local_rank),
+        'LOCAL_RANK': str(local_rank),
+        'WORLD_SIZE': str(nproc * nnodes),
+        'LOCAL_WORLD_SIZE': str(nproc)
+    })
+    from leaf_trainer import main
+    main(task, argv)
+
+
+def main():
+    from leaf_trainer import TASKS
+
+    parser = argparse.ArgumentParser(description='Launch data-parallel leaf classifier training')
+    parser.add_argument('task', choices=sorted(TASKS))
+    parser.add_argument('--nproc-per-node', type=int, default=None, help='Processes on this node (default: cores // 4)')
+    parser.add_argument('--nnodes', type=int, default=1)
+    parser.add_argument('--node-rank', type=int, default=0)
+    parser.add_argument('--master-addr', default='127.0.0.1')
+    parser.add_argument('--master-port', default='29500')
+    parser.add_argument('train_args', nargs=argparse.REMAINDER, help='-- followed by leaf_trainer options')
+    args = parser.parse_args()
+
+    train_args = args.train_args[1:] if args.train_args[:1] == ['--'] else args.train_args
+    nproc = args.nproc_per_node or max(1, (os.cpu_count() or 1) // 4)
+    os.environ['MASTER_ADDR'] = args.master_addr
+    os.environ['MASTER_PORT'] = str(args.master_port)
+    print(f"🚀 Launching {nproc} process(es) on node {args.node_rank}/{args.nnodes} "
+          f"(master {args.master_addr}:{args.master_port})")
+    torch.multiprocessing.spawn(_worker, args=(args.task, train_args, nproc, args.node_rank, args.nnodes), nprocs=nproc)
+
+
+if __name__ == '__main__':
+    main()
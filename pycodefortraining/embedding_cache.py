@@ -0,0 +1,223 @@
+"""
+Head-only training on cached frozen-backbone embeddings.
+
+With a frozen backbone (footrot, pollu) only model.fc learns, yet every
+epoch still runs the full ResNet50 forward pass over every image.
+train_head_only() runs the backbone once per split and stores its
+2048-d penultimate-layer outputs. It then trains the linear head on the
+stored vectors, which takes seconds.
+
+The cache lives under <dataset>/.embedding_cache/<key>/ (or
+--embedding-cache-dir). The key hashes the source files (as in
+dataset_cache), the eval transform, the backbone weights and the dedup
+manifest (--manifest), so any change to them gives a fresh cache.
+
+Every split goes through the eval transform (no augmentation), and the
+backbone runs in eval mode, so BatchNorm uses its running statistics. The
+full-image loop does the same for a frozen backbone (leaf_trainer's
+freeze_batchnorm), so both modes train the head on the same features.
+The full loop still differs: it augments the training images, and its
+batches come in a different order. Expect similar, not identical, numbers.
+The outputs are the same files train() writes: <name>_model.pth (a full
+ResNet50 state dict, loadable by predict_disease_resnet50), *_metrics.json
+and the plot.
+
+Usage:
+    python train_footrot.py --head-only
+    python train_pollu.py --head-only --epochs 50 --embedding-cache-dir D:\\emb
+"""
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.optim.lr_scheduler import ReduceLROnPlateau
+from torchvision import datasets
+
+import dataset_cache
+from leaf_trainer import build_model, build_transforms, load_datasets, make_loader, write_outputs
+
+SPLITS = ('train', 'val', 'test')
+CACHE_DIRNAME = '.embedding_cache'
+
+
+def backbone_hash(model):
+    """sha1 of every parameter and buffer outside model.fc."""
+    digest = hashlib.sha1()
+    for name, tensor in model.state_dict().items():
+        if name.startswith('fc.'):
+            continue
+        digest.update(name.encode('utf-8'))
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(cfg, model, transform):
+    digest = hashlib.sha1()
+    for split in SPLITS:
+        samples = datasets.ImageFolder(os.path.join(cfg['dataset_path'], split)).samples
+        digest.update(f"{split}:{dataset_cache._fingerprint(samples)}\n".encode('utf-8'))
+    digest.update(repr(transform).encode('utf-8'))
+    # Memmap shards hold a downscaled copy, so their pixels differ slightly for some transforms
+    digest.update(f"memmap={bool(cfg['memmap'] or cfg['cache_dir'])}:{cfg['cache_size']}\n".encode('utf-8'))
+    if cfg['manifest']:
+        import dedup_dataset
+        digest.update('\n'.join(sorted(dedup_dataset.load_manifest(cfg['manifest']))).encode('utf-8'))
+    digest.update(backbone_hash(model).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def compute_embeddings(backbone, loader, device):
+    """(features float32 [N, D], labels int64 [N]) for one split."""
+    backbone.eval()
+    features, labels = [], []
+    non_blocking = device.type == 'cuda'
+    with torch.inference_mode():
+        for images, targets in loader:
+            features.append(backbone(images.to(device, non_blocking=non_blocking)).float().cpu())
+            labels.append(targets)
+    return torch.cat(features).numpy(), torch.cat(labels).numpy().astype(np.int64)
+
+
+def load_or_compute(cfg, model, device):
+    """Embeddings for every split, from the cache or computed once and saved. Returns (splits, classes, cache_dir)."""
+    transform = build_transforms(cfg)['test']
+    key = cache_key(cfg, model, transform)
+    cache_root = cfg['embedding_cache_dir'] or os.path.join(cfg['dataset_path'], CACHE_DIRNAME)
+    cache_dir = os.path.join(cache_root, key)
+    index_path = os.path.join(cache_dir, 'index.json')
+
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        splits = {}
+        for split in SPLITS:
+            with np.load(os.path.join(cache_dir, f"{split}.npz")) as data:
+                splits[split] = (data['features'], data['labels'])
+        print(f"✓ Using cached embeddings: {cache_dir}")
+        return splits, index['classes'], cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    head = model.fc
+    model.fc = nn.Identity()
+    splits, classes = {}, None
+    data = load_datasets(cfg, dict.fromkeys(SPLITS, transform))
+    try:
+        for split in SPLITS:
+            start = time.time()
+            dataset = data[split]
+            classes = classes or dataset.classes
+            features, labels = compute_embeddings(model, make_loader(dataset, cfg, shuffle=False, device=device), device)
+            tmp_path = os.path.join(cache_dir, f"{split}.tmp.npz")
+            np.savez(tmp_path, features=features, labels=labels)
+            os.replace(tmp_path, os.path.join(cache_dir, f"{split}.npz"))
+            splits[split] = (features, labels)
+            print(f"✓ Embedded {split}: {len(labels)} images in {time.time() - start:.1f}s")
+    finally:
+        model.fc = head
+
+    # The index is written last: it marks the cache as complete
+    with open(index_path, 'w') as f:
+        json.dump({'classes': classes, 'dim': int(splits['train'][0].shape[1]), 'transform': repr(transform)}, f)
+    return splits, classes, cache_dir
+
+
+def run_head_epoch(head, features, labels, criterion, batch_size, optimizer=None):
+    """run_epoch() over in-memory embeddings: same batching, loss and accuracy averaging."""
+    training = optimizer is not None
+    head.train(training)
+    n = labels.size(0)
+    order = torch.randperm(n, device=features.device) if training else torch.arange(n, device=features.device)
+    running_loss = 0.0
+    correct = 0
+    batches = 0
+    with torch.set_grad_enabled(training):
+        for start in range(0, n, batch_size):
+            idx = order[start:start + batch_size]
+            x, y = features[idx], labels[idx]
+            if training:
+                optimizer.zero_grad()
+            outputs = head(x)
+            loss = criterion(outputs, y)
+            if training:
+                loss.backward()
+                optimizer.step()
+            running_loss += loss.item()
+            correct += (outputs.argmax(1) == y).sum().item()
+            batches += 1
+    return running_loss / batches, correct / n
+
+
+def train_head_only(cfg):
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+    print(f"Dataset path: {cfg['dataset_path']}")
+    print(f"Output path: {cfg['output_path']}")
+    print("Mode: head-only on cached backbone embeddings")
+    print("=" * 60)
+    if not cfg['freeze_backbone']:
+        print(f"⚠️ Task '{cfg['task']}' normally fine-tunes the backbone; --head-only trains model.fc only")
+    os.makedirs(cfg['output_path'], exist_ok=True)
+
+    print("\n🤖 Loading ResNet50 model...")
+    classes = datasets.ImageFolder(os.path.join(cfg['dataset_path'], 'train')).classes
+    model = build_model(cfg, len(classes), device)
+
+    print("\n📊 Loading embeddings...")
+    splits, cached_classes, _ = load_or_compute(cfg, model, device)
+    if cached_classes != classes:
+        raise ValueError(f"Cached classes {cached_classes} do not match dataset classes {classes}")
+    tensors = {
+        split: (torch.from_numpy(features).to(device), torch.from_numpy(labels).to(device))
+        for split, (features, labels) in splits.items()
+    }
+    print(f"✓ Train: {len(tensors['train'][1])} images")
+    print(f"✓ Val: {len(tensors['val'][1])} images")
+    print(f"✓ Test: {len(tensors['test'][1])} images")
+    print(f"Classes ({len(classes)}): {', '.join(classes)}")
+
+    head = model.fc
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(head.parameters(), lr=cfg['learning_rate'])
+    scheduler = ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=cfg['patience'])
+
+    model_path = os.path.join(cfg['output_path'], f"{cfg['name']}_model.pth")
+    history = {'train_loss': [], 'val_loss': [], 'train_acc': [], 'val_acc': [], 'loader_stall': []}
+    best_val_loss = float('inf')
+
+    print(f"\n🚀 Starting head-only training ({cfg['epochs']} epochs)...\n")
+    start_time = time.time()
+
+    for epoch in range(cfg['epochs']):
+        train_loss, train_acc = run_head_epoch(head, *tensors['train'], criterion, cfg['batch_size'], optimizer)
+        val_loss, val_acc = run_head_epoch(head, *tensors['val'], criterion, cfg['batch_size'])
+
+        history['train_loss'].append(train_loss)
+        history['val_loss'].append(val_loss)
+        history['train_acc'].append(train_acc)
+        history['val_acc'].append(val_acc)
+        history['loader_stall'].append(0.0)
+
+        scheduler.step(val_loss)
+
+        print(f"Epoch {epoch + 1}/{cfg['epochs']} | "
+              f"Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.4f} | "
+              f"Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.4f}")
+
+        if cfg['save'] == 'best' and val_loss < best_val_loss:
+            best_val_loss = val_loss
+            torch.save(model.state_dict(), model_path)
+            print(f"  ✓ Model saved (best val loss: {val_loss:.4f})")
+
+    elapsed = time.time() - start_time
+    print(f"\n✓ Training completed in {elapsed:.1f} seconds")
+
+    print("\n📈 Evaluating on test set...")
+    test_loss, test_acc = run_head_epoch(head, *tensors['test'], criterion, cfg['batch_size'])
+    print(f"Test Loss: {test_loss:.4f}")
+    print(f"Test Accuracy: {test_acc:.4f}")
+
+    return write_outputs(cfg, model, history, test_loss, test_acc, elapsed, classes, device)
@@ -0,0 +1,656 @@
+"""
+Shared ResNet50 training loop for the leaf disease classifiers.
+
+train_footrot.py, train_pollu.py, train_slowdecline.py, train_multiclass_pepper.py
+and train_unified_pepper_diseases.py are thin wrappers around main(<task>).
+Each task in TASKS only records how that script differed: dataset folder,
+output names, epochs, frozen backbone or full fine-tune, eval transform,
+scheduler patience, and whether the best-val or the final weights are
+saved. Output files (.pth, *_metrics.json, plot) keep the names and
+layout each script wrote before.
+
+Data loading runs in worker processes (persistent, pinned, prefetching),
+so JPEG decode and augmentation overlap with the forward/backward pass.
+Every epoch reports the loader stall: the share of the epoch the training
+loop spent waiting for the next batch. If it stays high, training is
+input-bound; add --workers or train from the pre-decoded memmap cache
+(--memmap, see dataset_cache.py). Tasks with a frozen backbone can also
+train the head alone on cached embeddings (--head-only, see
+embedding_cache.py).
+
+With a frozen backbone (freeze_backbone), its BatchNorm layers stay in eval
+mode during training: they normalize with the pretrained running statistics
+and never update them, as in --head-only.
+
+A full checkpoint is written every --checkpoint-every epochs (default 1;
+the newest --keep-checkpoints are kept). After a pre-emption, rerun with
+--resume to continue from the last completed epoch (see checkpoints.py).
+
+Launched with WORLD_SIZE > 1 (distributed.py or torchrun), the same loop
+trains data-parallel across processes and nodes (see distributed.py).
+
+--profile breaks every epoch down into data wait, forward, backward and
+optimizer step, plus DataLoader worker load and peak memory
+(see training_profiler.py).
+
+--perf trades bit-exact fp32 for speed: bf16 autocast on CPU (AMP fp16 with
+a GradScaler on CUDA), channels_last activations and weights, loss and
+accuracy summed on the device with one sync per epoch, and gradients
+zeroed with set_to_none. Each epoch then also reports images per second.
+
+Usage:
+    python train_footrot.py [--epochs 20] [--batch-size 32] [--workers 6]
+"""
+import os
+import json
+import time
+import argparse
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.optim.lr_scheduler import ReduceLROnPlateau
+from torch.utils.data import DataLoader, RandomSampler
+from torchvision import datasets, models, transforms
+
+import distributed
+
+# ======================== CONFIG ========================
+DATASET_ROOT = r"c:\Users\admin\Documents\6.1 Reporting\pipersmart\ml_models\leafdataset"
+OUTPUT_PATH = r"c:\Users\admin\Documents\6.1 Reporting\pipersmart\ml_models\leafdataset"
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+# --perf autocast dtype per device type (anything else: bf16)
+PERF_DTYPES = {'cuda': torch.float16, 'cpu': torch.bfloat16}
+
+# Defaults shared by every task; a task entry overrides what differs
+BASE_TASK = {
+    'epochs': 20,
+    'batch_size': 32,
+    'learning_rate': 0.001,
+    'freeze_backbone': False,   # True: train model.fc only
+    'rotation': 15,
+    'jitter': 0.2,              # ColorJitter brightness/contrast/saturation strength
+    'eval_resize': 'center_crop',  # 'center_crop' (Resize 256 + CenterCrop 224) or 'square' (Resize 224x224)
+    'patience': 2,
+    'save': 'final',            # 'best' (lowest val loss during training) or 'final'
+    'metrics_style': 'history',  # 'summary' (footrot/pollu layout) or 'history'
+    'include_classes': True,
+    'plot_title': '',
+    'plot_name': None,
+    'banner': 'TRAINING COMPLETE!'
+}
+
+TASKS = {
+    'footrot': {
+        'dataset': 'footrot_organized', 'name': 'footrot',
+        'freeze_backbone': True, 'rotation': 20, 'eval_resize': 'square', 'patience': 3,
+        'save': 'best', 'metrics_style': 'summary', 'plot_name': 'training_plot.png'
+    },
+    'pollu': {
+        'dataset': 'pollu_organized', 'name': 'pollu',
+        'freeze_backbone': True, 'rotation': 20, 'eval_resize': 'square', 'patience': 3,
+        'save': 'best', 'metrics_style': 'summary'
+    },
+    'slowdecline': {
+        'dataset': 'slowdecline_organized', 'name': 'slowdecline',
+        'include_classes': False, 'plot_title': 'Slow-Decline: '
+    },
+    'multiclass_pepper': {
+        'dataset': 'multiclass_pepper_organized', 'name': 'multiclass_pepper',
+        'epochs': 25, 'plot_title': 'Multi-Class Pepper Disease: '
+    },
+    'unified_pepper_diseases': {
+        'dataset': 'unified_pepper_diseases_organized', 'name': 'unified_pepper_diseases',
+        'plot_title': 'Unified Pepper Diseases: ', 'banner': 'UNIFIED MODEL TRAINING COMPLETE!'
+    }
+}
+
+
+def default_workers():
+    """Leave one core for the training loop itself."""
+    return max(0, min(8, (os.cpu_count() or 1) - 1))
+
+
+def task_config(task, args=None):
+    """Merge BASE_TASK, the task entry and any command-line overrides."""
+    cfg = dict(BASE_TASK)
+    cfg.update(TASKS[task])
+    cfg['task'] = task
+    cfg['dataset_path'] = os.path.join(DATASET_ROOT, cfg['dataset'])
+    cfg['output_path'] = OUTPUT_PATH
+    cfg['workers'] = default_workers()
+    cfg['prefetch'] = 4
+    cfg['memmap'] = False
+    cfg['cache_dir'] = None
+    cfg['cache_size'] = 256
+    cfg['head_only'] = False
+    cfg['perf'] = False
+    cfg['checkpoint_dir'] = None
+    cfg['checkpoint_every'] = 1
+    cfg['keep_checkpoints'] = 2
+    cfg['resume'] = None
+    cfg['dist_backend'] = 'gloo'
+    cfg['profile'] = False
+    cfg['manifest'] = None
+    cfg['profile_trace_steps'] = 0
+    cfg['embedding_cache_dir'] = None
+    if cfg['plot_name'] is None:
+        cfg['plot_name'] = f"{cfg['name']}_training_plot.png"
+    if args is not None:
+        for key, value in vars(args).items():
+            if value is not None:
+                cfg[key] = value
+    if cfg['checkpoint_dir'] is None:
+        cfg['checkpoint_dir'] = os.path.join(cfg['output_path'], 'checkpoints', cfg['name'])
+    return cfg
+
+
+# ======================== DATA ========================
+def build_transforms(cfg):
+    normalize = transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    train = transforms.Compose([
+        transforms.RandomResizedCrop(224),
+        transforms.RandomHorizontalFlip(),
+        transforms.RandomVerticalFlip(),
+        transforms.RandomRotation(cfg['rotation']),
+        transforms.ColorJitter(brightness=cfg['jitter'], contrast=cfg['jitter'], saturation=cfg['jitter']),
+        transforms.ToTensor(),
+        normalize
+    ])
+    if cfg['eval_resize'] == 'square':
+        resize = [transforms.Resize((224, 224))]
+    else:
+        resize = [transforms.Resize(256), transforms.CenterCrop(224)]
+    evaluate = transforms.Compose(resize + [transforms.ToTensor(), normalize])
+    return {'train': train, 'val': evaluate, 'test': evaluate}
+
+
+def apply_manifest(dataset, keep, dataset_path):
+    """Drop the samples a dedup_dataset.py manifest pruned (ImageFolder or memmap split)."""
+    if hasattr(dataset, 'select'):
+        dataset.select(keep)
+        return dataset
+    dataset.samples = [
+        (path, label) for path, label in dataset.samples
+        if os.path.relpath(path, dataset_path).replace(os.sep, '/') in keep
+    ]
+    dataset.imgs = dataset.samples
+    dataset.targets = [label for _, label in dataset.samples]
+    return dataset
+
+
+def load_datasets(cfg, tfs=None):
+    """
+    ImageFolder datasets, or the pre-decoded memmap shards with --memmap / --cache-dir.
+    With --manifest, only the images a dedup manifest keeps.
+    """
+    tfs = tfs or build_transforms(cfg)
+    if cfg['memmap'] or cfg['cache_dir']:
+        import dataset_cache
+        cache_dir = dataset_cache.prepare(cfg['dataset_path'], cfg['cache_dir'], cfg['cache_size'])
+        print(f"✓ Using memory-mapped dataset cache: {cache_dir}")
+        data = {
+            split: dataset_cache.MemmapImageDataset(cache_dir, split, transform=tfs[split])
+            for split in ('train', 'val', 'test')
+        }
+    else:
+        data = {
+            split: datasets.ImageFolder(os.path.join(cfg['dataset_path'], split), transform=tfs[split])
+            for split in ('train', 'val', 'test')
+        }
+    if cfg['manifest']:
+        import dedup_dataset
+        keep = dedup_dataset.load_manifest(cfg['manifest'])
+        before = sum(len(dataset) for dataset in data.values())
+        for dataset in data.values():
+            apply_manifest(dataset, keep, cfg['dataset_path'])
+        print(f"✓ Dedup manifest: kept {sum(len(d) for d in data.values())} of {before} images")
+    return data
+
+
+def make_loader(dataset, cfg, shuffle, device, generator=None, sampler=None):
+    """
+    Multi-worker DataLoader: workers stay alive across epochs, batches are
+    pinned for async host-to-GPU copies, and each worker keeps `prefetch`
+    batches ready. With a generator, the shuffle order is drawn from it
+    alone, so a checkpoint can capture and replay it. An explicit sampler
+    (distributed shards) overrides both.
+    """
+    workers = cfg['workers']
+    options = {}
+    if workers > 0:
+        options = {'persistent_workers': True, 'prefetch_factor': cfg['prefetch']}
+    if sampler is not None:
+        options['sampler'] = sampler
+        shuffle = False
+    elif shuffle and generator is not None:
+        options['sampler'] = RandomSampler(dataset, generator=generator)
+        shuffle = False
+    return DataLoader(
+        dataset,
+        batch_size=cfg['batch_size'],
+        shuffle=shuffle,
+        num_workers=workers,
+        pin_memory=device.type == 'cuda',
+        **options
+    )
+
+
+# ======================== MODEL ========================
+def build_model(cfg, num_classes, device):
+    model = models.resnet50(weights=models.ResNet50_Weights.DEFAULT)
+    if cfg['freeze_backbone']:
+        for param in model.parameters():
+            param.requires_grad = False
+    model.fc = nn.Linear(model.fc.in_features, num_classes)
+    return model.to(device)
+
+
+def perf_setup(cfg, model, device):
+    """
+    --perf mode settings for run_epoch: None when off, else a dict with the
+    autocast dtype and (CUDA only) a GradScaler. Moves the model to channels_last.
+    """
+    if not cfg['perf']:
+        return None
+    model.to(memory_format=torch.channels_last)
+    dtype = PERF_DTYPES.get(device.type, torch.bfloat16)
+    # fp16 gradients underflow without loss scaling; bf16 has fp32's exponent range
+    scaler = torch.amp.GradScaler(device.type) if dtype == torch.float16 else None
+    return {'dtype': dtype, 'scaler': scaler}
+
+
+def trainable_parameters(model, cfg):
+    return model.fc.parameters() if cfg['freeze_backbone'] else model.parameters()
+
+
+def freeze_batchnorm(model):
+    """
+    Put BatchNorm layers whose parameters are frozen back in eval mode after
+    model.train(). A frozen backbone (footrot, pollu) then normalizes with its
+    running statistics and never updates them, the same regime as --head-only.
+    """
+    for module in model.modules():
+        if isinstance(module, nn.modules.batchnorm._BatchNorm) and not any(p.requires_grad for p in module.parameters()):
+            module.eval()
+
+
+# ======================== EPOCH ========================
+def run_epoch(model, loader, criterion, device, optimizer=None, perf=None, profiler=None):
+    """
+    One pass over `loader`; trains when an optimizer is given, else evaluates.
+    `perf` is perf_setup()'s result (None for the plain fp32 loop); a
+    TrainingProfiler (--profile) gets a lap at every phase boundary.
+    Returns (avg_loss, accuracy, stats) where stats has the time spent
+    waiting on the loader vs. the whole epoch, and images per second.
+    """
+    training = optimizer is not None
+    model.train(training)
+    if training:
+        freeze_batchnorm(model)
+    lap = profiler.lap if profiler is not None else (lambda phase: None)
+    running_loss = 0.0
+    correct = 0
+    total = 0
+    batches = 0
+    wait_time = 0.0
+    non_blocking = device.type == 'cuda'
+    memory_format = torch.channels_last if perf else torch.contiguous_format
+    scaler = perf['scaler'] if perf else None
+    if perf:
+        # Accumulate on the device; the only host sync is at the end of the epoch
+        running_loss = torch.zeros((), device=device)
+        correct = torch.zeros((), dtype=torch.long, device=device)
+
+    epoch_start = time.perf_counter()
+    batch_start = epoch_start
+    with torch.set_grad_enabled(training):
+        for images, labels in loader:
+            wait_time += time.perf_counter() - batch_start
+            images = images.to(device, non_blocking=non_blocking, memory_format=memory_format)
+            labels = labels.to(device, non_blocking=non_blocking)
+            lap('data_wait')
+
+            if training:
+                optimizer.zero_grad(set_to_none=perf is not None)
+            with torch.autocast(device.type, dtype=perf['dtype'] if perf else None, enabled=perf is not None):
+                outputs = model(images)
+                loss = criterion(outputs, labels)
+            lap('forward')
+            if training:
+                if scaler is not None:
+                    scaler.scale(loss).backward()
+                    lap('backward')
+                    scaler.step(optimizer)
+                    scaler.update()
+                else:
+                    loss.backward()
+                    lap('backward')
+                    optimizer.step()
+                lap('step')
+
+            _, predicted = torch.max(outputs, 1)
+            if perf:
+                running_loss += loss.detach().float()
+                correct += (predicted == labels).sum()
+            else:
+                running_loss += loss.item()
+                correct += (predicted == labels).sum().item()
+            total += labels.size(0)
+            batches += 1
+            if profiler is not None:
+                profiler.end_step()
+            batch_start = time.perf_counter()
+
+    if perf:
+        running_loss, correct = running_loss.item(), correct.item()
+    # Data-parallel: every rank saw a different shard, so sum before averaging
+    running_loss, batches, correct, total = distributed.all_reduce_sums([running_loss, batches, correct, total], device)
+    elapsed = time.perf_counter() - epoch_start
+    stats = {
+        'seconds': elapsed,
+        'loader_wait_seconds': wait_time,
+        'loader_stall': wait_time / elapsed if elapsed > 0 else 0.0,
+        'images': int(total),
+        'images_per_second': total / elapsed if elapsed > 0 else 0.0
+    }
+    return running_loss / batches, correct / total, stats
+
+
+# ======================== OUTPUTS ========================
+def build_metrics(cfg, history, test_loss, test_acc, elapsed, classes, device):
+    """Metrics JSON in the layout the task's original script wrote, plus loader stats."""
+    if cfg['metrics_style'] == 'summary':
+        metrics = {
+            'epochs': cfg['epochs'],
+            'batch_size': cfg['batch_size'],
+            'learning_rate': cfg['learning_rate'],
+            'device': str(device),
+            'train_loss': history['train_loss'],
+            'val_loss': history['val_loss'],
+            'train_acc': history['train_acc'],
+            'val_acc': history['val_acc'],
+            'test_loss': float(test_loss),
+            'test_accuracy': float(test_acc),
+            'training_time_minutes': elapsed / 60,
+            'classes': classes
+        }
+    else:
+        metrics = {
+            'train_loss': history['train_loss'],
+            'train_acc': history['train_acc'],
+            'val_loss': history['val_loss'],
+            'val_acc': history['val_acc'],
+            'test_loss': test_loss,
+            'test_acc': test_acc
+        }
+        if cfg['include_classes']:
+            metrics['classes'] = classes
+    metrics['loader_stall'] = history['loader_stall']
+    metrics['data_workers'] = cfg['workers']
+    if history.get('images_per_second'):
+        metrics['images_per_second'] = history['images_per_second']
+        metrics['precision'] = str(PERF_DTYPES.get(device.type, torch.bfloat16)).replace('torch.', '')
+    return metrics
+
+
+def save_plot(cfg, history):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 4))
+
+    plt.subplot(1, 2, 1)
+    plt.plot(history['train_loss'], label='Train Loss')
+    plt.plot(history['val_loss'], label='Val Loss')
+    plt.xlabel('Epoch')
+    plt.ylabel('Loss')
+    plt.title(f"{cfg['plot_title']}Training & Validation Loss")
+    plt.legend()
+    plt.grid(True)
+
+    plt.subplot(1, 2, 2)
+    plt.plot(history['train_acc'], label='Train Accuracy')
+    plt.plot(history['val_acc'], label='Val Accuracy')
+    plt.xlabel('Epoch')
+    plt.ylabel('Accuracy')
+    plt.title(f"{cfg['plot_title']}Training & Validation Accuracy")
+    plt.legend()
+    plt.grid(True)
+
+    plot_path = os.path.join(cfg['output_path'], cfg['plot_name'])
+    plt.tight_layout()
+    plt.savefig(plot_path, dpi=100, bbox_inches='tight')
+    plt.close()
+    return plot_path
+
+
+# ======================== TRAIN ========================
+def train(cfg):
+    if cfg['head_only']:
+        if distributed.world_size() > 1:
+            raise ValueError("--head-only runs in a single process; launch it without distributed.py/torchrun")
+        import embedding_cache
+        return embedding_cache.train_head_only(cfg)
+
+    rank, world, _ = distributed.setup(cfg)
+    try:
+        return _train(cfg, rank, world)
+    finally:
+        distributed.cleanup()
+
+
+def _train(cfg, rank, world):
+    device = torch.device(f'cuda:{torch.cuda.current_device()}' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+    print(f"Dataset path: {cfg['dataset_path']}")
+    print(f"Output path: {cfg['output_path']}")
+    print(f"Data workers: {cfg['workers']} (prefetch {cfg['prefetch']})")
+    print("=" * 60)
+    os.makedirs(cfg['output_path'], exist_ok=True)
+
+    print("\n📊 Loading dataset...")
+    data = load_datasets(cfg)
+    classes = data['train'].classes
+    profiler = None
+    if cfg['profile'] or cfg['profile_trace_steps']:
+        import training_profiler
+        trace_steps = cfg['profile_trace_steps'] if rank == 0 else 0
+        trace_path = os.path.join(cfg['output_path'], f"{cfg['name']}_trace.json")
+        profiler = training_profiler.TrainingProfiler(device, cfg['workers'], trace_steps, trace_path)
+        data['train'] = profiler.instrument(data['train'])
+    shuffle_generator = torch.Generator()
+    shuffle_generator.seed()
+    samplers = {}
+    if world > 1:
+        distributed.broadcast_seed(shuffle_generator)
+        samplers = {
+            'train': distributed.ShardedShuffleSampler(data['train'], rank, world, shuffle_generator),
+            'val': distributed.ShardSampler(data['val'], rank, world),
+            'test': distributed.ShardSampler(data['test'], rank, world)
+        }
+    loaders = {
+        split: make_loader(dataset, cfg, shuffle=(split == 'train'), device=device,
+                           generator=shuffle_generator, sampler=samplers.get(split))
+        for split, dataset in data.items()
+    }
+    print(f"✓ Train: {len(data['train'])} images")
+    print(f"✓ Val: {len(data['val'])} images")
+    print(f"✓ Test: {len(data['test'])} images")
+    print(f"Classes ({len(classes)}): {', '.join(classes)}")
+
+    print("\n🤖 Loading ResNet50 model...")
+    model = build_model(cfg, len(classes), device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(trainable_parameters(model, cfg), lr=cfg['learning_rate'])
+    scheduler = ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=cfg['patience'])
+    perf = perf_setup(cfg, model, device)
+    if perf:
+        print(f"⚡ Performance mode: {str(perf['dtype']).replace('torch.', '')} autocast, channels_last")
+
+    # model stays the plain module (saved state dicts have no 'module.' prefix); net is what runs
+    net = model
+    if world > 1:
+        from torch.nn.parallel import DistributedDataParallel
+        net = DistributedDataParallel(model, device_ids=[device.index] if device.type == 'cuda' else None)
+
+    model_path = os.path.join(cfg['output_path'], f"{cfg['name']}_model.pth")
+    history = {'train_loss': [], 'val_loss': [], 'train_acc': [], 'val_acc': [], 'loader_stall': [], 'images_per_second': []}
+    best_val_loss = float('inf')
+    start_epoch, resumed_elapsed = 0, 0.0
+    scaler = perf['scaler'] if perf else None
+
+    if cfg['resume']:
+        import checkpoints
+        resume_path = cfg['resume']
+        if resume_path == 'latest':
+            resume_path = checkpoints.latest_checkpoint(cfg['checkpoint_dir'])
+        if resume_path is None:
+            print(f"⚠️ No checkpoint in {cfg['checkpoint_dir']}; starting from scratch")
+        else:
+            state = checkpoints.load_checkpoint(resume_path)
+            if state['task'] != cfg['task']:
+                raise ValueError(f"Checkpoint {resume_path} is for task '{state['task']}', not '{cfg['task']}'")
+            start_epoch, history, best_val_loss, resumed_elapsed = checkpoints.restore(
+                state, model, optimizer, scheduler, scaler, shuffle_generator
+            )
+            del state
+            print(f"↩️ Resumed from {resume_path} (epoch {start_epoch}/{cfg['epochs']})")
+
+    print(f"\n🚀 Starting training ({cfg['epochs']} epochs)...\n")
+    start_time = time.time() - resumed_elapsed
+
+    for epoch in range(start_epoch, cfg['epochs']):
+        if profiler is not None:
+            profiler.begin_epoch()
+        train_loss, train_acc, stats = run_epoch(net, loaders['train'], criterion, device, optimizer, perf, profiler)
+        if profiler is not None:
+            row = profiler.end_epoch(epoch + 1, len(loaders['train']), stats['images'])
+        val_loss, val_acc, _ = run_epoch(net, loaders['val'], criterion, device, perf=perf)
+
+        history['train_loss'].append(train_loss)
+        history['val_loss'].append(val_loss)
+        history['train_acc'].append(train_acc)
+        history['val_acc'].append(val_acc)
+        history['loader_stall'].append(round(stats['loader_stall'], 4))
+        if perf:
+            history['images_per_second'].append(round(stats['images_per_second'], 1))
+
+        scheduler.step(val_loss)
+
+        print(f"Epoch {epoch + 1}/{cfg['epochs']} | "
+              f"Train Loss: {train_loss:.4f} | Train Acc: {train_acc:.4f} | "
+              f"Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.4f} | "
+              f"Loader stall: {stats['loader_stall'] * 100:.0f}%"
+              + (f" | {stats['images_per_second']:.1f} img/s" if perf else ""))
+        if stats['loader_stall'] > 0.3:
+            print(f"  ⚠️ Input-bound: waited {stats['loader_wait_seconds']:.1f}s of {stats['seconds']:.1f}s on data")
+        if profiler is not None:
+            print(f"  ⏱️ data {row['data_wait_s']:.1f}s | forward {row['forward_s']:.1f}s | "
+                  f"backward {row['backward_s']:.1f}s | step {row['step_s']:.1f}s | "
+                  f"workers {row['worker_utilization'] * 100:.0f}% busy "
+                  f"(decode {row['decode_s']:.1f}s, augment {row['augment_s']:.1f}s) | {row['bound']}-bound")
+
+        if cfg['save'] == 'best' and val_loss < best_val_loss:
+            best_val_loss = val_loss
+            if rank == 0:
+                torch.save(model.state_dict(), model_path)
+            print(f"  ✓ Model saved (best val loss: {val_loss:.4f})")
+
+        every = cfg['checkpoint_every']
+        if rank == 0 and every > 0 and ((epoch + 1) % every == 0 or epoch + 1 == cfg['epochs']):
+            import checkpoints
+            path = checkpoints.checkpoint_path(cfg['checkpoint_dir'], epoch + 1)
+            checkpoints.save_checkpoint(path, checkpoints.capture(
+                epoch + 1, model, optimizer, scheduler, history, best_val_loss,
+                time.time() - start_time, cfg['task'], scaler, shuffle_generator
+            ))
+            checkpoints.prune(cfg['checkpoint_dir'], cfg['keep_checkpoints'])
+
+    elapsed = time.time() - start_time
+    print(f"\n✓ Training completed in {elapsed / 60:.2f} minutes")
+
+    print("\n📈 Evaluating on test set...")
+    test_loss, test_acc, _ = run_epoch(net, loaders['test'], criterion, device, perf=perf)
+    print(f"Test Loss: {test_loss:.4f}")
+    print(f"Test Accuracy: {test_acc:.4f}")
+
+    if rank != 0:
+        return None
+    if profiler is not None:
+        print(f"✓ Profile saved to: {profiler.write(cfg['output_path'], cfg['name'])}")
+    return write_outputs(cfg, model, history, test_loss, test_acc, elapsed, classes, device)
+
+
+def write_outputs(cfg, model, history, test_loss, test_acc, elapsed, classes, device):
+    """Metrics JSON, final weights (save='final'), plot and summary banner."""
+    model_path = os.path.join(cfg['output_path'], f"{cfg['name']}_model.pth")
+    metrics = build_metrics(cfg, history, test_loss, test_acc, elapsed, classes, device)
+    metrics_path = os.path.join(cfg['output_path'], f"{cfg['name']}_metrics.json")
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=4)
+    print(f"\n✓ Metrics saved to: {metrics_path}")
+
+    if cfg['save'] == 'final':
+        torch.save(model.state_dict(), model_path)
+    print(f"✓ Model saved to: {model_path}")
+
+    print("\n📊 Generating plots...")
+    plot_path = save_plot(cfg, history)
+    print(f"✓ Plot saved to: {plot_path}")
+
+    print("\n" + "=" * 60)
+    print(f"🎉 {cfg['banner']}")
+    print("=" * 60)
+    print(f"Model: {model_path}")
+    print(f"Metrics: {metrics_path}")
+    print(f"Classes: {', '.join(classes)}")
+    print(f"Final Test Accuracy: {test_acc:.4f}")
+    print("=" * 60)
+    return metrics
+
+
+def parse_args(task, argv=None):
+    parser = argparse.ArgumentParser(description=f"Train the ResNet50 {task} classifier")
+    parser.add_argument('--dataset-path', dest='dataset_path', default=None)
+    parser.add_argument('--output-path', dest='output_path', default=None)
+    parser.add_argument('--epochs', type=int, default=None)
+    parser.add_argument('--batch-size', dest='batch_size', type=int, default=None)
+    parser.add_argument('--learning-rate', dest='learning_rate', type=float, default=None)
+    parser.add_argument('--rotation', type=float, default=None, help='RandomRotation degrees')
+    parser.add_argument('--jitter', type=float, default=None, help='ColorJitter strength')
+    parser.add_argument('--patience', type=int, default=None, help='ReduceLROnPlateau patience')
+    parser.add_argument('--workers', type=int, default=None, help='DataLoader worker processes (0 = main thread)')
+    parser.add_argument('--prefetch', type=int, default=None, help='Batches prefetched per worker')
+    parser.add_argument('--memmap', action='store_true', default=None,
+                        help='Train from pre-decoded memory-mapped shards (built on first use, see dataset_cache.py)')
+    parser.add_argument('--cache-dir', dest='cache_dir', default=None, help='Where the memmap shards live (implies --memmap)')
+    parser.add_argument('--cache-size', dest='cache_size', type=int, default=None, help='Stored short side in pixels (default 256)')
+    parser.add_argument('--manifest', default=None,
+                        help='Train only on the images a dedup_dataset.py manifest keeps')
+    parser.add_argument('--perf', action='store_true', default=None,
+                        help='bf16 autocast on CPU / AMP on CUDA, channels_last, on-device metrics, img/s per epoch')
+    parser.add_argument('--checkpoint-dir', dest='checkpoint_dir', default=None,
+                        help='Where full checkpoints go (default <output>/checkpoints/<name>)')
+    parser.add_argument('--checkpoint-every', dest='checkpoint_every', type=int, default=None,
+                        help='Write a checkpoint every N epochs (0 = off, default 1)')
+    parser.add_argument('--keep-checkpoints', dest='keep_checkpoints', type=int, default=None,
+                        help='Checkpoints kept on disk (0 = all, default 2)')
+    parser.add_argument('--resume', nargs='?', const='latest', default=None,
+                        help='Continue from the newest checkpoint, or from the given .ckpt file')
+    parser.add_argument('--dist-backend', dest='dist_backend', choices=('gloo', 'nccl'), default=None,
+                        help='Process-group backend when launched data-parallel (default gloo)')
+    parser.add_argument('--profile', action='store_true', default=None,
+                        help='Time data wait / forward / backward / step and worker load; writes <name>_profile.json/.csv')
+    parser.add_argument('--profile-trace-steps', dest='profile_trace_steps', type=int, default=None,
+                        help='Also record a torch.profiler trace of the first N training steps (implies --profile)')
+    parser.add_argument('--head-only', dest='head_only', action='store_true', default=None,
+                        help='Train only model.fc on cached backbone embeddings (no augmentation, see embedding_cache.py)')
+    parser.add_argument('--embedding-cache-dir', dest='embedding_cache_dir', default=None)
+    return parser.parse_args(argv)
+
+
+def main(task, argv=None):
+    cfg = task_config(task, parse_args(task, argv))
+    return train(cfg)
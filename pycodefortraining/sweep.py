@@ -0,0 +1,374 @@
+"""
+Parallel hyperparameter sweeps over the shared leaf_trainer loop.
+
+Each trial runs train_<task>.py in its own process with the sampled
+options (--learning-rate, --batch-size, --rotation, --jitter, ...) and its
+own output folder. Trials run in parallel, as many as fit into --cpus
+when each gets --cpus-per-trial cores: half for torch threads, the rest
+for DataLoader workers.
+
+Trials advance in rungs. A trial trains up to a rung's epoch count, and
+the losers are stopped there. The survivors continue from their last
+checkpoint (leaf_trainer --resume) to the next rung:
+    grid / random  every trial of the space; rungs every --rung-epochs
+                   epochs; with --early-stop a trial whose best val loss
+                   is worse than the rung median stops.
+    halving        successive halving: --trials random configurations
+                   start at --min-epochs. The best 1/--eta of each rung
+                   go on with eta times the epochs, up to --epochs.
+
+Every trial's parameters, status, best/last validation metrics, test
+accuracy and artifact paths (model, metrics JSON, plot, log) are recorded
+in a SQLite store (<sweep-dir>/sweeps.db).
+
+Usage:
+    python sweep.py run footrot --strategy random --trials 12 --epochs 20 --cpus 32
+    python sweep.py run pollu --strategy halving --trials 27 --min-epochs 2 --eta 3 --epochs 18
+    python sweep.py run slowdecline --space space.json --strategy grid --early-stop --rung-epochs 5
+    python sweep.py leaderboard --top 10 [--sweep 3]
+
+A search space maps leaf_trainer options to a list of values (grid and
+random) or to a distribution (random and halving only):
+    {"learning_rate": {"log_uniform": [1e-4, 1e-2]}, "batch_size": [16, 32, 64],
+     "rotation": {"uniform": [5, 30]}, "jitter": [0.1, 0.2, 0.3]}
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import sqlite3
+import argparse
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SPACE = {
+    'learning_rate': {'log_uniform': [1e-4, 1e-2]},
+    'batch_size': [16, 32, 64],
+    'rotation': [10, 15, 20, 30],
+    'jitter': [0.1, 0.2, 0.3]
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sweeps (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    space TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sweep_id INTEGER NOT NULL REFERENCES sweeps(id),
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    epochs INTEGER DEFAULT 0,
+    best_val_loss REAL,
+    val_loss REAL,
+    val_acc REAL,
+    test_acc REAL,
+    seconds REAL DEFAULT 0,
+    output_dir TEXT,
+    model_path TEXT,
+    metrics_path TEXT,
+    plot_path TEXT,
+    log_path TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS trials_by_sweep ON trials(sweep_id, best_val_loss);
+"""
+
+
+# ======================== SEARCH SPACE ========================
+def load_space(value):
+    """A JSON object, or the path of a JSON file."""
+    if value is None:
+        return dict(DEFAULT_SPACE)
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def sample_value(spec, rng):
+    if isinstance(spec, list):
+        return rng.choice(spec)
+    if 'uniform' in spec:
+        low, high = spec['uniform']
+        return rng.uniform(low, high)
+    if 'log_uniform' in spec:
+        low, high = spec['log_uniform']
+        return math.exp(rng.uniform(math.log(low), math.log(high)))
+    if 'int' in spec:
+        low, high = spec['int']
+        return rng.randint(low, high)
+    raise ValueError(f"Unknown search space entry: {spec}")
+
+
+def grid(space):
+    for key, spec in space.items():
+        if not isinstance(spec, list):
+            raise ValueError(f"Grid search needs a list of values for '{key}', got {spec}")
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def random_configs(space, n, seed=None):
+    rng = random.Random(seed)
+    return [{key: sample_value(spec, rng) for key, spec in space.items()} for _ in range(n)]
+
+
+def halving_rungs(min_epochs, max_epochs, eta):
+    rungs, epochs = [], min_epochs
+    while epochs < max_epochs:
+        rungs.append(epochs)
+        epochs *= eta
+    return rungs + [max_epochs]
+
+
+def linear_rungs(rung_epochs, max_epochs):
+    if not rung_epochs or rung_epochs >= max_epochs:
+        return [max_epochs]
+    return list(range(rung_epochs, max_epochs, rung_epochs)) + [max_epochs]
+
+
+# ======================== RESULTS STORE ========================
+def connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def create_sweep(conn, task, strategy, space):
+    cur = conn.execute('INSERT INTO sweeps (task, strategy, space, created) VALUES (?, ?, ?, ?)',
+                       (task, strategy, json.dumps(space), time.time()))
+    conn.commit()
+    return cur.lastrowid
+
+
+def create_trial(conn, sweep_id, params, sweep_dir):
+    cur = conn.execute("INSERT INTO trials (sweep_id, params, status) VALUES (?, ?, 'pending')",
+                       (sweep_id, json.dumps(params)))
+    trial_id = cur.lastrowid
+    output_dir = os.path.join(sweep_dir, f"sweep{sweep_id}_trial{trial_id}")
+    conn.execute('UPDATE trials SET output_dir = ? WHERE id = ?', (output_dir, trial_id))
+    conn.commit()
+    return {'id': trial_id, 'params': params, 'output_dir': output_dir, 'seconds': 0.0}
+
+
+def update_trial(conn, trial_id, **fields):
+    columns = ', '.join(f"{key} = ?" for key in fields)
+    conn.execute(f"UPDATE trials SET {columns} WHERE id = ?", (*fields.values(), trial_id))
+    conn.commit()
+
+
+def leaderboard(conn, sweep_id=None, top=10):
+    """Best trials by best validation loss (ties: higher test accuracy first)."""
+    if sweep_id is None:
+        row = conn.execute('SELECT MAX(id) FROM sweeps').fetchone()
+        sweep_id = row[0]
+    rows = conn.execute(
+        """SELECT id, params, status, epochs, best_val_loss, val_acc, test_acc, seconds, model_path
+           FROM trials WHERE sweep_id = ? AND best_val_loss IS NOT NULL
+           ORDER BY best_val_loss ASC, test_acc DESC LIMIT ?""",
+        (sweep_id, top)
+    ).fetchall()
+    return sweep_id, [dict(row, params=json.loads(row['params'])) for row in rows]
+
+
+# ======================== TRIALS ========================
+def trial_command(task, trial, epochs, workers, resume):
+    command = [sys.executable, os.path.join(HERE, f"train_{task}.py"),
+               '--epochs', str(epochs),
+               '--output-path', trial['output_dir'],
+               '--workers', str(workers),
+               '--keep-checkpoints', '1']
+    for key, value in trial['params'].items():
+        if key != 'epochs':
+            command += [f"--{key.replace('_', '-')}", str(value)]
+    if resume:
+        command.append('--resume')
+    return command
+
+
+def run_trial(task, trial, epochs, cpus_per_trial, resume):
+    """Train one trial up to `epochs` in a child process. Returns its metrics dict (or error)."""
+    threads = max(1, cpus_per_trial // 2)
+    workers = max(0, cpus_per_trial - threads)
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads))
+    os.makedirs(trial['output_dir'], exist_ok=True)
+    log_path = os.path.join(trial['output_dir'], 'train.log')
+    start = time.time()
+    with open(log_path, 'a') as log:
+        returncode = subprocess.call(trial_command(task, trial, epochs, workers, resume),
+                                     cwd=HERE, env=env, stdout=log, stderr=subprocess.STDOUT)
+    result = {'seconds': time.time() - start, 'log_path': log_path}
+    if returncode != 0:
+        result['error'] = f"exit code {returncode} (see {log_path})"
+    return result
+
+
+def collect(task, trial):
+    """Read back what leaf_trainer wrote for a trial."""
+    from leaf_trainer import task_config
+    cfg = task_config(task)
+    name = cfg['name']
+    metrics_path = os.path.join(trial['output_dir'], f"{name}_metrics.json")
+    with open(metrics_path) as f:
+        metrics = json.load(f)
+    return {
+        'epochs': len(metrics['val_loss']),
+        'best_val_loss': min(metrics['val_loss']),
+        'val_loss': metrics['val_loss'][-1],
+        'val_acc': metrics['val_acc'][-1],
+        'test_acc': metrics.get('test_acc', metrics.get('test_accuracy')),
+        'metrics_path': metrics_path,
+        'model_path': os.path.join(trial['output_dir'], f"{name}_model.pth"),
+        'plot_path': os.path.join(trial['output_dir'], cfg['plot_name'])
+    }
+
+
+def run_rung(conn, pool, task, trials, epochs, cpus_per_trial):
+    """
+    Bring every trial to `epochs` (or its own 'epochs' parameter, if lower).
+    Failed trials are marked and dropped.
+    """
+    futures = {}
+    for trial in trials:
+        target = min(epochs, int(trial['params'].get('epochs', epochs)))
+        done = trial.get('epochs', 0)
+        if done >= target:
+            futures[trial['id']] = (trial, None)
+            continue
+        update_trial(conn, trial['id'], status='running')
+        futures[trial['id']] = (trial, pool.submit(run_trial, task, trial, target, cpus_per_trial, done > 0))
+
+    finished = []
+    for trial, future in futures.values():
+        if future is None:
+            finished.append(trial)
+            continue
+        result = future.result()
+        trial['seconds'] += result['seconds']
+        if 'error' in result:
+            update_trial(conn, trial['id'], status='failed', error=result['error'],
+                         seconds=trial['seconds'], log_path=result['log_path'])
+            print(f"❌ Trial {trial['id']} failed: {result['error']}")
+            continue
+        outcome = collect(task, trial)
+        trial.update(outcome)
+        update_trial(conn, trial['id'], status='running', seconds=trial['seconds'],
+                     log_path=result['log_path'], **outcome)
+        print(f"  Trial {trial['id']}: {outcome['epochs']} epochs, best val loss {outcome['best_val_loss']:.4f}, "
+              f"val acc {outcome['val_acc']:.4f}")
+        finished.append(trial)
+    return finished
+
+
+def survivors(trials, strategy, eta, early_stop):
+    ranked = sorted(trials, key=lambda t: t['best_val_loss'])
+    if strategy == 'halving':
+        return ranked[:max(1, len(ranked) // eta)]
+    if early_stop and len(ranked) > 1:
+        median = ranked[(len(ranked) - 1) // 2]['best_val_loss']
+        return [t for t in ranked if t['best_val_loss'] <= median]
+    return ranked
+
+
+def run_sweep(args):
+    space = load_space(args.space)
+    if args.strategy == 'grid':
+        configs = grid(space)
+    else:
+        configs = random_configs(space, args.trials, args.seed)
+
+    conn = connect(args.db or os.path.join(args.sweep_dir, 'sweeps.db'))
+    sweep_id = create_sweep(conn, args.task, args.strategy, space)
+    trials = [create_trial(conn, sweep_id, params, args.sweep_dir) for params in configs]
+
+    cpus = args.cpus or os.cpu_count() or 1
+    parallel = max(1, cpus // args.cpus_per_trial)
+    if args.strategy == 'halving':
+        rungs = halving_rungs(args.min_epochs, args.epochs, args.eta)
+    else:
+        rungs = linear_rungs(args.rung_epochs, args.epochs)
+    print(f"🔬 Sweep {sweep_id}: {len(trials)} {args.strategy} trial(s) of '{args.task}', "
+          f"{parallel} in parallel x {args.cpus_per_trial} cores, rungs at {rungs} epochs")
+
+    active = trials
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        for i, epochs in enumerate(rungs):
+            print(f"\n📶 Rung {i + 1}/{len(rungs)}: {len(active)} trial(s) to {epochs} epochs")
+            active = run_rung(conn, pool, args.task, active, epochs, args.cpus_per_trial)
+            if not active or i == len(rungs) - 1:
+                break
+            kept = survivors(active, args.strategy, args.eta, args.early_stop)
+            for trial in active:
+                if trial not in kept:
+                    update_trial(conn, trial['id'], status='stopped')
+            print(f"✂️ Kept {len(kept)}/{len(active)} trial(s)")
+            active = kept
+
+    for trial in active:
+        update_trial(conn, trial['id'], status='completed')
+    return conn, sweep_id
+
+
+def print_leaderboard(conn, sweep_id=None, top=10):
+    sweep_id, rows = leaderboard(conn, sweep_id, top)
+    print(f"\n🏆 Sweep {sweep_id} leaderboard")
+    print("=" * 60)
+    for rank, row in enumerate(rows, 1):
+        test_acc = f"{row['test_acc']:.4f}" if row['test_acc'] is not None else '-'
+        print(f"{rank:>2}. trial {row['id']} [{row['status']}] best val loss {row['best_val_loss']:.4f} | "
+              f"val acc {row['val_acc']:.4f} | test acc {test_acc} | {row['epochs']} epochs")
+        print(f"    {json.dumps(row['params'])}")
+    print("=" * 60)
+    return rows
+
+
+def main():
+    from leaf_trainer import TASKS
+
+    parser = argparse.ArgumentParser(description='Hyperparameter sweeps for the leaf classifiers')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Run a sweep')
+    run.add_argument('task', choices=sorted(TASKS))
+    run.add_argument('--space', default=None, help='Search space as JSON or a JSON file (default: DEFAULT_SPACE)')
+    run.add_argument('--strategy', choices=('grid', 'random', 'halving'), default='random')
+    run.add_argument('--trials', type=int, default=8, help='Configurations sampled (random, halving)')
+    run.add_argument('--epochs', type=int, default=20, help='Epochs for a trial that is never stopped')
+    run.add_argument('--min-epochs', type=int, default=2, help='First halving rung')
+    run.add_argument('--eta', type=int, default=3, help='Halving: keep 1/eta of the trials per rung')
+    run.add_argument('--rung-epochs', type=int, default=None, help='Grid/random: compare trials every N epochs')
+    run.add_argument('--early-stop', action='store_true', help='Grid/random: stop trials worse than the rung median')
+    run.add_argument('--cpus', type=int, default=None, help='Core budget for the whole sweep (default: all)')
+    run.add_argument('--cpus-per-trial', type=int, default=4)
+    run.add_argument('--seed', type=int, default=None)
+    run.add_argument('--sweep-dir', default=os.path.join(HERE, 'sweeps'))
+    run.add_argument('--db', default=None, help='SQLite results store (default <sweep-dir>/sweeps.db)')
+
+    board = sub.add_parser('leaderboard', help='Show the best trials of a sweep')
+    board.add_argument('--sweep', type=int, default=None, help='Sweep id (default: the latest)')
+    board.add_argument('--top', type=int, default=10)
+    board.add_argument('--sweep-dir', default=os.path.join(HERE, 'sweeps'))
+    board.add_argument('--db', default=None)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        conn, sweep_id = run_sweep(args)
+        print_leaderboard(conn, sweep_id)
+    else:
+        conn = connect(args.db or os.path.join(args.sweep_dir, 'sweeps.db'))
+        print_leaderboard(conn, args.sweep, args.top)
+
+
+if __name__ == '__main__':
+    main()
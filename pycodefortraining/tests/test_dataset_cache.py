@@ -0,0 +1,70 @@
+"""
+dataset_cache shards against decoding the source images directly.
+
+Run from the repository root:
+    python -m pytest pycodefortraining/tests
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+Image = pytest.importorskip('PIL.Image')
+from torchvision import datasets, transforms
+
+import dataset_cache
+
+# (width, height): landscape, portrait, extreme aspect, and smaller than the stored size
+SIZES = [(640, 480), (300, 500), (900, 260), (200, 150)]
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(0)
+    root = tmp_path / 'data'
+    for split in dataset_cache.SPLITS:
+        for label in ('a', 'b'):
+            folder = root / split / label
+            folder.mkdir(parents=True)
+            for i, (width, height) in enumerate(SIZES):
+                pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+                Image.fromarray(pixels).save(folder / f"{i}.jpg", quality=90)
+    return root
+
+
+def test_shards_keep_aspect_and_match_center_crop_eval(tmp_path, dataset):
+    cache_dir = dataset_cache.prepare(str(dataset), str(tmp_path / 'cache'), base_size=256, workers=2)
+    assert dataset_cache.is_prepared(str(dataset), cache_dir, 256)
+
+    evaluate = transforms.Compose([transforms.Resize(256), transforms.CenterCrop(224), transforms.PILToTensor()])
+    cached = dataset_cache.MemmapImageDataset(cache_dir, 'val', transform=None)
+    source = datasets.ImageFolder(str(dataset / 'val'))
+    assert cached.classes == source.classes
+    assert len(cached) == len(source)
+
+    for i, (path, label) in enumerate(source.samples):
+        image, target = cached[i]
+        assert target == label
+        with Image.open(path) as original:
+            original = original.convert('RGB')
+            # Nothing cropped, aspect ratio kept, never enlarged
+            assert image.size == dataset_cache.stored_size(original.width, original.height, 256)
+            assert min(image.size) == min(256, min(original.size))
+            # Resize(256) + CenterCrop(224) sees exactly the pixels it would have from the file
+            assert torch.equal(evaluate(image), evaluate(original))
+
+
+def test_select_restricts_rows(tmp_path, dataset):
+    cache_dir = dataset_cache.prepare(str(dataset), str(tmp_path / 'cache'), base_size=128, workers=1)
+    cached = dataset_cache.MemmapImageDataset(cache_dir, 'train')
+    keep = {path.replace(os.sep, '/') for path in cached.paths[1::2]}
+    expected = [cached[i][0] for i in range(1, len(cached), 2)]
+
+    cached.select(keep)
+    assert len(cached) == len(expected)
+    for i, image in enumerate(expected):
+        assert np.array_equal(np.asarray(cached[i][0]), np.asarray(image))
@@ -0,0 +1,141 @@
+"""
+Smoke tests for leaf_trainer.main() on a tiny synthetic ImageFolder.
+
+ResNet50 is swapped for a small conv net, so nothing is downloaded and an
+epoch takes well under a second. Run from the repository root:
+    python -m pytest pycodefortraining/tests
+"""
+import os
+import sys
+import json
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+pytest.importorskip('matplotlib')
+Image = pytest.importorskip('PIL.Image')
+import torch.nn as nn
+
+import leaf_trainer
+
+CLASSES = ('healthy', 'infected')
+SPLIT_SIZES = {'train': 6, 'val': 4, 'test': 4}
+HISTORY_KEYS = ('train_loss', 'val_loss', 'train_acc', 'val_acc')
+
+
+class TinyNet(nn.Module):
+    """Stands in for ResNet50: a backbone with BatchNorm and an `fc` head."""
+
+    def __init__(self, num_classes):
+        super().__init__()
+        self.backbone = nn.Sequential(
+            nn.Conv2d(3, 4, kernel_size=7, stride=8),
+            nn.BatchNorm2d(4),
+            nn.ReLU(),
+            nn.AdaptiveAvgPool2d(1),
+            nn.Flatten()
+        )
+        self.fc = nn.Linear(4, num_classes)
+
+    def forward(self, x):
+        return self.fc(self.backbone(x))
+
+
+def build_tiny_model(cfg, num_classes, device):
+    model = TinyNet(num_classes)
+    if cfg['freeze_backbone']:
+        for param in model.backbone.parameters():
+            param.requires_grad = False
+    return model.to(device)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """<tmp>/data/{train,val,test}/{healthy,infected}/*.png, 48x40 with a class-dependent colour."""
+    root = tmp_path / 'data'
+    for split, count in SPLIT_SIZES.items():
+        for label, name in enumerate(CLASSES):
+            folder = root / split / name
+            folder.mkdir(parents=True)
+            for i in range(count // 2):
+                colour = (200 if label else 40, 60 + 20 * i, 120)
+                Image.new('RGB', (48, 40), colour).save(folder / f"{name}_{i}.png")
+    return root
+
+
+@pytest.fixture(autouse=True)
+def single_process(monkeypatch):
+    monkeypatch.delenv('WORLD_SIZE', raising=False)
+    monkeypatch.setattr(leaf_trainer, 'build_model', build_tiny_model)
+
+
+def run(task, dataset, output, *extra):
+    torch.manual_seed(0)
+    argv = ['--dataset-path', str(dataset), '--output-path', str(output),
+            '--batch-size', '4', '--workers', '0'] + [str(arg) for arg in extra]
+    return leaf_trainer.main(task, argv)
+
+
+def read_metrics(output, name):
+    with open(os.path.join(output, f"{name}_metrics.json")) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('task, keys', [
+    ('footrot', ['epochs', 'batch_size', 'learning_rate', 'device', 'train_loss', 'val_loss', 'train_acc',
+                 'val_acc', 'test_loss', 'test_accuracy', 'training_time_minutes', 'classes',
+                 'loader_stall', 'data_workers']),
+    ('unified_pepper_diseases', ['train_loss', 'train_acc', 'val_loss', 'val_acc', 'test_loss', 'test_acc',
+                                 'classes', 'loader_stall', 'data_workers']),
+    ('slowdecline', ['train_loss', 'train_acc', 'val_loss', 'val_acc', 'test_loss', 'test_acc',
+                     'loader_stall', 'data_workers'])
+], ids=['summary', 'history', 'history-no-classes'])
+def test_one_epoch_metrics_layout(tmp_path, dataset, task, keys):
+    output = tmp_path / 'out'
+    returned = run(task, dataset, output, '--epochs', 1)
+    cfg = leaf_trainer.task_config(task)
+
+    metrics = read_metrics(output, cfg['name'])
+    assert list(metrics) == keys
+    assert metrics == json.loads(json.dumps(returned))
+    for key in HISTORY_KEYS + ('loader_stall',):
+        assert len(metrics[key]) == 1
+    if 'classes' in metrics:
+        assert metrics['classes'] == list(CLASSES)
+    assert os.path.exists(output / f"{cfg['name']}_model.pth")
+    assert os.path.exists(output / cfg['plot_name'])
+    assert os.path.exists(output / 'checkpoints' / cfg['name'] / 'epoch_001.ckpt')
+
+
+@pytest.mark.parametrize('task', ['footrot', 'unified_pepper_diseases'])
+def test_resume_reproduces_history(tmp_path, dataset, task):
+    name = leaf_trainer.task_config(task)['name']
+    full = tmp_path / 'full'
+    run(task, dataset, full, '--epochs', 3, '--keep-checkpoints', 0)
+
+    # Continue from the epoch-1 checkpoint of the same run, in a fresh output folder
+    checkpoint = full / 'checkpoints' / name / 'epoch_001.ckpt'
+    resumed = tmp_path / 'resumed'
+    run(task, dataset, resumed, '--epochs', 3, '--resume', checkpoint)
+
+    expected, actual = read_metrics(full, name), read_metrics(resumed, name)
+    for key in HISTORY_KEYS:
+        assert len(actual[key]) == 3
+        assert actual[key] == expected[key], key
+    test_acc = 'test_accuracy' if 'test_accuracy' in expected else 'test_acc'
+    assert actual['test_loss'] == expected['test_loss']
+    assert actual[test_acc] == expected[test_acc]
+
+
+@pytest.mark.parametrize('task, frozen', [('footrot', True), ('unified_pepper_diseases', False)])
+def test_frozen_backbone_keeps_batchnorm_statistics(tmp_path, dataset, task, frozen):
+    name = leaf_trainer.task_config(task)['name']
+    run(task, dataset, tmp_path, '--epochs', 1)
+    state = torch.load(tmp_path / f"{name}_model.pth", weights_only=True)
+    initial = TinyNet(len(CLASSES)).state_dict()
+
+    # Only the head learns on a frozen backbone; BatchNorm must not drift to batch statistics either
+    unchanged = all(torch.equal(state[key], initial[key]) for key in initial if key.startswith('backbone.1.'))
+    assert unchanged == frozen
@@ -2,11 +2,21 @@
 YOLOv8 Training Script for Black Pepper Bunga Ripeness Detection
 Dataset: blackpepperbunga2 (YOLO format with train/valid/test splits)
 GPU Training: Recommended for faster results (~15-20 min for 30 epochs on T4/A100)
+CPU Training: device, batch size, workers and image cache are picked from the
+machine's cores and memory (see yolo_profile.py); any of them can be forced.
+
+Usage:
+    python train_bunga_yolo.py
+    python train_bunga_yolo.py --device cpu --batch 8 --cache disk
+    python train_bunga_yolo.py --data path/to/leaf/data.yaml --name leaf_model --epochs 50
 """
 
 from ultralytics import YOLO
 import os
+import json
+import argparse
 import yaml
+import yolo_profile
 
 # Configuration
 DATASET_PATH = r"c:\Users\admin\Documents\6.1 Reporting\pipersmart\bungadatasets\blackpepperbunga2"
@@ -15,89 +25,154 @@ OUTPUT_DIR = r"c:\Users\admin\Documents\6.1 Reporting\pipersmart\ml_models\ripeb
 MODEL_NAME = "yolov8n"  # nano model for faster training
 EPOCHS = 30
 IMG_SIZE = 640
-BATCH_SIZE = 16  # Adjust based on GPU memory (GPU: 16-32, CPU: 8)
-
-print("=" * 70)
-print("🍎 YOLOv8 Black Pepper Bunga Training")
-print("=" * 70)
-print(f"Dataset: {DATASET_PATH}")
-print(f"Data YAML: {DATA_YAML}")
-print(f"Output Dir: {OUTPUT_DIR}")
-print(f"Model: {MODEL_NAME}")
-print(f"Epochs: {EPOCHS}")
-print(f"Image Size: {IMG_SIZE}")
-print(f"Batch Size: {BATCH_SIZE}")
-print("=" * 70)
-
-# Verify data.yaml exists
-if not os.path.exists(DATA_YAML):
-    print(f"❌ ERROR: data.yaml not found at {DATA_YAML}")
-    exit(1)
-
-# Load and display data.yaml
-with open(DATA_YAML, 'r') as f:
-    data_config = yaml.safe_load(f)
-    print(f"\n📋 Dataset Classes:")
-    if 'names' in data_config:
-        for idx, class_name in data_config['names'].items():
-            print(f"  Class {idx}: {class_name}")
-    print()
-
-# Create output directory
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Load pretrained YOLOv8n model
-print("📥 Loading YOLOv8n pretrained model...")
-model = YOLO(f"{MODEL_NAME}.pt")
-
-# Train the model
-print("\n🚀 Starting training...")
-print("-" * 70)
-results = model.train(
-    data=DATA_YAML,
-    epochs=EPOCHS,
-    imgsz=IMG_SIZE,
-    batch=BATCH_SIZE,
-    device=0,  # GPU device (0 for first GPU, use -1 for CPU)
-    patience=3,
-    save=True,
-    project=OUTPUT_DIR,
-    name="bunga_model",
-    exist_ok=False,
-    verbose=True,
-    # Additional training parameters
-    augment=True,
-    hsv_h=0.015,
-    hsv_s=0.7,
-    hsv_v=0.4,
-    degrees=10,
-    translate=0.1,
-    scale=0.5,
-    flipud=0.5,
-    fliplr=0.5,
-    mosaic=1.0,
-    conf=0.5,
-)
-
-print("-" * 70)
-print("\n✅ Training completed!")
-
-# Model paths
-best_model_path = os.path.join(OUTPUT_DIR, "bunga_model", "weights", "best.pt")
-last_model_path = os.path.join(OUTPUT_DIR, "bunga_model", "weights", "last.pt")
-
-print("\n" + "=" * 70)
-print("📦 TRAINING RESULTS")
-print("=" * 70)
-print(f"Best Model: {best_model_path}")
-print(f"Last Model: {last_model_path}")
-print(f"Results Directory: {os.path.join(OUTPUT_DIR, 'bunga_model')}")
-
-# Validate on test set
-print("\n📊 Running validation on test set...")
-metrics = model.val()
-print(f"mAP@50: {metrics.box.map50:.3f}")
-print(f"mAP@50-95: {metrics.box.map:.3f}")
-
-print("\n🎉 Done! Ready for mobile integration.")
-print("=" * 70)
+RUN_NAME = "bunga_model"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the YOLOv8 bunga (or leaf) detector')
+    parser.add_argument('--data', default=DATA_YAML, help='data.yaml of the YOLO dataset')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--name', default=RUN_NAME)
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--imgsz', type=int, default=IMG_SIZE)
+    parser.add_argument('--device', default=None, help='0, cpu or mps (default: detected)')
+    parser.add_argument('--batch', type=int, default=None, help='default: from memory (-1 = AutoBatch on CUDA)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', choices=('ram', 'disk', 'none'), default=None)
+    parser.add_argument('--skip-label-cache', action='store_true', help='Let ultralytics build labels.cache itself')
+    parser.add_argument('--profile-only', action='store_true', help='Print the chosen settings and exit')
+    return parser.parse_args()
+
+
+def main():
+    import torch
+    from ultralytics.data.utils import check_det_dataset
+
+    args = parse_args()
+    run_dir = os.path.join(args.output_dir, args.name)
+
+    # Verify data.yaml exists
+    if not os.path.exists(args.data):
+        print(f"❌ ERROR: data.yaml not found at {args.data}")
+        return 1
+
+    print("🔍 Sizing training to this machine...")
+    data = check_det_dataset(args.data)
+    profile = yolo_profile.hardware_profile(data, args.imgsz, args.model, args.device)
+    if args.batch is not None:
+        profile['batch'] = args.batch
+    if args.workers is not None:
+        profile['workers'] = args.workers
+    if args.cache is not None:
+        profile['cache'] = False if args.cache == 'none' else args.cache
+    info = profile.pop('info')
+
+    print("=" * 70)
+    print("🍎 YOLOv8 Black Pepper Bunga Training")
+    print("=" * 70)
+    print(f"Data YAML: {args.data}")
+    print(f"Output Dir: {args.output_dir}")
+    print(f"Model: {args.model}")
+    print(f"Epochs: {args.epochs}")
+    print(f"Image Size: {args.imgsz}")
+    print(f"Device: {profile['device']} ({info['cores']} cores, {info['available_memory_gb']} GB available)")
+    print(f"Batch Size: {'AutoBatch' if profile['batch'] == -1 else profile['batch']}")
+    print(f"Workers: {profile['workers']}")
+    print(f"Image Cache: {profile['cache'] or 'off'} ({info['images']} images, ~{info['cache_estimate_gb']} GB decoded)")
+    print("=" * 70)
+    if args.profile_only:
+        print(json.dumps(dict(profile, info=info), indent=2))
+        return 0
+
+    # Display the dataset classes
+    with open(args.data, 'r') as f:
+        data_config = yaml.safe_load(f)
+        print(f"\n📋 Dataset Classes:")
+        if 'names' in data_config:
+            names = data_config['names']
+            for idx, class_name in (names.items() if isinstance(names, dict) else enumerate(names)):
+                print(f"  Class {idx}: {class_name}")
+        print()
+
+    if not args.skip_label_cache:
+        print("🏷️ Building label caches...")
+        try:
+            yolo_profile.precompute_label_cache(data, args.imgsz)
+        except Exception as e:
+            print(f"⚠️ Could not prebuild label cache ({e}); ultralytics will build it on the first epoch")
+
+    if info['torch_threads']:
+        # Cores not running loader workers do the forward/backward pass
+        torch.set_num_threads(info['torch_threads'])
+
+    # Create output directory
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Load pretrained YOLOv8 model
+    print(f"📥 Loading {args.model} pretrained model...")
+    model = YOLO(f"{args.model}.pt")
+    yolo_profile.attach_throughput_logger(model)
+
+    # Train the model
+    print("\n🚀 Starting training...")
+    print("-" * 70)
+    results = model.train(
+        data=args.data,
+        epochs=args.epochs,
+        imgsz=args.imgsz,
+        batch=profile['batch'],
+        device=profile['device'],
+        workers=profile['workers'],
+        cache=profile['cache'],
+        amp=profile['amp'],
+        patience=3,
+        save=True,
+        project=args.output_dir,
+        name=args.name,
+        exist_ok=False,
+        verbose=True,
+        # Additional training parameters
+        augment=True,
+        hsv_h=0.015,
+        hsv_s=0.7,
+        hsv_v=0.4,
+        degrees=10,
+        translate=0.1,
+        scale=0.5,
+        flipud=0.5,
+        fliplr=0.5,
+        mosaic=1.0,
+        conf=0.5,
+    )
+
+    print("-" * 70)
+    print("\n✅ Training completed!")
+
+    # Model paths (ultralytics appends a number when the run name already exists)
+    run_dir = str(model.trainer.save_dir) if getattr(model, 'trainer', None) else run_dir
+    best_model_path = os.path.join(run_dir, "weights", "best.pt")
+    last_model_path = os.path.join(run_dir, "weights", "last.pt")
+
+    print("\n" + "=" * 70)
+    print("📦 TRAINING RESULTS")
+    print("=" * 70)
+    print(f"Best Model: {best_model_path}")
+    print(f"Last Model: {last_model_path}")
+    print(f"Results Directory: {run_dir}")
+    print(f"Throughput: {os.path.join(run_dir, 'throughput.json')}")
+
+    # Validate on test set
+    print("\n📊 Running validation on test set...")
+    metrics = model.val()
+    print(f"mAP@50: {metrics.box.map50:.3f}")
+    print(f"mAP@50-95: {metrics.box.map:.3f}")
+
+    print("\n🎉 Done! Ready for mobile integration.")
+    print("=" * 70)
+    return 0
+
+
+if __name__ == '__main__':
+    # Guarded so DataLoader worker processes (spawned on Windows) do not re-run training
+    raise SystemExit(main())
@@ -0,0 +1,213 @@
+"""
+Per-iteration throughput profiling for leaf_trainer (--profile).
+
+Every training iteration is split into data wait, forward (model + loss),
+backward and optimizer step. On CUDA the device is synchronized at each
+boundary, so the times are real kernel time, not launch time.
+
+Inside the DataLoader workers, TimedDataset records the time spent in
+__getitem__ and in the transform, through a shared-memory tensor with one
+row per worker. Together they give the worker utilization and split the
+input cost into decode (getitem minus transform) and augmentation. The
+per-epoch verdict names the bottleneck: decode, augmentation or compute.
+
+Peak memory: the training process's max RSS (resource, or psutil on
+Windows when it is installed) and torch.cuda.max_memory_allocated.
+DataLoader workers are separate processes and are not counted.
+
+Writes <name>_profile.json and <name>_profile.csv next to *_metrics.json.
+--profile-trace-steps N also records a torch.profiler Chrome trace of the
+first N training steps (<name>_trace.json; open in chrome://tracing or
+Perfetto).
+"""
+import os
+import csv
+import json
+import time
+import torch
+from torch.utils.data import Dataset, get_worker_info
+
+PHASES = ('data_wait', 'forward', 'backward', 'step')
+CSV_FIELDS = (
+    'epoch', 'iterations', 'images', 'seconds', 'images_per_second',
+    'data_wait_s', 'forward_s', 'backward_s', 'step_s', 'other_s',
+    'worker_utilization', 'decode_s', 'augment_s', 'peak_rss_mb', 'peak_cuda_mb', 'bound'
+)
+# Loader stall share above which an epoch counts as input-bound
+INPUT_BOUND = 0.3
+
+
+def peak_memory_mb(device):
+    """(peak RSS of this process, peak CUDA allocation) in MB; None when unavailable."""
+    rss = None
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS bytes
+        rss = peak / 1e6 if sys.platform == 'darwin' else peak / 1e3
+    except ImportError:
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            rss = getattr(info, 'peak_wset', info.rss) / 1e6
+        except ImportError:
+            pass
+    cuda = torch.cuda.max_memory_allocated(device) / 1e6 if device.type == 'cuda' else None
+    return rss, cuda
+
+
+class TimedTransform:
+    """Wraps a transform and adds its run time to the worker's row of `shared`."""
+
+    def __init__(self, transform, shared):
+        self.transform = transform
+        self.shared = shared
+
+    def __call__(self, image):
+        start = time.perf_counter()
+        image = self.transform(image)
+        self.shared[_worker_row(), 1] += time.perf_counter() - start
+        return image
+
+    def __repr__(self):
+        return f"TimedTransform({self.transform!r})"
+
+
+def _worker_row():
+    info = get_worker_info()
+    return 0 if info is None else info.id + 1
+
+
+class TimedDataset(Dataset):
+    """
+    Pass-through dataset recording per-worker getitem time and sample count.
+    shared[row] = (getitem seconds, transform seconds, samples); row 0 is the
+    main process, row i + 1 is worker i.
+    """
+
+    def __init__(self, dataset, shared):
+        self.dataset = dataset
+        self.shared = shared
+        self.classes = dataset.classes
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        start = time.perf_counter()
+        sample = self.dataset[idx]
+        row = _worker_row()
+        self.shared[row, 0] += time.perf_counter() - start
+        self.shared[row, 2] += 1
+        return sample
+
+
+class TrainingProfiler:
+    """Collects one summary row per training epoch; see the module docstring."""
+
+    def __init__(self, device, workers, trace_steps=0, trace_path=None):
+        self.device = device
+        self.workers = workers
+        self.shared = torch.zeros(workers + 1, 3, dtype=torch.float64).share_memory_()
+        self.rows = []
+        self.trace_steps = trace_steps
+        self.trace_path = trace_path
+        self._trace = None
+        self._steps = 0
+        self._times = None
+        self._clock = 0.0
+        self._epoch_start = 0.0
+        self._snapshot = None
+
+    def instrument(self, dataset):
+        """Wrap a dataset (and its transform) so the workers report their time."""
+        if getattr(dataset, 'transform', None) is not None:
+            dataset.transform = TimedTransform(dataset.transform, self.shared)
+        return TimedDataset(dataset, self.shared)
+
+    def _sync(self):
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize(self.device)
+
+    def begin_epoch(self):
+        self._times = dict.fromkeys(PHASES, 0.0)
+        self._times['other'] = 0.0
+        self._snapshot = self.shared.clone()
+        if self.trace_steps and self._steps == 0 and self._trace is None:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.device.type == 'cuda':
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._trace = torch.profiler.profile(activities=activities, profile_memory=True)
+            self._trace.start()
+        self._sync()
+        self._epoch_start = self._clock = time.perf_counter()
+
+    def lap(self, phase):
+        """Charge the time since the previous lap to `phase`."""
+        self._sync()
+        now = time.perf_counter()
+        self._times[phase] += now - self._clock
+        self._clock = now
+
+    def end_step(self):
+        self.lap('other')
+        self._steps += 1
+        if self._trace is not None and self._steps >= self.trace_steps:
+            self.stop_trace()
+
+    def stop_trace(self):
+        if self._trace is None:
+            return
+        self._trace.stop()
+        if self.trace_path:
+            self._trace.export_chrome_trace(self.trace_path)
+            print(f"✓ Profiler trace ({self._steps} steps) saved to: {self.trace_path}")
+        self._trace = None
+        self.trace_steps = 0
+
+    def end_epoch(self, epoch, iterations, images):
+        self._sync()
+        seconds = time.perf_counter() - self._epoch_start
+        delta = self.shared - self._snapshot
+        getitem, transform = float(delta[:, 0].sum()), float(delta[:, 1].sum())
+        busy_slots = max(1, self.workers)
+        rss, cuda = peak_memory_mb(self.device)
+        times = self._times
+
+        if seconds > 0 and times['data_wait'] / seconds > INPUT_BOUND:
+            bound = 'augmentation' if transform > getitem - transform else 'decode'
+        else:
+            bound = 'compute'
+        row = {
+            'epoch': epoch,
+            'iterations': iterations,
+            'images': images,
+            'seconds': round(seconds, 3),
+            'images_per_second': round(images / seconds, 1) if seconds > 0 else 0.0,
+            'data_wait_s': round(times['data_wait'], 3),
+            'forward_s': round(times['forward'], 3),
+            'backward_s': round(times['backward'], 3),
+            'step_s': round(times['step'], 3),
+            'other_s': round(times['other'], 3),
+            'worker_utilization': round(getitem / (seconds * busy_slots), 3) if seconds > 0 else 0.0,
+            'decode_s': round(getitem - transform, 3),
+            'augment_s': round(transform, 3),
+            'peak_rss_mb': round(rss, 1) if rss is not None else None,
+            'peak_cuda_mb': round(cuda, 1) if cuda is not None else None,
+            'bound': bound
+        }
+        self.rows.append(row)
+        return row
+
+    def write(self, output_path, name):
+        """<name>_profile.json and <name>_profile.csv. Returns the JSON path."""
+        self.stop_trace()
+        json_path = os.path.join(output_path, f"{name}_profile.json")
+        with open(json_path, 'w') as f:
+            json.dump({'workers': self.workers, 'device': str(self.device), 'epochs': self.rows}, f, indent=4)
+        with open(os.path.join(output_path, f"{name}_profile.csv"), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.rows)
+        return json_path
@@ -0,0 +1,192 @@
+"""
+Hardware-aware ultralytics training settings for the bunga and leaf YOLO models.
+
+The committed ml_models/*/train/args.yaml runs used device 0, batch 16,
+8 workers and cache: false. On a CPU-only box that either fails (no CUDA
+device 0) or re-decodes every JPEG for every mosaic, every epoch.
+hardware_profile() picks the settings from the machine instead:
+
+    device   CUDA device 0 if present, else Apple mps, else cpu
+    batch    CUDA: -1 (ultralytics AutoBatch sizes it to GPU memory)
+             CPU: the largest power of two whose activations fit in half
+             of the memory left after the image cache, at most 16
+    workers  CUDA: min(8, cores); CPU: about a third of the cores
+             (mosaic/augment), leaving the rest as torch threads
+    cache    'ram' if the decoded train+val images fit in 40% of the
+             available memory, else 'disk' (.npy next to each image) if
+             the disk has room, else no cache
+
+precompute_label_cache() builds ultralytics' labels.cache for each split
+up front, with a thread pool. The first epoch then does not stall on it.
+attach_throughput_logger() prints train images per second each epoch and
+writes them to <run>/throughput.json.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import ctypes
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+# Rough peak training memory per image at 640px (activations + gradients), MB
+TRAIN_MB_PER_IMAGE = {'n': 110, 's': 200, 'm': 420, 'l': 700, 'x': 1050}
+RAM_CACHE_SHARE = 0.4
+MAX_CPU_BATCH = 16
+
+
+def available_memory_bytes():
+    """Available physical memory; psutil if installed, else the OS API."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    if sys.platform == 'win32':
+        class MemoryStatus(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        status = MemoryStatus()
+        status.dwLength = ctypes.sizeof(MemoryStatus)
+        ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+        return status.ullAvailPhys
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def detect_device():
+    import torch
+    if torch.cuda.is_available():
+        return '0'
+    if getattr(torch.backends, 'mps', None) is not None and torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+def _split_dirs(data):
+    """Image folders of the train/val splits in a check_det_dataset() dict."""
+    dirs = []
+    for split in ('train', 'val'):
+        value = data.get(split)
+        for path in (value if isinstance(value, list) else [value]):
+            if path:
+                dirs.append(str(path))
+    return dirs
+
+
+def count_images(folders):
+    count = 0
+    for folder in folders:
+        if os.path.isfile(folder):
+            # A .txt list of image paths
+            with open(folder) as f:
+                count += sum(1 for line in f if line.strip())
+            continue
+        for _, _, files in os.walk(folder):
+            count += sum(1 for name in files if os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES)
+    return count
+
+
+def _model_scale(model_name):
+    stem = os.path.splitext(os.path.basename(model_name))[0]
+    return stem[-1] if stem and stem[-1] in TRAIN_MB_PER_IMAGE else 'n'
+
+
+def hardware_profile(data, imgsz=640, model_name='yolov8n', device=None):
+    """
+    Training settings for this machine. `data` is ultralytics'
+    check_det_dataset() dict. Returns a dict of model.train() kwargs
+    plus an 'info' entry that explains each choice.
+    """
+    device = device or detect_device()
+    cores = os.cpu_count() or 1
+    available = available_memory_bytes()
+    folders = _split_dirs(data)
+    images = count_images(folders)
+    # ultralytics caches images resized to imgsz on the long side, uint8 BGR
+    cache_bytes = images * imgsz * imgsz * 3
+
+    cache = False
+    if available is not None and cache_bytes < available * RAM_CACHE_SHARE:
+        cache = 'ram'
+    elif folders:
+        free = shutil.disk_usage(folders[0] if os.path.isdir(folders[0]) else os.path.dirname(folders[0])).free
+        if cache_bytes * 1.2 < free:
+            cache = 'disk'
+
+    if device == 'cpu':
+        workers = max(1, min(8, cores // 3))
+        per_image = TRAIN_MB_PER_IMAGE[_model_scale(model_name)] * 1e6 * (imgsz / 640) ** 2
+        left = (available or 4e9) - (cache_bytes if cache == 'ram' else 0)
+        batch = 2
+        while batch * 2 <= MAX_CPU_BATCH and batch * 2 * per_image < left * 0.5:
+            batch *= 2
+    else:
+        workers = min(8, cores)
+        batch = -1 if device != 'mps' else 16
+
+    return {
+        'device': device,
+        'batch': batch,
+        'workers': workers,
+        'cache': cache,
+        'amp': device not in ('cpu', 'mps'),
+        'info': {
+            'cores': cores,
+            'available_memory_gb': round(available / 1e9, 1) if available else None,
+            'images': images,
+            'cache_estimate_gb': round(cache_bytes / 1e9, 2),
+            'torch_threads': max(1, cores - workers) if device == 'cpu' else None
+        }
+    }
+
+
+def precompute_label_cache(data, imgsz=640):
+    """
+    Build labels.cache for the train and val splits now (verifies every label
+    file on ultralytics' thread pool). Returns {split: labelled images}.
+    """
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data.dataset import YOLODataset
+
+    hyp = get_cfg()
+    counts = {}
+    for split in ('train', 'val'):
+        if not data.get(split):
+            continue
+        start = time.time()
+        dataset = YOLODataset(img_path=data[split], imgsz=imgsz, augment=False, hyp=hyp,
+                              data=data, task='detect', prefix=f"{split}: ")
+        counts[split] = len(dataset.labels)
+        print(f"✓ Label cache for {split}: {counts[split]} images in {time.time() - start:.1f}s")
+    return counts
+
+
+def attach_throughput_logger(model):
+    """Print train images/second after every epoch; save them to <run>/throughput.json."""
+    state = {'start': None, 'epochs': []}
+
+    def on_epoch_start(trainer):
+        state['start'] = time.perf_counter()
+
+    def on_epoch_end(trainer):
+        seconds = time.perf_counter() - state['start']
+        images = len(trainer.train_loader.dataset)
+        rate = images / seconds if seconds > 0 else 0.0
+        state['epochs'].append({'epoch': trainer.epoch + 1, 'images': images,
+                                'seconds': round(seconds, 2), 'images_per_second': round(rate, 1)})
+        print(f"⏱️ Epoch {trainer.epoch + 1}: {images} images in {seconds:.1f}s ({rate:.1f} img/s)")
+
+    def on_train_end(trainer):
+        with open(os.path.join(str(trainer.save_dir), 'throughput.json'), 'w') as f:
+            json.dump(state['epochs'], f, indent=4)
+
+    model.add_callback('on_train_epoch_start', on_epoch_start)
+    model.add_callback('on_train_epoch_end', on_epoch_end)
+    model.add_callback('on_train_end', on_train_end)
+    return state